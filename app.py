@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file, stream_with_context
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
@@ -7,9 +7,17 @@ from dotenv import load_dotenv
 
 # Import our modules
 from services.speech_service import SpeechService
+from services.audio_processing import AudioBuffer, transcoder as audio_transcoder
+from services.chunked_upload import UploadError, UploadStore
 from services.nlp_service import NLPService
 from services.image_service import ImageService
-from services.database_service import DatabaseService
+from services.storage_backends import create_storage
+from services.image_utils import normalize_seed, normalize_variation_count, decode_data_uri
+from services.image_delivery import make_image_response
+from services.facet_index import parse_facet_filters
+from services.pagination import paginated_response
+from services.session_export import EXPORT_FORMATS, export_chunks, parse_date, parse_fields
+from services.image_encoding import ImageEncoder
 
 # Load environment variables
 load_dotenv()
@@ -29,11 +37,27 @@ CORS(app, origins=[
 # Initialize SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Initialize services
-speech_service = SpeechService()
-nlp_service = NLPService()
-image_service = ImageService()
-database_service = DatabaseService()
+# Initialize services. Image pool workers are spawned and re-import this script as
+# __mp_main__; they only run image operations, so they skip loading models and
+# opening storage (which would also start its background threads per worker).
+if __name__ != '__mp_main__':
+    speech_service = SpeechService()
+    nlp_service = NLPService()
+    image_service = ImageService()
+    database_service = create_storage()
+    image_encoder = ImageEncoder(processor=image_service.post_processor)
+    upload_store = UploadStore()
+
+THUMBNAIL_WIDTH = 256
+
+def session_summary(session):
+    """Session listing entry: image metadata and a thumbnail URL, no image bytes"""
+    summary = {key: value for key, value in session.items() if key != 'image_data'}
+    summary['session_id'] = str(session.get('_id'))
+    summary['image_data'] = {key: value for key, value in (session.get('image_data') or {}).items()
+                             if key not in ('image_data', 'variations')}
+    summary['thumbnail_url'] = f"/api/sessions/{summary['session_id']}/image?w={THUMBNAIL_WIDTH}"
+    return summary
 
 # Analytics storage (in-memory for simplicity)
 analytics_data = {
@@ -141,6 +165,46 @@ def serve_static(filename):
     except:
         return jsonify({'error': 'File not found'}), 404
 
+def voice_to_image_response(transcript, audio_stats):
+    """Shared tail of the voice endpoints: NLP, image generation and session save"""
+    # Step 2: NLP Processing
+    logger.info("Processing natural language...")
+    visual_concepts = nlp_service.extract_visual_concepts(transcript)
+    
+    # Step 3: Generate enhanced prompt and image
+    logger.info("Generating image...")
+    enhanced_prompt = nlp_service.generate_image_prompt(transcript, visual_concepts.get('sentiment'))
+    image_data = image_service.generate_image(enhanced_prompt)
+    
+    # Step 4: Save to database
+    session_data = {
+        'transcript': transcript,
+        'visual_concepts': visual_concepts,
+        'image_data': image_data,
+        'enhanced_prompt': enhanced_prompt,
+        'timestamp': database_service.get_current_timestamp()
+    }
+    session_id = database_service.save_session(session_data)
+    
+    return jsonify({
+        'success': True,
+        'session_id': session_id,
+        'transcript': transcript,
+        'visual_concepts': {
+            # Format for frontend compatibility
+            'objects': visual_concepts.get('visual_elements', {}).get('objects', []),
+            'colors': visual_concepts.get('visual_elements', {}).get('colors', []),
+            'settings': visual_concepts.get('visual_elements', {}).get('weather', []) + visual_concepts.get('visual_elements', {}).get('time', []),
+            'mood': visual_concepts.get('attributes', {}).get('mood', 'neutral'),
+            'style': visual_concepts.get('attributes', {}).get('style', 'realistic'),
+            'sentiment': visual_concepts.get('attributes', {}).get('sentiment', 'neutral'),
+            # Keep original structure for debugging
+            'raw_analysis': visual_concepts
+        },
+        'image_data': image_data,
+        'audio_stats': audio_stats
+    })
+
 @app.route('/api/process-voice', methods=['POST'])
 def process_voice():
     """Process voice input and generate image"""
@@ -154,68 +218,81 @@ def process_voice():
         if audio_file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save temporary audio file
-        temp_audio_path = f"temp_{audio_file.filename}"
-        audio_file.save(temp_audio_path)
-        
-        try:
+        # Buffer the upload in memory (spills to a unique temp file only when large)
+        with AudioBuffer.from_stream(audio_file.stream, filename=audio_file.filename) as audio_buffer:
             # Step 1: Speech to Text
             logger.info("Converting speech to text...")
-            transcript = speech_service.speech_to_text(temp_audio_path)
-            
-            if not transcript:
-                return jsonify({'error': 'Could not transcribe audio'}), 400
-            
-            # Step 2: NLP Processing
-            logger.info("Processing natural language...")
-            visual_concepts = nlp_service.extract_visual_concepts(transcript)
-            
-            # Step 3: Generate enhanced prompt and image
-            logger.info("Generating image...")
-            enhanced_prompt = nlp_service.generate_image_prompt(transcript, visual_concepts.get('sentiment'))
-            image_data = image_service.generate_image(enhanced_prompt)
-            
-            # Step 4: Save to database
-            session_data = {
-                'transcript': transcript,
-                'visual_concepts': visual_concepts,
-                'image_data': image_data,
-                'enhanced_prompt': enhanced_prompt,
-                'timestamp': database_service.get_current_timestamp()
-            }
-            session_id = database_service.save_session(session_data)
-            
-            # Clean up temp file
-            os.remove(temp_audio_path)
-            
-            return jsonify({
-                'success': True,
-                'session_id': session_id,
-                'transcript': transcript,
-                'visual_concepts': {
-                    # Format for frontend compatibility
-                    'objects': visual_concepts.get('visual_elements', {}).get('objects', []),
-                    'colors': visual_concepts.get('visual_elements', {}).get('colors', []),
-                    'settings': visual_concepts.get('visual_elements', {}).get('weather', []) + visual_concepts.get('visual_elements', {}).get('time', []),
-                    'mood': visual_concepts.get('attributes', {}).get('mood', 'neutral'),
-                    'style': visual_concepts.get('attributes', {}).get('style', 'realistic'),
-                    'sentiment': visual_concepts.get('attributes', {}).get('sentiment', 'neutral'),
-                    # Keep original structure for debugging
-                    'raw_analysis': visual_concepts
-                },
-                'image_data': image_data
-            })
-            
-        except Exception as e:
-            # Clean up temp file on error
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
-            raise e
-            
+            audio_stats = {}
+            transcript = speech_service.speech_to_text(audio_buffer, stats=audio_stats)
+        
+        if not transcript:
+            return jsonify({'error': 'Could not transcribe audio'}), 400
+        
+        return voice_to_image_response(transcript, audio_stats)
+        
     except Exception as e:
         logger.error(f"Error processing voice: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked, resumable audio upload"""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = upload_store.create(filename=data.get('filename'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload.status()), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Upload progress; clients resume from next_index after a dropped connection"""
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.status())
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    """Abandon an upload and free its buffer"""
+    if not upload_store.discard(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Store chunk ``index`` (raw request body); re-sending an acknowledged chunk is a no-op"""
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        status = upload.append(index, request.get_data(cache=False), request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return jsonify({'error': str(e), **upload.status()}), e.status
+    return jsonify(status)
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Transcribe the assembled upload and generate the image, like /api/process-voice"""
+    upload = upload_store.pop(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        logger.info("Converting speech to text...")
+        audio_stats = {}
+        transcript = speech_service.speech_to_text(upload.buffer, stats=audio_stats,
+                                                   decoded=upload.finish_decode())
+        if not transcript:
+            return jsonify({'error': 'Could not transcribe audio'}), 400
+        
+        return voice_to_image_response(transcript, audio_stats)
+        
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        upload.close()
+
 @app.route('/api/text-to-image', methods=['POST'])
 def text_to_image():
     """Generate image from text input"""
@@ -233,19 +310,32 @@ def text_to_image():
         
         text_input = data['text']
         preferred_service = data.get('image_service', None)  # Allow service selection
+        try:
+            seed = normalize_seed(data.get('seed'))
+            variation_count = normalize_variation_count(data.get('n'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         logger.info(f"Processing text: {text_input[:50]}...")
         
         # Process with NLP
         visual_concepts = nlp_service.extract_visual_concepts(text_input)
         logger.info("NLP processing completed")
         
-        # Generate enhanced prompt and image
+        # Generate enhanced prompt and image(s); NLP and prompt enhancement
+        # are shared by all requested variations
         enhanced_prompt = nlp_service.generate_image_prompt(text_input, visual_concepts.get('sentiment'))
         logger.info(f"Enhanced prompt: {enhanced_prompt[:50]}...")
         
-        image_data = image_service.generate_image(enhanced_prompt, preferred_service=preferred_service)
+        image_data = image_service.generate_image(enhanced_prompt, preferred_service=preferred_service,
+                                                  seed=seed, n=variation_count)
         logger.info("Image generation completed")
         
+        # Encoding stage: thumbnail renditions for history listings are built in the background
+        if image_data and image_data.get('image_data'):
+            for variation in image_data.get('variations') or [image_data]:
+                mimetype, content = decode_data_uri(variation['image_data'])
+                image_encoder.prepare(content, mimetype)
+        
         # Calculate processing time
         response_time = (time.time() - start_time) * 1000  # Convert to milliseconds
         
@@ -262,6 +352,17 @@ def text_to_image():
         session_id = database_service.save_session(session_data)
         logger.info(f"Session saved with ID: {session_id}")
         
+        # Raw delivery: reference the image by URL instead of inlining base64
+        if data.get('image_delivery') == 'url' and image_data and session_id not in ("no_db_session", "error_session"):
+            image_url = f"/api/sessions/{session_id}/image"
+            image_data = dict(image_data, image_data=None, image_url=image_url,
+                              thumbnail_url=f"{image_url}?w={THUMBNAIL_WIDTH}")
+            if image_data.get('variations'):
+                image_data['variations'] = [
+                    dict(variation, image_data=None, image_url=f"{image_url}?v={index}")
+                    for index, variation in enumerate(image_data['variations'])
+                ]
+        
         # Update analytics (preserving existing concept detection)
         confidence_score = visual_concepts.get('confidence', {}).get('overall', 0.85) * 100
         update_analytics(session_data, response_time, confidence_score)
@@ -290,6 +391,66 @@ def text_to_image():
         logger.error(f"Error in text-to-image: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions', methods=['GET'])
+def get_sessions():
+    """List recent sessions with thumbnail references only, paged by ``?cursor=``"""
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        sessions, next_cursor = database_service.get_sessions_page(limit, request.args.get('cursor'))
+        return paginated_response([session_summary(session) for session in sessions], next_cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting sessions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/export', methods=['GET'])
+def export_sessions():
+    """Stream sessions as NDJSON or Parquet (``?format=``), filtered by ``?since=``/``?until=``
+
+    ``?fields=`` limits the exported fields; image bytes are only included with ``?include_images=true``.
+    """
+    try:
+        fmt = request.args.get('format', 'ndjson').lower()
+        chunks = export_chunks(
+            database_service, fmt,
+            since=parse_date(request.args.get('since')),
+            until=parse_date(request.args.get('until')),
+            fields=parse_fields(request.args.get('fields')),
+            include_images=request.args.get('include_images', 'false').lower() == 'true')
+        # Fetch the first batch here so a failing query is an error response, not a truncated file
+        first = next(chunks, b'')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting sessions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    def stream():
+        yield first
+        try:
+            yield from chunks
+        except Exception as e:
+            logger.error(f"Session export interrupted: {str(e)}")
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(stream_with_context(stream()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=sessions{extension}'})
+
+@app.route('/api/sessions/facets', methods=['GET'])
+def get_session_facets():
+    """Ids of sessions having every given concept (``?objects=moon&colors=blue``), newest first, and per-facet counts"""
+    try:
+        filters = parse_facet_filters(request.args)
+        limit = max(1, request.args.get('limit', 50, type=int))
+        facet_limit = max(1, request.args.get('facet_limit', 10, type=int))
+        return jsonify(database_service.facet_search(filters, limit, facet_limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in facet search: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
     """Get session data by ID"""
@@ -303,6 +464,19 @@ def get_session(session_id):
         logger.error(f"Error getting session: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions/<session_id>/image', methods=['GET'])
+def get_session_image(session_id):
+    """Serve a session's image (or variation ``?v=``) as raw bytes with caching headers"""
+    try:
+        mimetype, content = database_service.get_image(session_id, request.args.get('v', type=int))
+        response = make_image_response(content, mimetype, encoder=image_encoder)
+        if response is None:
+            return jsonify({'error': 'Image not found'}), 404
+        return response
+    except Exception as e:
+        logger.error(f"Error getting session image: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics_simple():
     """Get simple analytics data"""
@@ -465,6 +639,20 @@ def get_performance_chart():
         logger.error(f"Error getting chart data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/speech-stats', methods=['GET'])
+def get_speech_stats():
+    """Speech backend health, transcript cache and ffmpeg transcoder counters"""
+    return jsonify({
+        'backends': speech_service.backends.stats(),
+        'transcript_cache': speech_service.transcript_cache.stats(),
+        'transcoder': audio_transcoder.stats()
+    })
+
+@app.route('/api/database-stats', methods=['GET'])
+def get_database_stats():
+    """Session storage statistics, including session cache hit rate where available"""
+    return jsonify(database_service.get_statistics())
+
 @app.route('/api/image-services', methods=['GET'])
 def get_image_services():
     """Get available image generation services"""
@@ -524,19 +712,52 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection"""
+    stream = voice_streams.pop(request.sid, None)
+    if stream:
+        stream.close()
     logger.info('Client disconnected')
 
+# Active streaming recognition sessions keyed by Socket.IO connection id
+voice_streams = {}
+
+def _stream_chunk(audio):
+    """Socket.IO delivers binary frames as bytes; older clients send base64 strings"""
+    if isinstance(audio, str):
+        import base64
+        return base64.b64decode(audio)
+    return bytes(audio or b'')
+
 @socketio.on('voice_stream')
 def handle_voice_stream(data):
-    """Handle real-time voice streaming"""
+    """Handle real-time voice streaming
+
+    Expects ``{audio, encoding, sample_rate, final}``; ``encoding`` is
+    ``pcm_s16le`` (default) or ``webm_opus``. Emits ``transcript`` events
+    with ``{text, is_final}`` as recognition progresses.
+    """
     try:
-        # Process streaming audio data
-        # This would be implemented for real-time processing
-        logger.info('Received voice stream data')
-        emit('processing', {'message': 'Processing voice stream...'})
-        
-        # For now, just acknowledge
-        emit('stream_received', {'status': 'received'})
+        sid = request.sid
+        stream = voice_streams.get(sid)
+        if stream is None:
+            def on_transcript(text, is_final):
+                socketio.emit('transcript', {'text': text, 'is_final': is_final}, to=sid)
+
+            stream = speech_service.create_stream_session(
+                on_transcript,
+                encoding=data.get('encoding', 'pcm_s16le'),
+                sample_rate=data.get('sample_rate', 16000)
+            )
+            voice_streams[sid] = stream
+            emit('processing', {'message': 'Processing voice stream...'})
+
+        chunk = _stream_chunk(data.get('audio'))
+        stream.feed(chunk)
+        emit('stream_received', {'status': 'received', 'bytes': len(chunk)})
+
+        if data.get('final'):
+            voice_streams.pop(sid, None)
+            # The final result arrives via on_transcript
+            socketio.start_background_task(stream.finish)
         
     except Exception as e:
         logger.error(f"Error in voice stream: {str(e)}")
@@ -8,6 +8,7 @@ import base64
 import random
 import re
 import math
+import itertools
 from io import BytesIO
 
 # Initialize Flask app and logger
@@ -58,6 +59,17 @@ try:
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
+
+from services.image_utils import (derive_seed, normalize_seed, normalize_variation_count, variation_seeds,
+                                  compute_etag, encode_data_uri, decode_data_uri)
+from services.svg_builder import SvgBuilder, element as svg_element, fmt_number
+from services.image_delivery import make_image_response
+from services.image_encoding import ImageEncoder
+from services.facet_index import parse_facet_filters
+from services.pagination import paginated_response
+from services.session_index import SessionMemory
+from services.storage_backends import create_storage
+
 CORS(app, origins=[
     'http://localhost:3000',
     'http://localhost:3001', 
@@ -132,8 +144,31 @@ def get_performance_metrics():
         'error_rate': round((analytics_data['error_count'] / analytics_data['total_requests']) * 100, 2) if analytics_data['total_requests'] > 0 else 0
     }
 
-# Simple in-memory storage for sessions
-sessions = {}
+# Bounded in-memory storage for sessions: time-ordered paging, inverted-index search, LRU eviction
+sessions = SessionMemory()
+session_counter = itertools.count(1)
+
+# DATABASE_URI=sqlite:///path.db also persists sessions locally so history survives restarts
+SESSION_STORE_URI = os.getenv('DATABASE_URI', '')
+session_store = create_storage(SESSION_STORE_URI) if SESSION_STORE_URI.startswith('sqlite:') else None
+
+def find_session(session_id):
+    """Session from memory, falling back to the persistent store"""
+    session = sessions.get(session_id)
+    if session is None and session_store is not None:
+        session = session_store.get_session(session_id)
+    return session
+
+# Encodes WebP/AVIF/PNG renditions and thumbnails of generated images
+image_encoder = ImageEncoder()
+
+THUMBNAIL_WIDTH = 256
+
+def session_summary(session):
+    """Session listing entry: thumbnail reference instead of the image bytes"""
+    summary = {key: value for key, value in session.items() if key not in ('image_data', 'variations')}
+    summary['thumbnail_url'] = f"/api/sessions/{session['id']}/image?w={THUMBNAIL_WIDTH}"
+    return summary
 
 def extract_visual_concepts(text):
     """Extract visual concepts from text using NLP"""
@@ -275,9 +310,11 @@ def extract_visual_concepts(text):
         concepts['sentiment'] = 'negative'
     else:
         concepts['sentiment'] = 'neutral'
+    # De-duplicate while keeping detection order, so the concepts (and the
+    # seed derived from them) are identical across processes
     for key in concepts:
         if isinstance(concepts[key], list):
-            concepts[key] = list(set(concepts[key]))
+            concepts[key] = list(dict.fromkeys(concepts[key]))
     return concepts
 
 @app.route('/health', methods=['GET'])
@@ -301,9 +338,10 @@ def serve_react_app(path):
     else:
         return send_file(os.path.join(build_path, 'index.html'))
 
-def generate_advanced_svg_image(text, concepts):
-    """Generate advanced SVG image with sophisticated graphics"""
+def render_advanced_svg(text, concepts, seed=None):
+    """Render the advanced SVG scene as minified markup"""
     width, height = 512, 512
+    rng = random.Random(derive_seed(text, concepts) if seed is None else seed)
     
     # Color palette based on concepts
     color_map = {
@@ -319,151 +357,139 @@ def generate_advanced_svg_image(text, concepts):
     
     primary_colors = color_map.get(concepts['colors'][0] if concepts['colors'] else 'blue', color_map['blue'])
     
-    svg_elements = []
-    
-    # Background gradient
-    svg_elements.append(f'''
-    <defs>
-        <radialGradient id="bg" cx="50%" cy="50%" r="70%">
-            <stop offset="0%" style="stop-color:{primary_colors[0]};stop-opacity:0.8" />
-            <stop offset="100%" style="stop-color:{primary_colors[1]};stop-opacity:0.3" />
-        </radialGradient>
-        <filter id="glow">
-            <feGaussianBlur stdDeviation="3" result="coloredBlur"/>
-            <feMerge>
-                <feMergeNode in="coloredBlur"/>
-                <feMergeNode in="SourceGraphic"/>
-            </feMerge>
-        </filter>
-    </defs>
-    <rect width="{width}" height="{height}" fill="url(#bg)"/>''')
+    svg = SvgBuilder(width, height)
+    
+    # Background gradient and shared glow filter
+    svg.define('bg', 'radialGradient', {'cx': '50%', 'cy': '50%', 'r': '70%'}, [
+        svg_element('stop', {'offset': 0, 'stop_color': primary_colors[0], 'stop_opacity': .8}),
+        svg_element('stop', {'offset': 1, 'stop_color': primary_colors[1], 'stop_opacity': .3})
+    ])
+    svg.define('glow', 'filter', None, [
+        svg_element('feGaussianBlur', {'stdDeviation': 3, 'result': 'b'}),
+        svg_element('feMerge', None, [
+            svg_element('feMergeNode', {'in': 'b'}),
+            svg_element('feMergeNode', {'in': 'SourceGraphic'})
+        ])
+    ])
+    svg.add('rect', {'width': width, 'height': height, 'fill': 'url(#bg)'})
     
     # Add objects based on concepts
     if 'sun' in concepts['objects']:
         sun_color = '#FFD700' if 'golden' in concepts['colors'] else '#FFA500'
-        svg_elements.append(f'''
-        <g transform="translate(400, 80)">
-            <circle cx="0" cy="0" r="40" fill="{sun_color}" filter="url(#glow)"/>
-            <g stroke="{sun_color}" stroke-width="3">
-                <line x1="-60" y1="0" x2="-50" y2="0"/>
-                <line x1="60" y1="0" x2="50" y2="0"/>
-                <line x1="0" y1="-60" x2="0" y2="-50"/>
-                <line x1="0" y1="60" x2="0" y2="50"/>
-                <line x1="-42" y1="-42" x2="-35" y2="-35"/>
-                <line x1="42" y1="42" x2="35" y2="35"/>
-                <line x1="42" y1="-42" x2="35" y2="-35"/>
-                <line x1="-42" y1="42" x2="-35" y2="35"/>
-            </g>
-        </g>''')
+        rays = [(-60, 0, -50, 0), (60, 0, 50, 0), (0, -60, 0, -50), (0, 60, 0, 50),
+                (-42, -42, -35, -35), (42, 42, 35, 35), (42, -42, 35, -35), (-42, 42, -35, 35)]
+        svg.group([
+            svg_element('circle', {'r': 40, 'fill': sun_color, 'filter': 'url(#glow)'}),
+            svg_element('path', {'d': ''.join(f"M{x1} {y1}L{x2} {y2}" for x1, y1, x2, y2 in rays),
+                                 'stroke': sun_color, 'stroke_width': 3})
+        ], transform='translate(400 80)')
     
     if 'moon' in concepts['objects']:
         moon_color = '#E8E8E8' if 'bright' not in concepts['colors'] else '#FFFACD'
-        svg_elements.append(f'''
-        <g transform="translate(100, 100)">
-            <circle cx="0" cy="0" r="35" fill="{moon_color}" filter="url(#glow)"/>
-            <circle cx="-10" cy="-8" r="3" fill="#D3D3D3"/>
-            <circle cx="8" cy="5" r="4" fill="#D3D3D3"/>
-            <circle cx="-5" cy="12" r="2" fill="#D3D3D3"/>
-        </g>''')
+        svg.group([
+            svg_element('circle', {'r': 35, 'fill': moon_color, 'filter': 'url(#glow)'}),
+            svg_element('g', {'fill': '#D3D3D3'}, [
+                svg_element('circle', {'cx': -10, 'cy': -8, 'r': 3}),
+                svg_element('circle', {'cx': 8, 'cy': 5, 'r': 4}),
+                svg_element('circle', {'cx': -5, 'cy': 12, 'r': 2})
+            ])
+        ], transform='translate(100 100)')
     
     if 'stars' in concepts['objects']:
         star_color = '#FFFF00' if 'yellow' in concepts['colors'] else '#FFFFFF'
+        # One unit star in <defs>, referenced and scaled by each <use>
+        svg.define('star', 'polygon', {'points': '0,-1 .3,-.3 1,0 .3,.3 0,1 -.3,.3 -1,0 -.3,-.3'})
+        stars = []
         for i in range(15):
-            x = random.randint(50, width-50)
-            y = random.randint(50, height-200)
-            size = random.randint(2, 6)
-            svg_elements.append(f'''
-            <g transform="translate({x}, {y})">
-                <polygon points="0,-{size} {size*0.3},-{size*0.3} {size},0 {size*0.3},{size*0.3} 0,{size} -{size*0.3},{size*0.3} -{size},0 -{size*0.3},-{size*0.3}" 
-                         fill="{star_color}" filter="url(#glow)"/>
-            </g>''')
+            x = rng.randint(50, width-50)
+            y = rng.randint(50, height-200)
+            size = rng.randint(2, 6)
+            stars.append(SvgBuilder.use('star', x, y, scale=size))
+        svg.group(stars, fill=star_color, filter='url(#glow)')
     
     if any(tree in concepts['objects'] for tree in ['tree', 'trees', 'palm']):
         tree_color = '#8B4513'
         leaf_color = primary_colors[0] if 'green' in concepts['colors'] else '#228B22'
-        svg_elements.append(f'''
-        <g transform="translate(200, 400)">
-            <rect x="-10" y="0" width="20" height="80" fill="{tree_color}"/>
-            <ellipse cx="0" cy="-20" rx="40" ry="30" fill="{leaf_color}" filter="url(#glow)"/>
-            <ellipse cx="-15" cy="-10" rx="25" ry="20" fill="#32CD32" opacity="0.8"/>
-            <ellipse cx="15" cy="-15" rx="20" ry="25" fill="#90EE90" opacity="0.7"/>
-        </g>''')
+        svg.group([
+            svg_element('rect', {'x': -10, 'width': 20, 'height': 80, 'fill': tree_color}),
+            svg_element('ellipse', {'cy': -20, 'rx': 40, 'ry': 30, 'fill': leaf_color, 'filter': 'url(#glow)'}),
+            svg_element('ellipse', {'cx': -15, 'cy': -10, 'rx': 25, 'ry': 20, 'fill': '#32CD32', 'opacity': .8}),
+            svg_element('ellipse', {'cx': 15, 'cy': -15, 'rx': 20, 'ry': 25, 'fill': '#90EE90', 'opacity': .7})
+        ], transform='translate(200 400)')
     
     if 'peacock' in concepts['objects']:
         peacock_colors = ['#4169E1', '#00CED1', '#9370DB', '#FF1493']
-        svg_elements.append(f'''
-        <g transform="translate(300, 250)">
-            <!-- Peacock body -->
-            <ellipse cx="0" cy="0" rx="50" ry="30" fill="{peacock_colors[0]}" filter="url(#glow)"/>
-            <!-- Peacock head -->
-            <ellipse cx="-40" cy="-20" rx="15" ry="12" fill="{peacock_colors[1]}"/>
-            <circle cx="-45" cy="-25" r="3" fill="#FFD700"/>
-            <!-- Tail feathers -->
-            <g stroke-width="3" opacity="0.9">
-                <ellipse cx="20" cy="-30" rx="8" ry="25" fill="{peacock_colors[2]}" transform="rotate(-20)"/>
-                <ellipse cx="30" cy="-10" rx="8" ry="28" fill="{peacock_colors[3]}" transform="rotate(0)"/>
-                <ellipse cx="25" cy="15" rx="8" ry="25" fill="{peacock_colors[0]}" transform="rotate(20)"/>
-                <ellipse cx="15" cy="30" rx="8" ry="22" fill="{peacock_colors[1]}" transform="rotate(40)"/>
-            </g>
-            <!-- Feather eyes -->
-            <circle cx="25" cy="-35" r="4" fill="#FFD700"/>
-            <circle cx="35" cy="-15" r="4" fill="#FFD700"/>
-            <circle cx="30" cy="20" r="4" fill="#FFD700"/>
-        </g>''')
+        feathers = [(20, -30, 25, peacock_colors[2], -20), (30, -10, 28, peacock_colors[3], 0),
+                    (25, 15, 25, peacock_colors[0], 20), (15, 30, 22, peacock_colors[1], 40)]
+        svg.group([
+            # Body and head
+            svg_element('ellipse', {'rx': 50, 'ry': 30, 'fill': peacock_colors[0], 'filter': 'url(#glow)'}),
+            svg_element('ellipse', {'cx': -40, 'cy': -20, 'rx': 15, 'ry': 12, 'fill': peacock_colors[1]}),
+            svg_element('circle', {'cx': -45, 'cy': -25, 'r': 3, 'fill': '#FFD700'}),
+            # Tail feathers
+            svg_element('g', {'opacity': .9}, [
+                svg_element('ellipse', {'cx': cx, 'cy': cy, 'rx': 8, 'ry': ry, 'fill': fill,
+                                        'transform': f"rotate({angle})" if angle else None})
+                for cx, cy, ry, fill, angle in feathers
+            ]),
+            # Feather eyes
+            svg_element('g', {'fill': '#FFD700'}, [
+                svg_element('circle', {'cx': cx, 'cy': cy, 'r': 4})
+                for cx, cy in [(25, -35), (35, -15), (30, 20)]
+            ])
+        ], transform='translate(300 250)')
     
     if 'beach' in concepts['objects'] or 'ocean' in concepts['objects']:
         water_color = primary_colors[0] if 'blue' in concepts['colors'] else '#4682B4'
         sand_color = '#F4A460' if 'yellow' not in concepts['colors'] else '#FFD700'
-        svg_elements.append(f'''
-        <g>
-            <!-- Beach sand -->
-            <rect x="0" y="{height-100}" width="{width}" height="100" fill="{sand_color}"/>
-            <!-- Ocean waves -->
-            <path d="M0,{height-100} Q{width//4},{height-120} {width//2},{height-100} T{width},{height-100}" 
-                  fill="none" stroke="{water_color}" stroke-width="8" opacity="0.8"/>
-            <path d="M0,{height-90} Q{width//3},{height-110} {width//1.5},{height-90} T{width},{height-90}" 
-                  fill="none" stroke="{water_color}" stroke-width="6" opacity="0.6"/>
-        </g>''')
+        svg.group([
+            # Beach sand and ocean waves
+            svg_element('rect', {'y': height-100, 'width': width, 'height': 100, 'fill': sand_color}),
+            svg_element('path', {'d': f"M0 {height-100}Q{width//4} {height-120} {width//2} {height-100}T{width} {height-100}",
+                                 'stroke_width': 8, 'opacity': .8}),
+            svg_element('path', {'d': f"M0 {height-90}Q{width//3} {height-110} {fmt_number(width/1.5)} {height-90}T{width} {height-90}",
+                                 'stroke_width': 6, 'opacity': .6})
+        ], fill='none', stroke=water_color)
     
     # Add title and concept info
-    svg_elements.append(f'''
-    <text x="20" y="30" font-family="Arial, sans-serif" font-size="18" font-weight="bold" fill="white" filter="url(#glow)">
-        ECHOSKETCH Generated
-    </text>
-    <text x="20" y="{height-20}" font-family="Arial, sans-serif" font-size="12" fill="white" opacity="0.8">
-        Style: {concepts['style']} | Mood: {concepts['mood']} | Objects: {', '.join(concepts['objects'][:3])}
-    </text>''')
-    
-    svg_content = f'''<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">
-        {''.join(svg_elements)}
-    </svg>'''
-    
-    encoded_svg = base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
-    return f"data:image/svg+xml;base64,{encoded_svg}"
-
-def generate_enhanced_image(text, concepts):
+    svg.group([
+        svg_element('text', {'x': 20, 'y': 30, 'font_size': 18, 'font_weight': 'bold', 'filter': 'url(#glow)'},
+                    text='ECHOSKETCH Generated'),
+        svg_element('text', {'x': 20, 'y': height-20, 'font_size': 12, 'opacity': .8},
+                    text=f"Style: {concepts['style']} | Mood: {concepts['mood']} | Objects: {', '.join(concepts['objects'][:3])}")
+    ], font_family='Arial,sans-serif', fill='white')
+    
+    return svg.to_string()
+
+def generate_advanced_svg_image(text, concepts, seed=None):
+    """Generate advanced SVG image with sophisticated graphics"""
+    svg_content = render_advanced_svg(text, concepts, seed=seed)
+    return encode_data_uri('image/svg+xml', svg_content.encode('utf-8'))
+
+def generate_enhanced_image(text, concepts, seed=None):
     """Generate enhanced image with multiple generation methods"""
     try:
         # Method 1: Try advanced SVG generation first
         if True:  # Always try SVG first as it's most reliable
             logger.info("Generating advanced SVG image")
-            return generate_advanced_svg_image(text, concepts)
+            return generate_advanced_svg_image(text, concepts, seed=seed)
         
         # Method 2: Enhanced PIL if available
         if PIL_AVAILABLE:
             logger.info("Generating enhanced PIL image")
-            return generate_pil_image(text, concepts)
+            return generate_pil_image(text, concepts, seed=seed)
         else:
             # Method 3: Fallback to simple SVG
-            return generate_placeholder_image()
+            return generate_placeholder_image(text, concepts, seed=seed)
             
     except Exception as e:
         logger.error(f"Error in image generation: {e}")
-        return generate_placeholder_image()
+        return generate_placeholder_image(text, concepts, seed=seed)
 
-def generate_pil_image(text, concepts):
+def generate_pil_image(text, concepts, seed=None):
     """Generate enhanced PIL image"""
     width, height = 512, 512
+    rng = random.Random(derive_seed(text, concepts) if seed is None else seed)
     
     # Choose colors based on detected concepts
     color_palette = {
@@ -483,7 +509,7 @@ def generate_pil_image(text, concepts):
         primary_color = concepts['colors'][0]
         colors = color_palette.get(primary_color, [(78, 205, 196), (45, 183, 209), (116, 185, 255)])
     else:
-        colors = random.choice(list(color_palette.values()))
+        colors = rng.choice(list(color_palette.values()))
     
     # Create image with PIL
     img = Image.new('RGB', (width, height), color='white')
@@ -546,7 +572,7 @@ def generate_pil_image(text, concepts):
         center_x, center_y = 280, 250
         for i in range(7):
             angle = -60 + i * 20  # Fan spread
-            length = 80 + random.randint(-10, 10)
+            length = 80 + rng.randint(-10, 10)
             end_x = center_x + length * math.cos(math.radians(angle))
             end_y = center_y + length * math.sin(math.radians(angle))
             # Feather shaft
@@ -560,8 +586,8 @@ def generate_pil_image(text, concepts):
         flower_colors = [(255, 20, 147), (255, 105, 180), (186, 85, 211), (255, 182, 193)]
         for i in range(3):
             fx = 100 + i * 150
-            fy = 400 + random.randint(-30, 30)
-            flower_color = random.choice(flower_colors)
+            fy = 400 + rng.randint(-30, 30)
+            flower_color = rng.choice(flower_colors)
             # Petals
             for j in range(6):
                 angle = j * 60
@@ -593,27 +619,26 @@ def generate_pil_image(text, concepts):
     
     return f"data:image/png;base64,{encoded_img}"
 
-def generate_placeholder_image():
+def generate_placeholder_image(text='', concepts=None, seed=None):
     """Generate a colorful placeholder image"""
     try:
+        rng = random.Random(derive_seed(text, concepts) if seed is None else seed)
         colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8', '#F7DC6F']
-        selected_color = random.choice(colors)
-        
-        # Simple placeholder image as base64 SVG
-        svg_content = f'''<svg width="512" height="512" viewBox="0 0 512 512" fill="none" xmlns="http://www.w3.org/2000/svg">
-<defs>
-<linearGradient id="gradient" x1="0%" y1="0%" x2="100%" y2="100%">
-<stop offset="0%" style="stop-color:{selected_color};stop-opacity:1" />
-<stop offset="100%" style="stop-color:#ffffff;stop-opacity:0.8" />
-</linearGradient>
-</defs>
-<rect width="512" height="512" fill="url(#gradient)"/>
-<text x="256" y="240" fill="white" font-family="Arial, sans-serif" font-size="24" text-anchor="middle">ECHOSKETCH</text>
-<text x="256" y="280" fill="white" font-family="Arial, sans-serif" font-size="18" text-anchor="middle">Generated Image</text>
-</svg>'''
-        
-        encoded_svg = base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
-        return f"data:image/svg+xml;base64,{encoded_svg}"
+        selected_color = rng.choice(colors)
+        
+        # Simple placeholder image as minified SVG
+        svg = SvgBuilder(512, 512)
+        svg.define('gradient', 'linearGradient', {'x2': 1, 'y2': 1}, [
+            svg_element('stop', {'offset': 0, 'stop_color': selected_color}),
+            svg_element('stop', {'offset': 1, 'stop_color': '#fff', 'stop_opacity': .8})
+        ])
+        svg.add('rect', {'width': 512, 'height': 512, 'fill': 'url(#gradient)'})
+        svg.group([
+            svg_element('text', {'x': 256, 'y': 240, 'font_size': 24}, text='ECHOSKETCH'),
+            svg_element('text', {'x': 256, 'y': 280, 'font_size': 18}, text='Generated Image')
+        ], fill='white', font_family='Arial,sans-serif', text_anchor='middle')
+        
+        return encode_data_uri('image/svg+xml', svg.to_bytes())
         
     except Exception as e:
         logger.error(f"Error generating placeholder: {e}")
@@ -635,12 +660,30 @@ def text_to_image():
         text_input = data['text']
         logger.info(f"Processing text: {text_input}")
         
-        # Extract visual concepts using existing NLP (keeping it unchanged)
+        try:
+            seed = normalize_seed(data.get('seed'))
+            variation_count = normalize_variation_count(data.get('n'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Extract visual concepts (shared by every requested variation) using existing NLP (keeping it unchanged)
         visual_concepts = extract_visual_concepts(text_input)
         logger.info(f"Extracted concepts: {visual_concepts}")
         
-        # Generate enhanced image using existing method
-        image_data = generate_enhanced_image(text_input, visual_concepts)
+        # Generate enhanced image using existing method (seeded, so identical
+        # requests produce byte-identical images)
+        if seed is None:
+            seed = derive_seed(text_input, visual_concepts)
+        variations = []
+        for variation_seed in variation_seeds(seed, variation_count):
+            variation_data = generate_enhanced_image(text_input, visual_concepts, seed=variation_seed)
+            variations.append({'image_data': variation_data, 'image_etag': compute_etag(variation_data), 'seed': variation_seed})
+            
+            # Encoding stage: thumbnail renditions for history listings are built in the background
+            image_mimetype, image_content = decode_data_uri(variation_data)
+            image_encoder.prepare(image_content, image_mimetype)
+        image_data = variations[0]['image_data']
+        image_etag = variations[0]['image_etag']
         
         # Create enhanced prompt
         objects_str = ', '.join(visual_concepts['objects'][:3]) if visual_concepts['objects'] else 'scene'
@@ -648,19 +691,25 @@ def text_to_image():
         enhanced_prompt = f"A {visual_concepts['style']} {visual_concepts['mood']} image featuring {objects_str} with {colors_str} colors"
         
         # Create session
-        session_id = f"session_{len(sessions) + 1}_{int(datetime.now().timestamp())}"
+        session_id = f"session_{next(session_counter)}_{int(datetime.now().timestamp())}"
         session_data = {
             'id': session_id,
             'transcript': text_input,
             'visual_concepts': visual_concepts,
             'image_data': image_data,
+            'image_etag': image_etag,
+            'seed': seed,
             'enhanced_prompt': enhanced_prompt,
             'timestamp': datetime.now().isoformat(),
             'processing_time': (datetime.now() - start_time).total_seconds()
         }
+        if variation_count > 1:
+            session_data['variations'] = variations
         
         # Save to in-memory storage
-        sessions[session_id] = session_data
+        sessions.add(session_data)
+        if session_store is not None:
+            session_store.save_session(dict(session_data, _id=session_id))
         logger.info(f"Session saved with ID: {session_id}")
         
         # Update analytics with performance tracking
@@ -673,9 +722,25 @@ def text_to_image():
             'transcript': text_input,
             'visual_concepts': visual_concepts,
             'image_data': image_data,
+            'image_url': f"/api/sessions/{session_id}/image",
+            'thumbnail_url': f"/api/sessions/{session_id}/image?w={THUMBNAIL_WIDTH}",
+            'image_etag': image_etag,
+            'seed': seed,
             'enhanced_prompt': enhanced_prompt,
             'processing_time': response_time
         }
+        if variation_count > 1:
+            response_data['variations'] = [
+                dict(variation, image_url=f"/api/sessions/{session_id}/image?v={index}")
+                for index, variation in enumerate(variations)
+            ]
+        
+        # Raw delivery: the client fetches image/svg+xml from image_url
+        # (gzip-compressible) instead of receiving base64 inside the JSON
+        if data.get('image_delivery') == 'url':
+            response_data['image_data'] = None
+            for variation in response_data.get('variations', []):
+                variation['image_data'] = None
         
         logger.info("Sending successful response")
         return jsonify(response_data)
@@ -786,28 +851,67 @@ def get_performance_chart():
 
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
-    """Get all sessions"""
+    """Get recent sessions, newest first, paged by ``?cursor=``"""
     try:
         limit = request.args.get('limit', 10, type=int)
-        sessions_list = list(sessions.values())
-        sessions_list.sort(key=lambda x: x['timestamp'], reverse=True)
-        return jsonify(sessions_list[:limit])
+        if session_store is not None:
+            page, next_cursor = session_store.get_sessions_page(limit, request.args.get('cursor'))
+        else:
+            page, next_cursor = sessions.page(limit, request.args.get('cursor'))
+        return paginated_response([session_summary(session) for session in page], next_cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting sessions: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions/facets', methods=['GET'])
+def get_session_facets():
+    """Ids of sessions having every given concept (``?objects=moon&colors=blue``), newest first, and per-facet counts"""
+    try:
+        filters = parse_facet_filters(request.args)
+        limit = max(1, request.args.get('limit', 50, type=int))
+        facet_limit = max(1, request.args.get('facet_limit', 10, type=int))
+        if session_store is not None:
+            return jsonify(session_store.facet_search(filters, limit, facet_limit))
+        return jsonify(dict(sessions.facets.query(filters, limit, facet_limit), loading=False))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in facet search: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
     """Get session data by ID"""
     try:
-        if session_id in sessions:
-            return jsonify(sessions[session_id])
+        session = find_session(session_id)
+        if session:
+            return jsonify(session)
         else:
             return jsonify({'error': 'Session not found'}), 404
     except Exception as e:
         logger.error(f"Error getting session: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions/<session_id>/image', methods=['GET'])
+def get_session_image(session_id):
+    """Serve a session's image (or variation ``?v=``) as raw bytes with caching headers"""
+    try:
+        session = find_session(session_id)
+        image_data = session['image_data'] if session else None
+        variation = request.args.get('v', type=int)
+        if session and variation is not None:
+            variations = session.get('variations') or [session]
+            image_data = variations[variation]['image_data'] if 0 <= variation < len(variations) else None
+        response = make_image_response(image_data, encoder=image_encoder) if image_data else None
+        if response is None:
+            return jsonify({'error': 'Image not found'}), 404
+        return response
+    except Exception as e:
+        logger.error(f"Error getting session image: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/search', methods=['GET'])
 def search_sessions():
     """Search sessions"""
@@ -815,14 +919,11 @@ def search_sessions():
         query = request.args.get('q', '')
         limit = request.args.get('limit', 10, type=int)
         
-        # Simple search in session transcripts
-        matching_sessions = []
-        for session in sessions.values():
-            if query.lower() in session['transcript'].lower():
-                matching_sessions.append(session)
+        if session_store is not None and query.strip():
+            return jsonify([session_summary(session) for session in session_store.search_sessions(query, limit)])
         
-        matching_sessions.sort(key=lambda x: x['timestamp'], reverse=True)
-        return jsonify(matching_sessions[:limit])
+        # Inverted index over transcript words and concepts; results come out newest first
+        return jsonify([session_summary(session) for session in sessions.search(query, limit)])
     except Exception as e:
         logger.error(f"Error searching sessions: {str(e)}")
         return jsonify({'error': str(e)}), 500
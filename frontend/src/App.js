@@ -102,12 +102,8 @@ function App() {
     setIsProcessing(true);
     
     try {
-      // Create FormData to send audio file
-      const formData = new FormData();
-      formData.append('audio', audioBlob, 'recording.webm');
-
-      // Send to backend for processing
-      const response = await ApiService.processVoice(formData);
+      // Send to backend in resumable chunks for processing
+      const response = await ApiService.uploadVoiceChunked(audioBlob, { filename: 'recording.webm' });
 
       if (response.success) {
         setTranscript(response.transcript);
@@ -1,5 +1,6 @@
 import React from 'react';
 import { FiClock, FiImage } from 'react-icons/fi';
+import ApiService from '../services/ApiService';
 import './SessionHistory.css';
 
 const SessionHistory = ({ sessions, currentSession, onSessionSelect }) => {
@@ -15,6 +16,12 @@ const SessionHistory = ({ sessions, currentSession, onSessionSelect }) => {
     return `${Math.floor(minutes / 1440)}d ago`;
   };
 
+  // Listings carry a small thumbnail rendition instead of the full image
+  const thumbnailSrc = (session) => {
+    const url = session.thumbnail_url || session.image_data?.thumbnail_url;
+    return url ? `${ApiService.baseURL}${url}` : session.image_data?.image_url;
+  };
+
   return (
     <div className="session-history card">
       <div className="history-header">
@@ -47,11 +54,12 @@ const SessionHistory = ({ sessions, currentSession, onSessionSelect }) => {
                     )}
                   </div>
                 </div>
-                {session.image_data?.image_url && (
+                {thumbnailSrc(session) && (
                   <div className="item-thumbnail">
                     <img 
-                      src={session.image_data.image_url} 
+                      src={thumbnailSrc(session)} 
                       alt="Generated"
+                      loading="lazy"
                     />
                   </div>
                 )}
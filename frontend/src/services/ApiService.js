@@ -74,6 +74,50 @@ class ApiService {
     }
   }
 
+  // Upload audio in numbered chunks; a dropped connection resumes from the last acknowledged chunk
+  async uploadVoiceChunked(blob, { filename = 'recording.webm', maxRetries = 5, onProgress } = {}) {
+    let upload;
+    try {
+      upload = (await axios.post(`${this.baseURL}/api/uploads`, { filename })).data;
+    } catch (error) {
+      // Servers without chunked uploads (app_minimal.py) still take the recording in one request
+      if (error.response?.status === 404) {
+        const formData = new FormData();
+        formData.append('audio', blob, filename);
+        return this.processVoice(formData);
+      }
+      throw error;
+    }
+    const chunkSize = upload.chunk_size;
+    let index = upload.next_index;
+    let retries = 0;
+
+    while (index * chunkSize < blob.size) {
+      const chunk = blob.slice(index * chunkSize, (index + 1) * chunkSize);
+      try {
+        const status = await axios.put(
+          `${this.baseURL}/api/uploads/${upload.upload_id}/chunks/${index}`,
+          chunk,
+          { headers: { 'Content-Type': 'application/octet-stream' }, timeout: 30000 }
+        );
+        index = status.data.next_index;
+        retries = 0;
+        if (onProgress) onProgress(Math.min(1, (index * chunkSize) / blob.size));
+      } catch (error) {
+        if (++retries > maxRetries) throw error;
+        await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** retries));
+        // Ask the server which chunk it has acknowledged, then carry on from there
+        const progress = await this.api.get(`/api/uploads/${upload.upload_id}`).catch(() => null);
+        if (progress) index = progress.next_index;
+      }
+    }
+
+    const response = await axios.post(`${this.baseURL}/api/uploads/${upload.upload_id}/finalize`, null, {
+      timeout: 60000,
+    });
+    return response.data;
+  }
+
   // Text to image conversion
   async textToImage(data) {
     try {
@@ -58,6 +58,11 @@ class SocketService {
     }
   }
 
+  // Stream a chunk of microphone audio; transcripts arrive as 'transcript' events
+  sendVoiceChunk(audio, { encoding = 'pcm_s16le', sampleRate = 16000, final = false } = {}) {
+    this.emit('voice_stream', { audio, encoding, sample_rate: sampleRate, final });
+  }
+
   isConnected() {
     return this.socket && this.socket.connected;
   }
@@ -0,0 +1,120 @@
+import struct
+
+# Opus-capable recognizers only accept these rates; Opus itself always decodes at 48 kHz
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Lowest practical Opus bitrate (6 kbps); WebM from MediaRecorder has no duration, so its size bounds it
+MIN_OPUS_BYTES_PER_SECOND = 750
+
+# ffmpeg demuxer hints so piped input is not probed byte-by-byte
+FFMPEG_DEMUXERS = {
+    'wav': 'wav',
+    'flac': 'flac',
+    'ogg_opus': 'ogg',
+    'ogg_vorbis': 'ogg',
+    'webm_opus': 'matroska',
+    'matroska': 'matroska',
+    'mp3': 'mp3',
+    'aiff': 'aiff',
+}
+
+
+def _wav_info(data):
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        chunk_size = struct.unpack('<I', data[position + 4:position + 8])[0]
+        if chunk_id == b'fmt ' and position + 24 <= len(data):
+            _, channels, sample_rate = struct.unpack('<HHI', data[position + 8:position + 16])
+            return sample_rate, channels
+        position += 8 + chunk_size + (chunk_size & 1)
+    return None, None
+
+
+def _flac_info(data):
+    # STREAMINFO is always the first metadata block: 20-bit rate, 3-bit channels-1
+    if len(data) < 21:
+        return None, None
+    sample_rate = (data[18] << 12) | (data[19] << 4) | (data[20] >> 4)
+    channels = ((data[20] >> 1) & 0x7) + 1
+    return sample_rate, channels
+
+
+def _opus_info(data):
+    index = data.find(b'OpusHead')
+    if index < 0 or index + 16 > len(data):
+        return 48000, None
+    channels = data[index + 9]
+    input_rate = struct.unpack('<I', data[index + 12:index + 16])[0]
+    return (input_rate if input_rate in OPUS_SAMPLE_RATES else 48000), channels
+
+
+def sniff_format(data):
+    """Identify an audio upload from its container header
+
+    Returns ``{'format', 'sample_rate', 'channels'}``; ``format`` is one of
+    wav, flac, ogg_opus, ogg_vorbis, webm_opus, matroska, mp3, mp4, aiff or
+    None when unrecognized. Rate and channels are None when not in the header.
+    """
+    head = bytes(data[:4096])
+    fmt, sample_rate, channels = None, None, None
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        fmt = 'wav'
+        sample_rate, channels = _wav_info(head)
+    elif head[:4] == b'fLaC':
+        fmt = 'flac'
+        sample_rate, channels = _flac_info(head)
+    elif head[:4] == b'OggS':
+        if b'OpusHead' in head:
+            fmt = 'ogg_opus'
+            sample_rate, channels = _opus_info(head)
+        elif b'\x01vorbis' in head:
+            fmt = 'ogg_vorbis'
+            index = head.find(b'\x01vorbis')
+            if index + 16 <= len(head):
+                channels = head[index + 11]
+                sample_rate = struct.unpack('<I', head[index + 12:index + 16])[0]
+    elif head[:4] == b'\x1a\x45\xdf\xa3':
+        if b'A_OPUS' in head or b'OpusHead' in head:
+            fmt = 'webm_opus'
+            sample_rate, channels = _opus_info(head)
+        else:
+            fmt = 'matroska'
+    elif head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        fmt = 'mp3'
+    elif head[4:8] == b'ftyp':
+        fmt = 'mp4'
+    elif head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+        fmt = 'aiff'
+
+    return {'format': fmt, 'sample_rate': sample_rate, 'channels': channels}
+
+
+def native_duration(data, info=None):
+    """Seconds of audio in a FLAC/Ogg/WebM upload without decoding it, or None if unknown
+
+    FLAC and Ogg give the exact length (STREAMINFO sample count, last page
+    granule). WebM gets an upper bound from its size at the lowest Opus bitrate.
+    """
+    info = info or sniff_format(data)
+    fmt = info['format']
+    if fmt == 'flac' and len(data) >= 26 and info['sample_rate']:
+        total_samples = ((data[21] & 0x0F) << 32) | struct.unpack('>I', bytes(data[22:26]))[0]
+        return total_samples / info['sample_rate'] if total_samples else None
+    if fmt in ('ogg_opus', 'ogg_vorbis'):
+        tail = bytes(data[-65536:])
+        index = tail.rfind(b'OggS')
+        if index < 0 or index + 14 > len(tail):
+            return None
+        granule = struct.unpack('<q', tail[index + 6:index + 14])[0]
+        if fmt == 'ogg_vorbis':
+            return granule / info['sample_rate'] if info['sample_rate'] else None
+        head = bytes(data[:4096])
+        position = head.find(b'OpusHead')
+        pre_skip = struct.unpack('<H', head[position + 10:position + 12])[0] if position >= 0 else 0
+        # Opus granule positions always count 48 kHz samples
+        return max(0, granule - pre_skip) / 48000
+    if fmt == 'webm_opus':
+        return len(data) / MIN_OPUS_BYTES_PER_SECOND
+    return None
@@ -0,0 +1,375 @@
+import io
+import logging
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import wave
+
+import numpy as np
+
+from services.audio_formats import FFMPEG_DEMUXERS, sniff_format
+
+logger = logging.getLogger(__name__)
+
+# Uploads larger than this spill from memory to an anonymous temp file
+AUDIO_SPILL_BYTES = int(os.getenv('AUDIO_SPILL_BYTES', 8 * 1024 * 1024))
+
+# Sample rate fed to the recognizers (16 kHz mono, 16-bit PCM)
+TARGET_SAMPLE_RATE = 16000
+
+# Concurrent ffmpeg decodes; more requests wait instead of oversubscribing the CPU
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', os.cpu_count() or 2))
+# How long a one-shot decode waits for a free ffmpeg slot before giving up
+FFMPEG_SLOT_TIMEOUT_SECONDS = float(os.getenv('FFMPEG_SLOT_TIMEOUT_SECONDS', 30))
+
+
+class AudioBuffer:
+    """Audio upload held in memory, spilling to a uniquely named temp file above a size threshold
+
+    Replaces the old ``temp_<filename>`` files in the working directory, which
+    collided when concurrent uploads shared a name.
+    """
+
+    def __init__(self, filename=None, max_memory_bytes=None):
+        self.filename = filename or ''
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=AUDIO_SPILL_BYTES if max_memory_bytes is None else max_memory_bytes,
+            prefix='echosketch_audio_'
+        )
+        self.size = 0
+        self.mapping = None
+
+    @classmethod
+    def from_stream(cls, stream, filename=None, chunk_size=64 * 1024):
+        buffer = cls(filename=filename)
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            buffer.write(chunk)
+        return buffer
+
+    @classmethod
+    def from_bytes(cls, data, filename=None):
+        buffer = cls(filename=filename)
+        buffer.write(data)
+        return buffer
+
+    @property
+    def spilled(self):
+        """True once the audio has rolled over from memory to disk"""
+        return getattr(self.file, '_rolled', False)
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def getvalue(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def view(self):
+        """The audio as a bytes-like object; a spilled file is memory-mapped rather than read into memory"""
+        if not self.spilled or self.size == 0:
+            return self.getvalue()
+        if self.mapping is None:
+            self.file.flush()
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapping
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_audio_bytes(audio):
+    """Accept an AudioBuffer, raw bytes, a file-like object or a file path
+
+    A spilled AudioBuffer comes back as a read-only memory map of its temp
+    file, valid until the buffer is closed.
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio.view()
+    if isinstance(audio, (bytes, bytearray)):
+        return bytes(audio)
+    if hasattr(audio, 'read'):
+        return audio.read()
+    with open(audio, 'rb') as audio_file:
+        return audio_file.read()
+
+
+class StreamResampler:
+    """Linear-interpolation resampler for audio arriving in blocks
+
+    The interpolation phase and the last source sample carry over between
+    blocks, so a stream resampled block by block matches one resampled whole.
+    """
+
+    def __init__(self, from_rate, to_rate):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        # Source index of the next output sample relative to ``tail``, in units of 1/to_rate
+        self.phase = 0
+        self.tail = np.zeros(0, dtype=np.float32)
+
+    def feed(self, samples):
+        if self.from_rate == self.to_rate:
+            return samples
+        source = np.concatenate([self.tail, samples.astype(np.float32)])
+        last = (len(source) - 1) * self.to_rate
+        if last < self.phase:
+            self.tail = source
+            return np.zeros(0, dtype=np.int16)
+        count = (last - self.phase) // self.from_rate + 1
+        positions = (self.phase + np.arange(count) * self.from_rate) / self.to_rate
+        resampled = np.interp(positions, np.arange(len(source)), source)
+        following = self.phase + count * self.from_rate
+        keep = min(following // self.to_rate, len(source) - 1)
+        self.tail = source[keep:]
+        self.phase = following - keep * self.to_rate
+        return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def _frames_to_mono(frames, sample_width, channels):
+    """Interleaved little-endian PCM frames to mono int16 samples"""
+    if sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2')
+    elif sample_width == 1:
+        samples = ((np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    elif sample_width == 4:
+        samples = (np.frombuffer(frames, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width}")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples
+
+
+def _decode_wav(audio, sample_rate, block_frames=64 * 1024):
+    """Decode WAV bytes or a memory map block by block, so only the output PCM is held"""
+    source = audio if isinstance(audio, mmap.mmap) else io.BytesIO(audio)
+    source.seek(0)
+    parts = []
+    with wave.open(source, 'rb') as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        resampler = StreamResampler(wav.getframerate(), sample_rate)
+        while True:
+            frames = wav.readframes(block_frames)
+            if not frames:
+                break
+            parts.append(resampler.feed(_frames_to_mono(frames, sample_width, channels)))
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int16)
+
+
+def _parse_wav_header(data):
+    """(channels, sample_width, sample_rate, data_offset) once the header is complete, else None"""
+    position = 12
+    params = None
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        chunk_size = struct.unpack('<I', data[position + 4:position + 8])[0]
+        if chunk_id == b'fmt ':
+            if position + 24 > len(data):
+                return None
+            audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', data[position + 8:position + 24])
+            if audio_format not in (1, 0xFFFE):
+                raise ValueError(f"Unsupported WAV encoding: {audio_format}")
+            params = (channels, bits // 8, rate)
+        elif chunk_id == b'data':
+            if params is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            return params + (position + 8,)
+        position += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+class IncrementalWavDecoder:
+    """Decode a WAV upload chunk by chunk as it arrives"""
+
+    def __init__(self, sample_rate=TARGET_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.header = bytearray()
+        self.params = None
+        self.resampler = None
+        self.remainder = b''
+
+    def feed(self, data):
+        if self.params is None:
+            self.header.extend(data)
+            parsed = _parse_wav_header(bytes(self.header))
+            if parsed is None:
+                return np.zeros(0, dtype=np.int16)
+            self.params = parsed[:3]
+            self.resampler = StreamResampler(self.params[2], self.sample_rate)
+            data = bytes(self.header[parsed[3]:])
+            self.header = None
+
+        channels, sample_width, _ = self.params
+        data = self.remainder + bytes(data)
+        usable = len(data) - len(data) % (sample_width * channels)
+        self.remainder = data[usable:]
+        return self.resampler.feed(_frames_to_mono(data[:usable], sample_width, channels))
+
+    def close(self):
+        return np.zeros(0, dtype=np.int16)
+
+    def abort(self):
+        pass
+
+
+class FfmpegStreamDecoder:
+    """One ffmpeg process fed incrementally; decoded PCM is collected by a reader thread"""
+
+    def __init__(self, transcoder, command):
+        self.transcoder = transcoder
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self.output = bytearray()
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        for block in iter(lambda: self.process.stdout.read(64 * 1024), b''):
+            with self.lock:
+                self.output.extend(block)
+
+    def _drain(self):
+        with self.lock:
+            usable = len(self.output) - len(self.output) % 2
+            data = bytes(self.output[:usable])
+            del self.output[:usable]
+        return np.frombuffer(data, dtype='<i2')
+
+    def feed(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+        return self._drain()
+
+    def close(self):
+        """Signal end of input and return the remaining samples"""
+        try:
+            self.process.stdin.close()
+            self.reader.join()
+            if self.process.wait() != 0:
+                raise RuntimeError("ffmpeg stream decode failed")
+            return self._drain()
+        finally:
+            self.transcoder._release()
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+        self.transcoder._release()
+
+
+class FfmpegTranscoder:
+    """Bounded pool of ffmpeg subprocesses decoding to raw PCM over pipes
+
+    At most ``max_processes`` decodes run at once. Incremental stream decodes
+    (which live as long as an upload) never take the last slot, so one-shot
+    decodes can always make progress. The container format found by sniffing
+    is passed as a demuxer hint so piped input is not probed.
+    """
+
+    def __init__(self, max_processes=None, slot_timeout=None):
+        self.max_processes = max_processes or FFMPEG_MAX_PROCESSES
+        self.slot_timeout = slot_timeout if slot_timeout is not None else FFMPEG_SLOT_TIMEOUT_SECONDS
+        self.slots = threading.BoundedSemaphore(self.max_processes)
+        self.ffmpeg = shutil.which('ffmpeg')
+        self.lock = threading.Lock()
+        self.active = 0
+        self.streams = 0
+        self.completed = 0
+
+    def _command(self, sample_rate, audio_format):
+        command = [self.ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error']
+        demuxer = FFMPEG_DEMUXERS.get(audio_format)
+        if demuxer:
+            command += ['-f', demuxer]
+        # Pipe in and out so nothing touches the filesystem
+        return command + ['-i', 'pipe:0', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1',
+                          '-ar', str(sample_rate), 'pipe:1']
+
+    def to_pcm(self, audio_bytes, sample_rate=TARGET_SAMPLE_RATE, audio_format=None):
+        if not self.ffmpeg:
+            raise RuntimeError("ffmpeg is required to decode compressed audio")
+        command = self._command(sample_rate, audio_format)
+
+        if not self.slots.acquire(timeout=self.slot_timeout):
+            raise RuntimeError("All ffmpeg decoders are busy; try again shortly")
+        with self.lock:
+            self.active += 1
+        try:
+            process = subprocess.run(command, input=audio_bytes, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, check=False)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+            self.slots.release()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {process.stderr.decode(errors='ignore').strip()}")
+        return np.frombuffer(process.stdout, dtype='<i2')
+
+    def open_stream(self, sample_rate=TARGET_SAMPLE_RATE, audio_format=None):
+        """Start an incremental decode, or None when ffmpeg is missing or no stream slot is free"""
+        if not self.ffmpeg:
+            return None
+        with self.lock:
+            if self.max_processes > 1 and self.streams >= self.max_processes - 1:
+                return None
+            if not self.slots.acquire(blocking=False):
+                return None
+            self.streams += 1
+            self.active += 1
+        try:
+            return FfmpegStreamDecoder(self, self._command(sample_rate, audio_format))
+        except OSError:
+            self._release()
+            raise
+
+    def _release(self):
+        with self.lock:
+            self.active -= 1
+            self.streams -= 1
+            self.completed += 1
+        self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {'max_processes': self.max_processes, 'active': self.active, 'streams': self.streams,
+                    'completed': self.completed, 'available': bool(self.ffmpeg)}
+
+
+transcoder = FfmpegTranscoder()
+
+
+def decode_to_pcm(audio_bytes, sample_rate=TARGET_SAMPLE_RATE):
+    """Decode audio bytes to mono 16-bit PCM samples at ``sample_rate``, in memory
+
+    WAV is read directly with NumPy; other formats go through the shared
+    ffmpeg transcoder.
+    """
+    audio_format = sniff_format(audio_bytes)['format']
+    if audio_format == 'wav':
+        try:
+            return _decode_wav(audio_bytes, sample_rate)
+        except (wave.Error, ValueError) as e:
+            # Float or compressed WAV payloads still need ffmpeg
+            logger.debug(f"Direct WAV decode failed, transcoding: {e}")
+    return transcoder.to_pcm(audio_bytes, sample_rate, audio_format)
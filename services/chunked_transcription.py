@@ -0,0 +1,85 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from services.audio_processing import TARGET_SAMPLE_RATE
+from services.voice_activity import speech_segments
+
+logger = logging.getLogger(__name__)
+
+# Recordings longer than this are split; synchronous recognize caps out near a minute
+CHUNK_MAX_SECONDS = float(os.getenv('SPEECH_CHUNK_SECONDS', 30))
+CHUNK_OVERLAP_MS = int(os.getenv('SPEECH_CHUNK_OVERLAP_MS', 500))
+CHUNK_WORKERS = int(os.getenv('SPEECH_CHUNK_WORKERS', 4))
+
+# Longest run of words compared when removing text duplicated by an overlap
+MAX_OVERLAP_WORDS = 8
+
+
+def plan_chunks(samples, sample_rate=TARGET_SAMPLE_RATE, max_seconds=CHUNK_MAX_SECONDS,
+                overlap_ms=CHUNK_OVERLAP_MS):
+    """(start, end) sample ranges of at most ``max_seconds`` plus overlap
+
+    Cuts fall in the middle of pauses between speech segments where possible
+    and are hard cuts otherwise; each chunk extends ``overlap_ms`` past its
+    cut points so words straddling a boundary are heard by both sides.
+    """
+    total = len(samples)
+    max_length = int(max_seconds * sample_rate)
+    if total <= max_length:
+        return [(0, total)]
+
+    segments = speech_segments(samples, sample_rate, min_silence_ms=300, padding_ms=0)
+    candidates = [(end + next_start) // 2 for (_, end), (next_start, _) in zip(segments, segments[1:])]
+
+    cuts = []
+    position = 0
+    while total - position > max_length:
+        limit = position + max_length
+        in_range = [cut for cut in candidates if position < cut <= limit]
+        position = in_range[-1] if in_range else limit
+        cuts.append(position)
+
+    overlap = sample_rate * overlap_ms // 1000
+    bounds = [0] + cuts + [total]
+    return [(max(0, start - overlap), min(total, end + overlap)) for start, end in zip(bounds, bounds[1:])]
+
+
+def _normalize_word(word):
+    return re.sub(r'[^\w\']', '', word).lower()
+
+
+def stitch_transcripts(parts):
+    """Join chunk transcripts in order, dropping words repeated across an overlap"""
+    words = []
+    for part in parts:
+        if not part:
+            continue
+        next_words = part.split()
+        longest = min(MAX_OVERLAP_WORDS, len(words), len(next_words))
+        for size in range(longest, 0, -1):
+            tail = [_normalize_word(w) for w in words[-size:]]
+            head = [_normalize_word(w) for w in next_words[:size]]
+            if tail == head:
+                next_words = next_words[size:]
+                break
+        words.extend(next_words)
+    return ' '.join(words)
+
+
+def transcribe_chunked(samples, transcribe, sample_rate=TARGET_SAMPLE_RATE, max_seconds=CHUNK_MAX_SECONDS,
+                       max_workers=CHUNK_WORKERS):
+    """Transcribe long PCM in overlapping chunks concurrently and stitch the results
+
+    ``transcribe(chunk_samples)`` returns text (or None) for one chunk; chunks
+    run on a bounded thread pool and are stitched in their original order.
+    """
+    chunks = plan_chunks(samples, sample_rate, max_seconds)
+    if len(chunks) == 1:
+        return transcribe(samples)
+
+    logger.info(f"Transcribing {len(samples) / sample_rate:.1f}s of audio in {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        parts = list(executor.map(lambda bounds: transcribe(samples[bounds[0]:bounds[1]]), chunks))
+    return stitch_transcripts(parts) or None
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from services.audio_formats import sniff_format
+from services.audio_processing import TARGET_SAMPLE_RATE, AudioBuffer, IncrementalWavDecoder, transcoder
+from services.voice_activity import VAD_FRAME_MS, frame_energy
+
+logger = logging.getLogger(__name__)
+
+# Abandoned uploads are dropped after this long without a chunk
+UPLOAD_TTL_SECONDS = int(os.getenv('UPLOAD_TTL_SECONDS', 3600))
+# An upload that sends no chunk for this long gives its ffmpeg process back; finalize then decodes the whole file
+UPLOAD_DECODE_IDLE_SECONDS = int(os.getenv('UPLOAD_DECODE_IDLE_SECONDS', 30))
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', 256 * 1024))
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv('UPLOAD_MAX_CHUNK_BYTES', 8 * 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 200 * 1024 * 1024))
+# Uploads open at once per process; each may spool up to UPLOAD_MAX_BYTES to disk
+UPLOAD_MAX_ACTIVE = int(os.getenv('UPLOAD_MAX_ACTIVE', 64))
+
+FRAME_LENGTH = TARGET_SAMPLE_RATE * VAD_FRAME_MS // 1000
+
+
+class UploadError(ValueError):
+    """Rejected chunk; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUpload:
+    """Audio arriving as numbered chunks, decoded and energy-analysed as it streams in
+
+    Chunks must arrive in order; re-sending an acknowledged chunk is a no-op so
+    clients can retry blindly and resume from ``next_index``.
+    """
+
+    def __init__(self, upload_id, filename=None):
+        self.upload_id = upload_id
+        self.filename = filename or ''
+        self.buffer = AudioBuffer(filename=filename)
+        self.next_index = 0
+        self.created = self.updated = time.time()
+        self.lock = threading.Lock()
+        self.audio_format = None
+        self.decoder = None
+        self.decode_failed = False
+        self.pcm_parts = []
+        self.energy_parts = []
+        self.pending = np.zeros(0, dtype=np.int16)
+        self.decoded_samples = 0
+
+    def append(self, index, data, checksum=None):
+        with self.lock:
+            if index < self.next_index:
+                return self.status()
+            if index > self.next_index:
+                raise UploadError(f"Expected chunk {self.next_index}, got {index}", status=409)
+            if len(data) > UPLOAD_MAX_CHUNK_BYTES:
+                raise UploadError("Chunk too large", status=413)
+            if self.buffer.size + len(data) > UPLOAD_MAX_BYTES:
+                raise UploadError("Upload too large", status=413)
+            if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+                raise UploadError("Chunk checksum mismatch")
+
+            self.buffer.write(data)
+            self.next_index += 1
+            self.updated = time.time()
+            self._decode(data)
+            return self.status()
+
+    def _decode(self, data):
+        if self.decode_failed:
+            return
+        try:
+            if self.audio_format is None:
+                self.audio_format = sniff_format(data)['format']
+                if self.audio_format == 'wav':
+                    self.decoder = IncrementalWavDecoder(TARGET_SAMPLE_RATE)
+                else:
+                    self.decoder = transcoder.open_stream(TARGET_SAMPLE_RATE, self.audio_format)
+            if self.decoder is None:
+                # No ffmpeg slot free: the whole upload is decoded at finalize instead
+                self.decode_failed = True
+                return
+            self._analyze(self.decoder.feed(data))
+        except Exception as e:
+            logger.warning(f"Incremental decode of upload {self.upload_id} stopped: {e}")
+            self._stop_decoder()
+
+    def _analyze(self, samples):
+        """Keep decoded PCM and compute VAD frame energy for every complete frame"""
+        if len(samples) == 0:
+            return
+        self.pcm_parts.append(samples)
+        self.decoded_samples += len(samples)
+        pending = np.concatenate([self.pending, samples])
+        complete = len(pending) - len(pending) % FRAME_LENGTH
+        if complete:
+            self.energy_parts.append(frame_energy(pending[:complete], TARGET_SAMPLE_RATE, VAD_FRAME_MS))
+        self.pending = pending[complete:]
+
+    def release_idle_decoder(self, cutoff):
+        """Stop an ffmpeg stream decode that has had no chunk since ``cutoff``; True if one was stopped"""
+        with self.lock:
+            if self.decoder is None or isinstance(self.decoder, IncrementalWavDecoder) or self.updated >= cutoff:
+                return False
+            self._stop_decoder()
+            return True
+
+    def _stop_decoder(self):
+        self.decode_failed = True
+        if self.decoder is not None:
+            self.decoder.abort()
+            self.decoder = None
+        self.pcm_parts = []
+        self.energy_parts = []
+
+    def finish_decode(self):
+        """(samples, frame_energy) decoded while uploading, or None if the decode did not keep up"""
+        with self.lock:
+            if self.decode_failed or self.decoder is None:
+                return None
+            decoder, self.decoder = self.decoder, None
+            try:
+                self._analyze(decoder.close())
+            except Exception as e:
+                logger.warning(f"Incremental decode of upload {self.upload_id} failed at finalize: {e}")
+                self.decode_failed = True
+                return None
+            if len(self.pending):
+                self.energy_parts.append(frame_energy(self.pending, TARGET_SAMPLE_RATE, VAD_FRAME_MS))
+                self.pending = self.pending[:0]
+            if not self.pcm_parts:
+                return None
+            return np.concatenate(self.pcm_parts), np.concatenate(self.energy_parts)
+
+    def status(self):
+        return {
+            'upload_id': self.upload_id,
+            'next_index': self.next_index,
+            'received_bytes': self.buffer.size,
+            'decoded_ms': round(self.decoded_samples * 1000 / TARGET_SAMPLE_RATE),
+            'chunk_size': UPLOAD_CHUNK_BYTES,
+        }
+
+    def close(self):
+        with self.lock:
+            if self.decoder is not None:
+                self.decoder.abort()
+                self.decoder = None
+            self.buffer.close()
+
+
+class UploadStore:
+    """In-memory registry of uploads in progress, expiring idle ones
+
+    While uploads exist a reaper thread frees decoders of stalled uploads
+    and drops uploads idle past the TTL. At most ``max_active`` uploads are
+    open at once; ``create`` refuses more with a 503.
+    """
+
+    def __init__(self, ttl_seconds=None, decode_idle_seconds=None, max_active=None):
+        self.ttl_seconds = ttl_seconds or UPLOAD_TTL_SECONDS
+        self.decode_idle_seconds = decode_idle_seconds or UPLOAD_DECODE_IDLE_SECONDS
+        self.max_active = max_active or UPLOAD_MAX_ACTIVE
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def create(self, filename=None):
+        self._expire()
+        with self.lock:
+            if len(self.uploads) >= self.max_active:
+                raise UploadError("Too many uploads in progress; try again shortly", status=503)
+            upload = ChunkedUpload(uuid.uuid4().hex, filename)
+            self.uploads[upload.upload_id] = upload
+            if self.reaper is None or not self.reaper.is_alive():
+                self.reaper = threading.Thread(target=self._reap, name='upload-reaper', daemon=True)
+                self.reaper.start()
+        return upload
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, self.decode_idle_seconds / 2))
+            self._expire()
+            with self.lock:
+                if not self.uploads:
+                    self.reaper = None
+                    return
+
+    def get(self, upload_id):
+        self._expire()
+        with self.lock:
+            return self.uploads.get(upload_id)
+
+    def pop(self, upload_id):
+        with self.lock:
+            return self.uploads.pop(upload_id, None)
+
+    def discard(self, upload_id):
+        upload = self.pop(upload_id)
+        if upload:
+            upload.close()
+        return upload is not None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            expired = [upload_id for upload_id, upload in self.uploads.items() if upload.updated < cutoff]
+            stale = [self.uploads.pop(upload_id) for upload_id in expired]
+            active = list(self.uploads.values())
+        for upload in stale:
+            logger.info(f"Dropping idle upload {upload.upload_id}")
+            upload.close()
+        decode_cutoff = time.time() - self.decode_idle_seconds
+        for upload in active:
+            if upload.release_idle_decoder(decode_cutoff):
+                logger.info(f"Released the decoder of stalled upload {upload.upload_id}")
@@ -1,43 +1,331 @@
-from pymongo import MongoClient
-from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient, ReturnDocument
+from pymongo.errors import (BulkWriteError, ConnectionFailure, OperationFailure, PyMongoError,
+                            ServerSelectionTimeoutError)
 import logging
 import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
+
+from services.facet_index import FacetIndex
+from services.image_store import create_image_store
+from services.pagination import decode_cursor, encode_cursor
+from services.session_archive import (SESSION_ARCHIVE_DAYS, SESSION_ARCHIVE_INTERVAL_SECONDS,
+                                      SESSION_RETENTION_DAYS, SessionArchive)
+from services.session_cache import SessionCache
+from services.session_writer import WriteBehindFull, WriteBehindWriter
+from services.storage_backends import HEAVY_FIELDS_PROJECTION, StorageBackend
 
 logger = logging.getLogger(__name__)
 
-class DatabaseService:
-    def __init__(self):
-        """Initialize MongoDB connection"""
+# Write-behind mode: sessions get their id immediately and are inserted in background batches
+WRITE_BEHIND = os.getenv('MONGODB_WRITE_BEHIND', 'false').lower() == 'true'
+
+# Connection pool and timeouts; the client connects lazily, nothing blocks at startup
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', 100)),
+    'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+    'serverSelectionTimeoutMS': int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 2000)),
+    'connectTimeoutMS': int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 2000)),
+    'socketTimeoutMS': int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 10000)),
+}
+
+# Background health checks, and how many sessions are held for replay while MongoDB is down
+HEALTH_INTERVAL_SECONDS = float(os.getenv('MONGODB_HEALTH_INTERVAL_SECONDS', 10))
+RECONNECT_INTERVAL_SECONDS = float(os.getenv('MONGODB_RECONNECT_INTERVAL_SECONDS', 2))
+REPLAY_BUFFER_SIZE = int(os.getenv('MONGODB_REPLAY_BUFFER_SIZE', 1000))
+
+# Released image blobs are deleted by the monitor once no session has claimed them for this long
+IMAGE_RELEASE_GRACE_SECONDS = float(os.getenv('IMAGE_RELEASE_GRACE_SECONDS', 60))
+
+# Mongo duplicate key error; a replayed session may already have been written
+DUPLICATE_KEY = 11000
+
+# get_statistics answers from memory for this long before asking Mongo again
+STATS_TTL_SECONDS = float(os.getenv('MONGODB_STATS_TTL_SECONDS', 5))
+
+# Concept arrays that get multikey indexes (paired with timestamp for sorted filters)
+CONCEPT_FIELDS = [
+    'visual_concepts.keywords',
+    'visual_concepts.visual_elements.objects',
+    'visual_concepts.visual_elements.colors',
+]
+
+class DatabaseService(StorageBackend):
+    name = 'mongodb'
+    
+    def __init__(self, mongo_uri: str = None, background: bool = True):
+        """
+        Initialize MongoDB connection
+        
+        ``background=False`` is for one-off tools: no health monitor (so no
+        index builds, facet load or archiving), no write-behind flusher and no
+        fork handling; the client is simply used as is.
+        """
+        self.connected = False
+        self.stats_cache = None
+        self.stats_lock = threading.Lock()
+        # Recently saved and read sessions, so detail views rarely reach MongoDB
+        self.session_cache = SessionCache()
+        # Old sessions move to compressed day files (still readable by id) when archiving is on
+        self.archive = SessionArchive() if SESSION_ARCHIVE_DAYS else None
+        self.last_archive_run = None
+        # Concept facets of every session as roaring bitmaps, loaded once MongoDB is reachable
+        self.facets = FacetIndex()
+        self.facets_loading = None
+        self.indexes_ready = False
+        self.replay_buffer = OrderedDict()
+        self.replay_lock = threading.Lock()
+        # Blobs whose last known reference went away, swept by the monitor after a grace period
+        self.released_blobs = {}
+        self.release_lock = threading.Lock()
+        self.stopping = threading.Event()
+        
+        self.mongo_uri = mongo_uri or os.getenv('MONGODB_URI', 'mongodb://localhost:27017/echosketch')
+        self.writer = None
+        self.monitor = None
+        self.pid = os.getpid()
+        self._connect()
+        if not background:
+            self.connected = self.collection is not None
+            return
+        self._start_background()
+        
+        # gunicorn --preload imports the app once and forks workers: the client's sockets
+        # and every background thread stay behind in the parent, so each child starts its own
+        service = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: service() is not None and service()._after_fork())
+    
+    def _connect(self):
+        """Create the client, collections and image store (nothing is contacted yet)"""
         self.client = None
         self.db = None
         self.collection = None
-        self.connected = False
-        
+        self.counters = None
         try:
-            # Get MongoDB URI from environment
-            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/echosketch')
-            
-            # Connect to MongoDB with timeout
-            self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+            # MongoClient connects in the background; the health monitor reports when it is up
+            self.client = MongoClient(self.mongo_uri, **MONGO_CLIENT_OPTIONS)
             
             # Get database (will be created if doesn't exist)
-            db_name = mongo_uri.split('/')[-1] if '/' in mongo_uri else 'echosketch'
+            db_name = self.mongo_uri.split('/')[-1] if '/' in self.mongo_uri else 'echosketch'
             self.db = self.client[db_name]
             
             # Get collection for sessions
             self.collection = self.db.sessions
-            
-            # Test connection
-            self.client.admin.command('ismaster')
-            self.connected = True
-            logger.info(f"Connected to MongoDB: {db_name}")
+            # One small document of running totals and timestamp bounds for get_statistics
+            self.counters = self.db.counters
             
         except Exception as e:
-            logger.warning(f"Could not connect to MongoDB: {e}")
+            logger.warning(f"Could not configure MongoDB client: {e}")
             logger.info("Running without database persistence")
             self.client = None
-            self.connected = False
+        
+        # Image bytes go to GridFS or disk; sessions keep only a reference
+        self.images = None
+        if self.db is not None:
+            try:
+                self.images = create_image_store(self.db)
+            except Exception as e:
+                logger.warning(f"Image store unavailable, keeping images inline: {e}")
+    
+    def _start_background(self):
+        """Start the write-behind flusher (if enabled) and the health monitor"""
+        if WRITE_BEHIND and self.collection is not None:
+            self.writer = WriteBehindWriter(
+                lambda: self.collection,
+                batch_size=int(os.getenv('MONGODB_WRITE_BATCH_SIZE', 100)),
+                flush_interval=int(os.getenv('MONGODB_FLUSH_INTERVAL_MS', 200)) / 1000,
+                max_queue=int(os.getenv('MONGODB_WRITE_QUEUE_SIZE', 10000)),
+                on_write=self._count_inserted,
+                # Image bytes move to the image store in the flusher, off the request thread
+                prepare=self._externalize_images
+            )
+            logger.info("Session write-behind enabled")
+        
+        if self.client is not None:
+            self.monitor = threading.Thread(target=self._monitor, name='mongodb-health', daemon=True)
+            self.monitor.start()
+    
+    def _after_fork(self):
+        """Give a forked worker its own client, locks and background threads"""
+        if self.pid == os.getpid() or self.stopping.is_set():
+            return
+        self.pid = os.getpid()
+        # Locks may have been held by parent threads that do not exist here
+        self.stopping = threading.Event()
+        self.stats_lock = threading.Lock()
+        self.replay_lock = threading.Lock()
+        self.release_lock = threading.Lock()
+        self.stats_cache = None
+        self.session_cache = SessionCache()
+        self.facets = FacetIndex()
+        self.facets_loading = None
+        self.last_archive_run = None
+        self.connected = False
+        if self.writer is not None:
+            # The parent's queue never gets flushed from this process; replay what it held (duplicates are skipped)
+            self.writer.stopping.set()
+            for document in list(self.writer.pending.values()):
+                self.replay_buffer.setdefault(document['_id'], document)
+            self.writer = None
+        self._connect()
+        self._start_background()
+    
+    def _monitor(self):
+        """Track connection health, finishing setup and replaying buffered sessions on (re)connect"""
+        while not self.stopping.is_set():
+            try:
+                self.client.admin.command('ping')
+                healthy = True
+            except Exception as e:
+                healthy = False
+                if self.connected:
+                    logger.warning(f"Lost MongoDB connection, buffering writes: {e}")
+            
+            if healthy and not self.connected:
+                logger.info(f"Connected to MongoDB: {self.db.name}")
+                if not self.indexes_ready and os.getenv('MONGODB_ENSURE_INDEXES', 'true').lower() == 'true':
+                    self.ensure_indexes()
+                self.indexes_ready = True
+                if self.facets_loading is None:
+                    self.facets_loading = threading.Thread(target=self.load_facets, name='facet-index', daemon=True)
+                    self.facets_loading.start()
+            self.connected = healthy
+            if healthy and self.replay_buffer:
+                self._replay()
+            if healthy and (self.archive or SESSION_RETENTION_DAYS) and (
+                    self.last_archive_run is None or
+                    time.monotonic() - self.last_archive_run >= SESSION_ARCHIVE_INTERVAL_SECONDS):
+                self.last_archive_run = time.monotonic()
+                self.archive_sessions()
+                self.expire_sessions()
+            if healthy and self.released_blobs:
+                self.sweep_images()
+            self.stopping.wait(HEALTH_INTERVAL_SECONDS if healthy else RECONNECT_INTERVAL_SECONDS)
+    
+    def _buffer(self, session_data):
+        """Hold a session for replay once MongoDB is reachable; False when the buffer is full"""
+        session_data.setdefault('_id', ObjectId())
+        with self.replay_lock:
+            if len(self.replay_buffer) >= REPLAY_BUFFER_SIZE:
+                return False
+            self.replay_buffer[session_data['_id']] = session_data
+        return True
+    
+    def _replay(self):
+        """Insert buffered sessions in order; whatever fails stays buffered for the next attempt"""
+        with self.replay_lock:
+            documents = list(self.replay_buffer.values())
+        for start in range(0, len(documents), 100):
+            batch = documents[start:start + 100]
+            for document in batch:
+                # Images kept inline during the outage move to the image store now
+                self._externalize_images(document)
+            try:
+                self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+                if errors:
+                    logger.error(f"Dropping {len(errors)} buffered sessions MongoDB rejected: {errors[0].get('errmsg')}")
+            except PyMongoError as e:
+                logger.warning(f"Replay of buffered sessions interrupted: {e}")
+                return
+            with self.replay_lock:
+                for document in batch:
+                    self.replay_buffer.pop(document['_id'], None)
+            self._count_inserted(batch)
+            logger.info(f"Replayed {len(batch)} sessions buffered while MongoDB was unavailable")
+    
+    def ensure_indexes(self):
+        """Create the indexes listing, search and concept filters rely on (idempotent)"""
+        try:
+            # Newest-first listing and keyset pagination on (timestamp, _id)
+            self.collection.create_index([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id_desc')
+            # Only one text index per collection; weights favour what the user said
+            self.collection.create_index(
+                [('transcript', TEXT), ('visual_concepts.keywords', TEXT), ('enhanced_prompt', TEXT)],
+                name='session_text',
+                weights={'transcript': 10, 'visual_concepts.keywords': 5, 'enhanced_prompt': 2},
+                default_language='english'
+            )
+            for field in CONCEPT_FIELDS:
+                self.collection.create_index([(field, ASCENDING), ('timestamp', DESCENDING)],
+                                             name=f"{field.split('.')[-1]}_timestamp")
+            # Lets delete_session check whether another session still uses an image blob
+            self.collection.create_index([('image_blobs', ASCENDING)], name='image_blobs', sparse=True)
+            if 'timestamp_ttl' in self.collection.index_information():
+                # Retention used to be a TTL index, which deleted sessions without releasing their images
+                self.collection.drop_index('timestamp_ttl')
+            logger.info("MongoDB indexes ensured")
+        except Exception as e:
+            logger.warning(f"Could not create MongoDB indexes: {e}")
+    
+    def archive_sessions(self, older_than_days: int = None, batch_size: int = 500) -> int:
+        """
+        Move sessions older than ``older_than_days`` (default SESSION_ARCHIVE_DAYS) to the archive
+        
+        Documents are written to the archive (images inlined, so the archive is
+        self-contained) before they are deleted from the hot collection.
+        """
+        if self.archive is None:
+            return 0
+        moved = self._remove_old_sessions(older_than_days or SESSION_ARCHIVE_DAYS, batch_size, archive=True)
+        if moved:
+            logger.info(f"Archived {moved} sessions older than {older_than_days or SESSION_ARCHIVE_DAYS} days")
+        return moved
+    
+    def expire_sessions(self, older_than_days: int = None, batch_size: int = 500) -> int:
+        """Delete sessions older than ``older_than_days`` (default SESSION_RETENTION_DAYS) and release their images"""
+        days = older_than_days or SESSION_RETENTION_DAYS
+        if not days:
+            return 0
+        if SESSION_ARCHIVE_DAYS and days <= SESSION_ARCHIVE_DAYS:
+            logger.warning("SESSION_RETENTION_DAYS <= SESSION_ARCHIVE_DAYS: sessions expire before they are archived")
+        expired = self._remove_old_sessions(days, batch_size, archive=False)
+        if expired:
+            logger.info(f"Expired {expired} sessions older than {days} days")
+        return expired
+    
+    def _remove_old_sessions(self, older_than_days, batch_size, archive):
+        """Delete sessions older than the cutoff in batches, archiving each batch first when ``archive``"""
+        if self.collection is None or not self.connected:
+            return 0
+        cutoff = self.get_current_timestamp() - timedelta(days=older_than_days)
+        removed = 0
+        try:
+            while not self.stopping.is_set():
+                batch = list(self.collection.find({'timestamp': {'$lt': cutoff}})
+                             .sort('timestamp', ASCENDING).limit(batch_size))
+                if not batch:
+                    break
+                blob_ids = set()
+                for document in batch:
+                    blob_ids.update(document.pop('image_blobs', []))
+                    if archive:
+                        self._inline_images(document)
+                        image_data = document.get('image_data')
+                        if isinstance(image_data, dict):
+                            # Inlined entries no longer depend on the blobs released below
+                            for entry in [image_data] + list(image_data.get('variations') or []):
+                                entry.pop('image_ref', None)
+                    for view in (False, True):
+                        self.session_cache.invalidate((str(document['_id']), view))
+                    # Facet queries cover the hot collection only
+                    self.facets.remove(document['_id'])
+                if archive:
+                    self.archive.append(batch)
+                self.collection.delete_many({'_id': {'$in': [document['_id'] for document in batch]}})
+                self._release_images(blob_ids)
+                self._update_counters({'$inc': {'deleted': len(batch)}, '$set': {'bounds_stale': True}})
+                removed += len(batch)
+        except Exception as e:
+            logger.error(f"Removing old sessions stopped: {e}")
+        return removed
     
     def save_session(self, session_data: dict) -> str:
         """Save session data to database"""
@@ -50,19 +338,63 @@ class DatabaseService:
             if 'timestamp' not in session_data:
                 session_data['timestamp'] = self.get_current_timestamp()
             
-            # Insert document
-            result = self.collection.insert_one(session_data)
-            session_id = str(result.inserted_id)
-            
-            logger.info(f"Session saved with ID: {session_id}")
+            inline_images = session_data.get('image_data')
+            if self.connected and not self.writer:
+                # Queued and buffered sessions keep their data URIs; the write-behind
+                # flusher or the replay moves them to the image store
+                self._externalize_images(session_data)
+            
+            session_id = self._insert(session_data)
+            if session_id != "no_db_session":
+                self.facets.add(session_id, session_data)
+                # The client usually reads the session it just created straight back
+                stored = dict(session_data, _id=session_id)
+                self.session_cache.put((session_id, False), stored)
+                self.session_cache.put((session_id, True), dict(stored, image_data=inline_images))
             return session_id
             
         except Exception as e:
             logger.error(f"Error saving session: {e}")
             return "error_session"
     
-    def get_session(self, session_id: str) -> dict:
-        """Get session data by ID"""
+    def _insert(self, session_data):
+        """Write (or queue) a prepared session document and return its id"""
+        if not self.connected and not self.writer:
+            # MongoDB is down (or still connecting): keep the session for replay
+            if self._buffer(session_data):
+                return str(session_data['_id'])
+            logger.warning("MongoDB unavailable and replay buffer full - session not saved")
+            return "no_db_session"
+        
+        if self.writer:
+            # Client-generated id; the insert happens in the background
+            session_data.setdefault('_id', ObjectId())
+            try:
+                self.writer.submit(session_data)
+            except WriteBehindFull:
+                # The monitor replays it once MongoDB accepts writes again
+                if self._buffer(session_data):
+                    return str(session_data['_id'])
+                raise
+            return str(session_data['_id'])
+        
+        # Insert document
+        try:
+            result = self.collection.insert_one(session_data)
+        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+            logger.warning(f"MongoDB insert failed, buffering session for replay: {e}")
+            self.connected = False
+            if self._buffer(session_data):
+                return str(session_data['_id'])
+            raise
+        session_id = str(result.inserted_id)
+        self._count_inserted([session_data])
+        
+        logger.info(f"Session saved with ID: {session_id}")
+        return session_id
+    
+    def get_session(self, session_id: str, include_images: bool = True) -> dict:
+        """Get session data by ID (with images as data URIs unless ``include_images`` is False)"""
         try:
             if self.collection is None:
                 logger.warning("No database connection")
@@ -71,12 +403,29 @@ class DatabaseService:
             if session_id in ["no_db_session", "error_session"]:
                 return None
             
-            # Find document by ObjectId
-            document = self.collection.find_one({'_id': ObjectId(session_id)})
+            cached = self.session_cache.get((session_id, include_images))
+            if cached is not None:
+                return cached
+            
+            # Find document by ObjectId (sessions still queued for write-behind or replay included)
+            object_id = ObjectId(session_id)
+            with self.replay_lock:
+                document = self.replay_buffer.get(object_id)
+            if document is None and self.writer:
+                document = self.writer.get_pending(object_id)
+            if document:
+                document = dict(document)
+            elif self.connected:
+                document = self.collection.find_one({'_id': object_id})
+            if document is None and self.archive is not None:
+                document = self.archive.get(session_id)
             
             if document:
                 # Convert ObjectId to string for JSON serialization
                 document['_id'] = str(document['_id'])
+                if include_images:
+                    self._inline_images(document)
+                self.session_cache.put((session_id, include_images), document)
                 logger.info(f"Retrieved session: {session_id}")
                 return document
             else:
@@ -87,39 +436,93 @@ class DatabaseService:
             logger.error(f"Error retrieving session: {e}")
             return None
     
-    def get_recent_sessions(self, limit: int = 10) -> list:
-        """Get recent sessions"""
+    def get_sessions_page(self, limit: int = 10, cursor: str = None) -> tuple:
+        """
+        Newest-first sessions after ``cursor`` and the cursor for the next page
+        
+        Pages seek on the (timestamp, _id) index instead of skipping, so every
+        page costs the same however deep it is. Raises ValueError for a bad cursor.
+        """
+        limit = max(1, limit)
+        query = {}
+        if cursor:
+            timestamp, session_id = decode_cursor(cursor)
+            try:
+                session_id = ObjectId(session_id)
+            except InvalidId as e:
+                raise ValueError(f"Invalid cursor: {cursor!r}") from e
+            query = {'$or': [
+                {'timestamp': {'$lt': timestamp}},
+                {'timestamp': timestamp, '_id': {'$lt': session_id}},
+            ]}
         try:
-            if not self.collection:
-                return []
-            
-            # Find recent sessions sorted by timestamp
-            sessions = list(self.collection.find().sort('timestamp', -1).limit(limit))
+            if self.collection is None or not self.connected:
+                return [], None
+            
+            # One extra document tells whether there is another page
+            sessions = list(self.collection.find(query, HEAVY_FIELDS_PROJECTION)
+                            .sort([('timestamp', DESCENDING), ('_id', DESCENDING)])
+                            .limit(limit + 1))
+            next_cursor = None
+            if len(sessions) > limit:
+                sessions = sessions[:limit]
+                next_cursor = encode_cursor(sessions[-1].get('timestamp'), sessions[-1]['_id'])
             
             # Convert ObjectIds to strings
             for session in sessions:
                 session['_id'] = str(session['_id'])
             
             logger.info(f"Retrieved {len(sessions)} recent sessions")
-            return sessions
+            return sessions, next_cursor
             
         except Exception as e:
             logger.error(f"Error retrieving recent sessions: {e}")
-            return []
+            return [], None
+    
+    def iter_sessions(self, since=None, until=None, fields=None, include_images=False, batch_size=500):
+        """
+        Oldest-first sessions with since <= timestamp < until, streamed from one batched cursor
+        
+        Only ``batch_size`` documents are held at a time. Image bytes are
+        projected out unless ``include_images``.
+        """
+        if self.collection is None:
+            raise ConnectionFailure("No MongoDB connection")
+        query = {}
+        if since is not None or until is not None:
+            query['timestamp'] = {operator: bound for operator, bound in (('$gte', since), ('$lt', until))
+                                  if bound is not None}
+        if fields:
+            projection = {field: 1 for field in fields}
+        else:
+            projection = None if include_images else HEAVY_FIELDS_PROJECTION
+        cursor = (self.collection.find(query, projection)
+                  .sort([('timestamp', ASCENDING), ('_id', ASCENDING)])
+                  .batch_size(batch_size))
+        try:
+            for document in cursor:
+                yield self._export_document(document, fields, include_images)
+        finally:
+            cursor.close()
     
     def delete_session(self, session_id: str) -> bool:
         """Delete a session by ID"""
         try:
-            if not self.collection:
+            if self.collection is None or not self.connected:
                 return False
             
             if session_id in ["no_db_session", "error_session"]:
                 return False
             
+            document = self.collection.find_one({'_id': ObjectId(session_id)}, {'image_blobs': 1})
             result = self.collection.delete_one({'_id': ObjectId(session_id)})
+            self.session_cache.invalidate((session_id, False), (session_id, True))
             
             if result.deleted_count > 0:
                 logger.info(f"Session deleted: {session_id}")
+                self.facets.remove(session_id)
+                self._count_deleted()
+                self._release_images((document or {}).get('image_blobs', []))
                 return True
             else:
                 logger.warning(f"Session not found for deletion: {session_id}")
@@ -129,10 +532,58 @@ class DatabaseService:
             logger.error(f"Error deleting session: {e}")
             return False
     
+    def _release_images(self, blob_ids):
+        """Queue image blobs for deletion by sweep_images once no session references them"""
+        if self.images is None:
+            return
+        now = time.time()
+        with self.release_lock:
+            for blob_id in blob_ids:
+                self.released_blobs.setdefault(blob_id, now)
+    
+    def sweep_images(self, grace_seconds: float = None) -> int:
+        """
+        Delete released blobs that no stored, queued or buffered session references
+        
+        A blob is kept while it was stored or reused within the grace period:
+        a save in this or another worker may have put it without having
+        inserted its session yet.
+        """
+        if self.images is None or self.collection is None:
+            return 0
+        cutoff = time.time() - (IMAGE_RELEASE_GRACE_SECONDS if grace_seconds is None else grace_seconds)
+        with self.release_lock:
+            due = [blob_id for blob_id, released in self.released_blobs.items() if released <= cutoff]
+        if not due:
+            return 0
+        
+        # Snapshot queued documents before querying, so one moving into the collection is seen either way
+        waiting = []
+        if self.writer is not None:
+            with self.writer.lock:
+                waiting += self.writer.pending.values()
+        with self.replay_lock:
+            waiting += self.replay_buffer.values()
+        held = {blob_id for document in waiting for blob_id in document.get('image_blobs', ())}
+        
+        deleted = 0
+        for blob_id in due:
+            try:
+                if blob_id not in held and self.collection.find_one({'image_blobs': blob_id}, {'_id': 1}) is None:
+                    if self.images.claimed_at(blob_id) > cutoff:
+                        continue
+                    self.images.delete(blob_id)
+                    deleted += 1
+                with self.release_lock:
+                    self.released_blobs.pop(blob_id, None)
+            except Exception as e:
+                logger.warning(f"Could not delete image blob {blob_id}: {e}")
+        return deleted
+    
     def update_session(self, session_id: str, update_data: dict) -> bool:
         """Update session data"""
         try:
-            if not self.collection:
+            if self.collection is None or not self.connected:
                 return False
             
             if session_id in ["no_db_session", "error_session"]:
@@ -145,9 +596,11 @@ class DatabaseService:
                 {'_id': ObjectId(session_id)},
                 {'$set': update_data}
             )
+            self.session_cache.invalidate((session_id, False), (session_id, True))
             
             if result.modified_count > 0:
                 logger.info(f"Session updated: {session_id}")
+                self._reindex_facets(session_id, update_data)
                 return True
             else:
                 logger.warning(f"Session not found for update: {session_id}")
@@ -158,21 +611,31 @@ class DatabaseService:
             return False
     
     def search_sessions(self, query: str, limit: int = 20) -> list:
-        """Search sessions by transcript content"""
+        """Search sessions by transcript, keywords and prompt, best matches first"""
         try:
-            if not self.collection:
+            if self.collection is None or not self.connected:
                 return []
             
-            # Create text search query
-            search_query = {
-                '$or': [
-                    {'transcript': {'$regex': query, '$options': 'i'}},
-                    {'visual_concepts.keywords': {'$in': [query]}},
-                    {'visual_concepts.enhanced_prompt': {'$regex': query, '$options': 'i'}}
-                ]
-            }
-            
-            sessions = list(self.collection.find(search_query).sort('timestamp', -1).limit(limit))
+            # $text uses the session_text index; score sorts by relevance
+            projection = dict(HEAVY_FIELDS_PROJECTION, score={'$meta': 'textScore'})
+            try:
+                sessions = list(
+                    self.collection.find({'$text': {'$search': query}}, projection)
+                    .sort([('score', {'$meta': 'textScore'}), ('timestamp', DESCENDING)])
+                    .limit(limit)
+                )
+            except OperationFailure as e:
+                # Text index missing (e.g. index creation disabled): fall back to a regex scan
+                logger.warning(f"Text search unavailable, using regex: {e}")
+                search_query = {
+                    '$or': [
+                        {'transcript': {'$regex': re.escape(query), '$options': 'i'}},
+                        {'visual_concepts.keywords': {'$in': [query]}},
+                        {'enhanced_prompt': {'$regex': re.escape(query), '$options': 'i'}}
+                    ]
+                }
+                sessions = list(self.collection.find(search_query, HEAVY_FIELDS_PROJECTION)
+                                .sort('timestamp', DESCENDING).limit(limit))
             
             # Convert ObjectIds to strings
             for session in sessions:
@@ -185,43 +648,94 @@ class DatabaseService:
             logger.error(f"Error searching sessions: {e}")
             return []
     
+    def _count_inserted(self, documents):
+        """Fold newly stored sessions into the counters document"""
+        timestamps = [document['timestamp'] for document in documents if document.get('timestamp')]
+        update = {'$inc': {'inserted': len(documents)}}
+        if timestamps:
+            update['$min'] = {'oldest': min(timestamps)}
+            update['$max'] = {'newest': max(timestamps)}
+        self._update_counters(update)
+    
+    def _count_deleted(self):
+        # The deleted session may have been the oldest or newest; recompute the bounds lazily
+        self._update_counters({'$inc': {'deleted': 1}, '$set': {'bounds_stale': True}})
+    
+    def _update_counters(self, update):
+        self.stats_cache = None
+        try:
+            self.counters.update_one({'_id': 'sessions'}, update, upsert=True)
+        except Exception as e:
+            logger.warning(f"Could not update session counters: {e}")
+    
+    def _refresh_bounds(self, counters):
+        """Recompute oldest/newest timestamps from the timestamp index (two single-document reads)"""
+        dated = {'timestamp': {'$type': 'date'}}
+        oldest = list(self.collection.find(dated, {'timestamp': 1}).sort('timestamp', ASCENDING).limit(1))
+        newest = list(self.collection.find(dated, {'timestamp': 1}).sort('timestamp', DESCENDING).limit(1))
+        if not oldest:
+            # Never store null bounds: null sorts below every date and would defeat $min
+            update = {'$set': {'bounds_stale': False}, '$unset': {'oldest': '', 'newest': ''}}
+        elif counters.get('bounds_stale'):
+            update = {'$set': {'oldest': oldest[0]['timestamp'], 'newest': newest[0]['timestamp'],
+                               'bounds_stale': False}}
+        else:
+            # First use: $min/$max so a concurrent insert's bounds are not overwritten
+            update = {'$set': {'bounds_stale': False},
+                      '$min': {'oldest': oldest[0]['timestamp']}, '$max': {'newest': newest[0]['timestamp']}}
+        return self.counters.find_one_and_update({'_id': 'sessions'}, update, upsert=True,
+                                                 return_document=ReturnDocument.AFTER)
+    
     def get_statistics(self) -> dict:
-        """Get database statistics"""
+        """Get database statistics (cached for STATS_TTL_SECONDS)"""
         try:
-            if not self.collection:
-                return {'total_sessions': 0, 'database_connected': False}
+            if self.collection is None or not self.connected:
+                return {'total_sessions': 0, 'database_connected': False,
+                        'buffered_writes': len(self.replay_buffer)}
+            
+            with self.stats_lock:
+                if self.stats_cache and self.stats_cache[0] > time.monotonic():
+                    return dict(self.stats_cache[1], session_cache=self.session_cache.stats())
             
+            # Collection metadata count instead of a full count_documents scan
             stats = {
-                'total_sessions': self.collection.count_documents({}),
+                'total_sessions': self.collection.estimated_document_count(),
                 'database_connected': True,
                 'database_name': self.db.name,
                 'collection_name': self.collection.name
             }
+            if self.writer:
+                stats['pending_writes'] = self.writer.stats()['pending']
+            if self.replay_buffer:
+                stats['buffered_writes'] = len(self.replay_buffer)
             
             # Get date range
-            oldest = self.collection.find().sort('timestamp', 1).limit(1)
-            newest = self.collection.find().sort('timestamp', -1).limit(1)
-            
-            oldest_list = list(oldest)
-            newest_list = list(newest)
-            
-            if oldest_list and newest_list:
-                stats['oldest_session'] = oldest_list[0]['timestamp']
-                stats['newest_session'] = newest_list[0]['timestamp']
-            
-            return stats
+            # Bounds are checked against the index once (sessions may predate the counters) and after deletes
+            counters = self.counters.find_one({'_id': 'sessions'}) or {}
+            if counters.get('bounds_stale', True):
+                counters = self._refresh_bounds(counters)
+            if counters.get('oldest') and counters.get('newest'):
+                stats['oldest_session'] = counters['oldest']
+                stats['newest_session'] = counters['newest']
+            
+            with self.stats_lock:
+                self.stats_cache = (time.monotonic() + STATS_TTL_SECONDS, stats)
+            return dict(stats, session_cache=self.session_cache.stats())
             
         except Exception as e:
             logger.error(f"Error getting statistics: {e}")
             return {'total_sessions': 0, 'database_connected': False, 'error': str(e)}
     
-    def get_current_timestamp(self) -> datetime:
-        """Get current timestamp in UTC"""
-        return datetime.now(timezone.utc)
-    
     def close_connection(self):
         """Close database connection"""
         try:
+            self.stopping.set()
+            if self.replay_buffer and self.connected:
+                self._replay()
+            if self.replay_buffer:
+                logger.error(f"{len(self.replay_buffer)} buffered sessions were never written to MongoDB")
+            if self.writer:
+                self.writer.close()
             if self.client:
                 self.client.close()
                 logger.info("Database connection closed")
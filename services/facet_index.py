@@ -0,0 +1,407 @@
+import itertools
+import threading
+from collections import Counter
+
+import numpy as np
+
+# Concept facets that can be filtered on, each value becoming a term with its own bitmap
+FACETS = ('objects', 'colors', 'settings', 'mood', 'style')
+
+CONTAINER_BITS = 16
+CONTAINER_MASK = (1 << CONTAINER_BITS) - 1
+# Above this many values a container is stored as a 65536-bit bitset instead of a sorted array
+ARRAY_LIMIT = 4096
+ONE = np.uint64(1)
+
+# Facet counts tally matched sessions' terms directly up to this many matches per indexed term
+SCAN_MATCHES_PER_TERM = 16
+
+
+def _values(value):
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def session_facets(session):
+    """{facet: set of values} from a session's visual concepts
+
+    Handles both the flat concepts of the minimal app and the NLP service's
+    nested visual_elements / attributes (where settings are weather + time).
+    """
+    concepts = session.get('visual_concepts') or {}
+    elements = concepts.get('visual_elements') or {}
+    attributes = concepts.get('attributes') or {}
+    raw = {
+        'objects': _values(concepts.get('objects')) + _values(elements.get('objects')),
+        'colors': _values(concepts.get('colors')) + _values(elements.get('colors')),
+        'settings': _values(concepts.get('settings')) + _values(elements.get('weather')) + _values(elements.get('time')),
+        'mood': _values(concepts.get('mood')) + _values(attributes.get('mood')),
+        'style': _values(concepts.get('style')) + _values(attributes.get('style')),
+    }
+    return {facet: {normalize(value) for value in values if normalize(value)} for facet, values in raw.items()}
+
+
+def normalize(value):
+    return str(value).strip().lower()
+
+
+def parse_facet_filters(args):
+    """{facet: [values]} from query arguments like ``?objects=moon&colors=blue,red``
+
+    Repeated or comma-separated values must all match. Raises ValueError
+    for an argument that is not a facet (``limit`` and ``facet_limit`` aside).
+    """
+    filters = {}
+    for key in args:
+        if key in ('limit', 'facet_limit'):
+            continue
+        if key not in FACETS:
+            raise ValueError(f"Unknown facet: {key!r} (expected one of: {', '.join(FACETS)})")
+        values = [value.strip() for arg in args.getlist(key) for value in arg.split(',') if value.strip()]
+        if values:
+            filters[key] = values
+    return filters
+
+
+def _is_bitset(container):
+    return container.dtype == np.uint64
+
+
+def _popcount(words):
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def _unpack(words):
+    """Bitset as 65536 booleans"""
+    return np.unpackbits(words.view(np.uint8), bitorder='little').view(bool)
+
+
+def _to_bitset(array):
+    present = np.zeros(1 << CONTAINER_BITS, dtype=bool)
+    present[array] = True
+    return np.packbits(present, bitorder='little').view('<u8').copy()
+
+
+def _to_array(words):
+    return np.flatnonzero(_unpack(words)).astype(np.uint16)
+
+
+def _cardinality(container):
+    return _popcount(container) if _is_bitset(container) else len(container)
+
+
+def _compact(container):
+    """Array form for a sparse bitset; None for an empty container"""
+    if _is_bitset(container):
+        cardinality = _popcount(container)
+        if cardinality > ARRAY_LIMIT:
+            return container
+        container = _to_array(container)
+    return container if len(container) else None
+
+
+def _intersect(a, b):
+    if _is_bitset(a) and _is_bitset(b):
+        return a & b
+    if _is_bitset(a):
+        a, b = b, a
+    if _is_bitset(b):
+        return a[(b[a >> 6] >> (a & 63).astype(np.uint64)) & ONE == ONE]
+    return np.intersect1d(a, b, assume_unique=True)
+
+
+class RoaringBitmap:
+    """Compressed set of non-negative ints in the roaring layout
+
+    Values are split by their high 16 bits into containers: a sorted uint16
+    array while sparse, a 1024-word uint64 bitset once it holds more than
+    ARRAY_LIMIT values. Intersections work container by container with
+    vectorised array/bitset operations.
+    """
+
+    __slots__ = ('containers', 'cardinality')
+
+    def __init__(self, values=()):
+        self.containers = {}
+        self.cardinality = 0
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        high, low = value >> CONTAINER_BITS, value & CONTAINER_MASK
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = np.array([low], dtype=np.uint16)
+        elif _is_bitset(container):
+            word, bit = low >> 6, ONE << np.uint64(low & 63)
+            if container[word] & bit:
+                return
+            container[word] |= bit
+        else:
+            index = int(np.searchsorted(container, low))
+            if index < len(container) and container[index] == low:
+                return
+            container = np.insert(container, index, low)
+            self.containers[high] = _to_bitset(container) if len(container) > ARRAY_LIMIT else container
+        self.cardinality += 1
+
+    def update(self, values):
+        """Add many values at once; ``values`` must be ascending and not already present"""
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values):
+            return
+        for chunk in np.split(values, np.flatnonzero(np.diff(values >> CONTAINER_BITS)) + 1):
+            high = int(chunk[0] >> CONTAINER_BITS)
+            lows = (chunk & CONTAINER_MASK).astype(np.uint16)
+            container = self.containers.get(high)
+            if container is None:
+                merged = lows
+            elif _is_bitset(container):
+                merged = container | _to_bitset(lows)
+            else:
+                merged = np.union1d(container, lows).astype(np.uint16)
+            if not _is_bitset(merged) and len(merged) > ARRAY_LIMIT:
+                merged = _to_bitset(merged)
+            self.containers[high] = merged
+        self.cardinality += len(values)
+
+    def discard(self, value):
+        if value not in self:
+            return
+        high, low = value >> CONTAINER_BITS, value & CONTAINER_MASK
+        container = self.containers[high]
+        if _is_bitset(container):
+            container[low >> 6] &= ~(ONE << np.uint64(low & 63))
+        else:
+            container = np.delete(container, int(np.searchsorted(container, low)))
+        container = _compact(container)
+        if container is None:
+            del self.containers[high]
+        else:
+            self.containers[high] = container
+        self.cardinality -= 1
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> CONTAINER_BITS)
+        if container is None:
+            return False
+        low = value & CONTAINER_MASK
+        if _is_bitset(container):
+            return bool(container[low >> 6] >> np.uint64(low & 63) & ONE)
+        index = int(np.searchsorted(container, low))
+        return index < len(container) and container[index] == low
+
+    def __len__(self):
+        return self.cardinality
+
+    def __and__(self, other):
+        result = RoaringBitmap()
+        smaller, larger = sorted((self.containers, other.containers), key=len)
+        for high, container in smaller.items():
+            if high in larger:
+                intersection = _compact(_intersect(container, larger[high]))
+                if intersection is not None:
+                    result.containers[high] = intersection
+                    result.cardinality += _cardinality(intersection)
+        return result
+
+    def intersection_len(self, other):
+        """len(self & other) without building the result"""
+        total = 0
+        smaller, larger = sorted((self.containers, other.containers), key=len)
+        for high, container in smaller.items():
+            if high in larger:
+                total += _cardinality(_intersect(container, larger[high]))
+        return total
+
+    def _lows(self, high):
+        container = self.containers[high]
+        return (_to_array(container) if _is_bitset(container) else container).tolist()
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            for low in self._lows(high):
+                yield high << CONTAINER_BITS | low
+
+    def iter_descending(self):
+        for high in sorted(self.containers, reverse=True):
+            for low in reversed(self._lows(high)):
+                yield high << CONTAINER_BITS | low
+
+
+class FacetIndex:
+    """Concept facets of sessions as term ids with one RoaringBitmap of session ordinals each
+
+    Sessions get ordinals in time order, so matches come back newest first by
+    walking bitmaps from the top. While a bulk load runs, sessions it has not
+    reached yet are held back and get their ordinals after it, so a live add
+    never lands below older loaded sessions.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.term_ids = {facet: {} for facet in FACETS}
+        self.bitmaps = []
+        self.terms = []
+        self.session_ids = []
+        self.ordinals = {}
+        self.session_terms = {}
+        self.live = RoaringBitmap()
+        self.loading = False
+        self.deferred = {}
+
+    def add(self, session_id, session):
+        """Index a session's facets; re-indexing keeps its ordinal (and so its place in time order)"""
+        session_id = str(session_id)
+        facets = session_facets(session)
+        with self.lock:
+            if self.loading and session_id not in self.ordinals:
+                self.deferred[session_id] = facets
+                return
+            self._index(session_id, facets)
+
+    def _index(self, session_id, facets):
+        ordinal = self.ordinals.get(session_id)
+        if ordinal is None:
+            ordinal = self.ordinals[session_id] = len(self.session_ids)
+            self.session_ids.append(session_id)
+        for term_id in self.session_terms.pop(ordinal, ()):
+            self.bitmaps[term_id].discard(ordinal)
+        terms = [self._term_id(facet, value) for facet, values in facets.items() for value in values]
+        for term_id in terms:
+            self.bitmaps[term_id].add(ordinal)
+        self.session_terms[ordinal] = tuple(terms)
+        self.live.add(ordinal)
+
+    def load(self, sessions, batch_size=10000):
+        """Bulk-index session documents (oldest first), building bitmaps a batch at a time
+
+        The lock is held per batch only. Sessions saved or updated meanwhile
+        wait in ``deferred``: ones the load reaches take their place in time
+        order with the newer facets, the rest are indexed after the load.
+        """
+        loaded = 0
+        iterator = iter(sessions)
+        with self.lock:
+            self.loading = True
+        try:
+            while True:
+                batch = [(str(session['_id']), session_facets(session))
+                         for session in itertools.islice(iterator, batch_size)]
+                if not batch:
+                    return loaded
+                loaded += self._load_batch(batch)
+        finally:
+            with self.lock:
+                self.loading = False
+                for session_id, facets in self.deferred.items():
+                    self._index(session_id, facets)
+                self.deferred = {}
+
+    def _load_batch(self, batch):
+        with self.lock:
+            postings, ordinals = {}, []
+            for session_id, facets in batch:
+                if session_id in self.ordinals:
+                    continue
+                facets = self.deferred.pop(session_id, facets)
+                ordinal = self.ordinals[session_id] = len(self.session_ids)
+                self.session_ids.append(session_id)
+                terms = [self._term_id(facet, value) for facet, values in facets.items() for value in values]
+                for term_id in terms:
+                    postings.setdefault(term_id, []).append(ordinal)
+                self.session_terms[ordinal] = tuple(terms)
+                ordinals.append(ordinal)
+            for term_id, term_ordinals in postings.items():
+                self.bitmaps[term_id].update(term_ordinals)
+            self.live.update(ordinals)
+            return len(ordinals)
+
+    def _term_id(self, facet, value):
+        term_id = self.term_ids[facet].get(value)
+        if term_id is None:
+            term_id = self.term_ids[facet][value] = len(self.bitmaps)
+            self.bitmaps.append(RoaringBitmap())
+            self.terms.append((facet, value))
+        return term_id
+
+    def remove(self, session_id):
+        with self.lock:
+            self._remove(str(session_id))
+
+    def _remove(self, session_id):
+        self.deferred.pop(session_id, None)
+        ordinal = self.ordinals.pop(session_id, None)
+        if ordinal is None:
+            return
+        # Ordinals are not reused; the id slot is cleared so it never matches again
+        self.session_ids[ordinal] = None
+        for term_id in self.session_terms.pop(ordinal, ()):
+            self.bitmaps[term_id].discard(ordinal)
+        self.live.discard(ordinal)
+
+    def query(self, filters, limit=50, facet_limit=10):
+        """Sessions having every value in ``filters`` ({facet: [values]}), newest first
+
+        Returns {'total', 'session_ids', 'facets'}; ``facets`` gives the
+        ``facet_limit`` most common values of each facet among the matches.
+        """
+        with self.lock:
+            bitmaps = []
+            for facet, values in filters.items():
+                for value in values:
+                    term_id = self.term_ids[facet].get(normalize(value))
+                    bitmaps.append(self.bitmaps[term_id] if term_id is not None else RoaringBitmap())
+            if bitmaps:
+                bitmaps.sort(key=len)
+                matches = bitmaps[0]
+                for bitmap in bitmaps[1:]:
+                    if not matches.containers:
+                        break
+                    matches = matches & bitmap
+            else:
+                matches = self.live
+
+            session_ids = []
+            for ordinal in matches.iter_descending():
+                if len(session_ids) >= limit:
+                    break
+                session_ids.append(self.session_ids[ordinal])
+
+            counts = {facet: [] for facet in FACETS}
+            for term_id, count in self._term_counts(matches).items():
+                facet, value = self.terms[term_id]
+                counts[facet].append((count, value))
+            counts = {facet: {value: count for count, value in sorted(values, key=lambda item: (-item[0], item[1]))[:facet_limit]}
+                      for facet, values in counts.items()}
+            return {'total': len(matches), 'session_ids': session_ids, 'facets': counts}
+
+    def _term_counts(self, matches):
+        """{term_id: number of matches having the term}"""
+        if matches is self.live:
+            return {term_id: len(bitmap) for term_id, bitmap in enumerate(self.bitmaps) if len(bitmap)}
+        # Few matches: tally their own terms; many: intersect every term bitmap with them
+        if len(matches) <= SCAN_MATCHES_PER_TERM * len(self.bitmaps):
+            return Counter(itertools.chain.from_iterable(map(self.session_terms.__getitem__, matches)))
+        words = {high: container if _is_bitset(container) else _to_bitset(container)
+                 for high, container in matches.containers.items()}
+        present = {high: _unpack(container) for high, container in words.items()}
+        counts = {}
+        for term_id, bitmap in enumerate(self.bitmaps):
+            count = 0
+            for high, container in bitmap.containers.items():
+                if high in words:
+                    count += (_popcount(container & words[high]) if _is_bitset(container)
+                              else int(np.count_nonzero(present[high][container])))
+            if count:
+                counts[term_id] = count
+        return counts
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __contains__(self, session_id):
+        return str(session_id) in self.ordinals
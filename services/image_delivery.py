@@ -0,0 +1,53 @@
+import gzip
+import hashlib
+
+from flask import Response, request
+
+from services.image_utils import decode_data_uri
+
+# Text based formats worth compressing; PNG/WebP are already compressed
+COMPRESSIBLE_MIMETYPES = {'image/svg+xml'}
+
+# Image bytes are derived from a deterministic seed, so they can be cached
+# by browsers and CDNs and revalidated cheaply with the ETag
+IMAGE_CACHE_CONTROL = 'public, max-age=86400'
+
+
+def make_image_response(content, mimetype=None, encoder=None):
+    """Build a cacheable raw image response from bytes or a data URI
+
+    Returns None when the payload cannot be decoded. Handles If-None-Match
+    (304) and gzip for text formats such as SVG; the gzip body gets its own
+    ETag (``-gzip`` suffix) since it is a different entity. When an ImageEncoder is
+    given, the ``?w=`` parameter and the Accept header select the rendition.
+    """
+    if isinstance(content, str):
+        mimetype, content = decode_data_uri(content)
+    if content is None:
+        return None
+
+    negotiated = False
+    if encoder is not None:
+        width = request.args.get('w', type=int)
+        # Only switch to WebP/AVIF when the client names it explicitly;
+        # a bare */* gets the universally supported PNG
+        accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+        target = next((m for m in encoder.output_mimetypes() if m in accepted), 'image/png')
+        content, mimetype = encoder.rendition(content, mimetype, width, target)
+        negotiated = True
+
+    compress = mimetype in COMPRESSIBLE_MIMETYPES and 'gzip' in request.accept_encodings
+    etag = hashlib.sha256(content).hexdigest()[:32]
+    response = Response(content, mimetype=mimetype or 'application/octet-stream')
+    response.set_etag(f'{etag}-gzip' if compress else etag)
+    response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    if negotiated:
+        response.vary.add('Accept')
+    response.make_conditional(request)
+
+    if compress and response.status_code == 200:
+        # mtime=0 keeps the compressed bytes identical between requests
+        response.set_data(gzip.compress(content, compresslevel=6, mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
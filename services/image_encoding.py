@@ -0,0 +1,164 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Try to import PIL (Pillow), handle gracefully if not available
+try:
+    from PIL import Image, features
+    PIL_AVAILABLE = True
+except (ImportError, Exception):
+    PIL_AVAILABLE = False
+    Image = features = None
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths served to listings; anything larger is the full image
+RENDITION_WIDTHS = (64, 256)
+
+# Output formats in order of preference (smallest first)
+FORMAT_MIMETYPES = OrderedDict([
+    ('avif', 'image/avif'),
+    ('webp', 'image/webp'),
+    ('png', 'image/png'),
+])
+
+# Vector formats scale without re-encoding
+VECTOR_MIMETYPES = {'image/svg+xml'}
+
+# Images waiting for background thumbnail encoding; past this, renditions are encoded on first request
+PREPARE_QUEUE_LIMIT = int(os.getenv('IMAGE_PREPARE_QUEUE_LIMIT', 32))
+
+ENCODE_OPTIONS = {
+    'avif': {'quality': 60, 'speed': 8},
+    'webp': {'quality': 80, 'method': 4},
+    'png': {'optimize': True},
+}
+
+
+def _supported_formats():
+    """Return the output formats this Pillow build can write"""
+    if not PIL_AVAILABLE:
+        return []
+    supported = []
+    for fmt in FORMAT_MIMETYPES:
+        if fmt == 'png' or features.check(fmt):
+            supported.append(fmt)
+    return supported
+
+
+def snap_width(width):
+    """Snap a requested width to a rendition size (None means full size)"""
+    if not width or width <= 0:
+        return None
+    for rendition_width in RENDITION_WIDTHS:
+        if width <= rendition_width:
+            return rendition_width
+    return None
+
+
+class ImageEncoder:
+    """Encodes generated images into WebP/AVIF/PNG renditions at 64/256/full width
+
+    Encoded renditions are cached in a byte-bounded LRU keyed by the source
+    content hash, so each variant is encoded once per image. When an
+    ImagePostProcessor is given, encoding runs in its process pool.
+    ``prepare`` builds thumbnails on a background thread, never the caller's.
+    """
+
+    def __init__(self, max_cache_bytes=None, processor=None):
+        self.processor = processor
+        self.max_cache_bytes = max_cache_bytes or int(os.getenv('IMAGE_RENDITION_CACHE_BYTES', 32 * 1024 * 1024))
+        self.formats = _supported_formats()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        # Created on first use, so forked workers each start their own thread
+        self.preparer = None
+        self.preparing = 0
+        logger.info(f"Image encoder initialized with formats: {', '.join(self.formats) or 'none'}")
+
+    def output_mimetypes(self):
+        """Mimetypes available for content negotiation, most preferred first"""
+        return [FORMAT_MIMETYPES[fmt] for fmt in self.formats]
+
+    def rendition(self, content, mimetype, width=None, target_mimetype=None):
+        """Return (bytes, mimetype) for the requested width and output format"""
+        if mimetype in VECTOR_MIMETYPES or not self.formats:
+            return content, mimetype
+
+        width = snap_width(width)
+        fmt = next((f for f, m in FORMAT_MIMETYPES.items() if m == target_mimetype and f in self.formats), None)
+        if fmt is None:
+            fmt = 'png'
+        if width is None and FORMAT_MIMETYPES[fmt] == mimetype:
+            return content, mimetype
+
+        key = (hashlib.sha256(content).hexdigest(), width, fmt)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                return cached, FORMAT_MIMETYPES[fmt]
+
+        encoded = self._encode(content, width, fmt)
+        self._store(key, encoded)
+        return encoded, FORMAT_MIMETYPES[fmt]
+
+    def prepare(self, content, mimetype):
+        """Encoding stage run after generation: queue the thumbnail renditions in the background
+
+        Returns the Future, or None when there is nothing to encode or the
+        queue is full (the renditions are then encoded on first request).
+        """
+        if content is None or mimetype in VECTOR_MIMETYPES or not self.formats:
+            return None
+        with self.lock:
+            if self.preparing >= PREPARE_QUEUE_LIMIT:
+                return None
+            self.preparing += 1
+            if self.preparer is None:
+                self.preparer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-prepare')
+        return self.preparer.submit(self._prepare, content, mimetype)
+
+    def _prepare(self, content, mimetype):
+        try:
+            for width in RENDITION_WIDTHS:
+                for fmt in self.formats:
+                    self.rendition(content, mimetype, width, FORMAT_MIMETYPES[fmt])
+        except Exception as e:
+            logger.warning(f"Could not prepare image renditions: {e}")
+        finally:
+            with self.lock:
+                self.preparing -= 1
+
+    def _encode(self, content, width, fmt):
+        if self.processor is not None:
+            operations = [('encode', dict(ENCODE_OPTIONS[fmt], format=fmt.upper()))]
+            if width is not None:
+                operations.insert(0, ('resize', {'width': width}))
+            encoded, _ = self.processor.run(content, operations)
+            return encoded
+        image = Image.open(io.BytesIO(content))
+        image.load()
+        if width is not None and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt.upper(), **ENCODE_OPTIONS[fmt])
+        return buffer.getvalue()
+
+    def _store(self, key, encoded):
+        with self.lock:
+            if key in self.cache or len(encoded) > self.max_cache_bytes:
+                return
+            self.cache[key] = encoded
+            self.cache_bytes += len(encoded)
+            while self.cache_bytes > self.max_cache_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= len(evicted)
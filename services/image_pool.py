@@ -0,0 +1,190 @@
+import atexit
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+# Try to import PIL (Pillow), handle gracefully if not available
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except (ImportError, Exception):
+    PIL_AVAILABLE = False
+    Image = ImageDraw = ImageFont = None
+
+logger = logging.getLogger(__name__)
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _open_shared(name):
+    """Attach to an existing shared memory block owned by the parent
+
+    Spawned workers share the parent's resource tracker, so on Pythons
+    without ``track=False`` the duplicate registration is harmless and the
+    parent's unlink clears it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _overlay_text(image, text):
+    """Draw centered text on a translucent box (placeholder image overlay)"""
+    width, height = image.size
+    draw = ImageDraw.Draw(image)
+
+    # Try to load a font, fallback to default if not available
+    try:
+        font_size = max(16, min(width, height) // 20)
+        font = ImageFont.truetype("arial.ttf", font_size)
+    except Exception:
+        font = ImageFont.load_default()
+
+    # Calculate text position (centered)
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (width - text_width) // 2
+    y = (height - text_height) // 2
+
+    # Add a semi-transparent background for text readability
+    padding = 20
+    draw.rectangle([x - padding, y - padding, x + text_width + padding, y + text_height + padding],
+                   fill=(255, 255, 255, 128))
+    draw.multiline_text((x, y), text, fill='black', font=font, align='center')
+    return image
+
+
+def apply_operations(image, operations, timings):
+    """Run post-processing operations on a PIL image, recording per-stage timings
+
+    Supported operations: ``resize`` (width, optional height), ``text_overlay``
+    (text), ``encode`` (format plus Pillow save options) and ``data_uri``
+    (mimetype). The output of the last operation is returned.
+    """
+    result = image
+    for name, params in operations:
+        start = time.perf_counter()
+        if name == 'resize':
+            width = params['width']
+            height = params.get('height') or max(1, round(result.height * width / result.width))
+            if result.width > width:
+                result = result.resize((width, height), Image.LANCZOS)
+        elif name == 'text_overlay':
+            result = _overlay_text(result, params['text'])
+        elif name == 'encode':
+            options = dict(params)
+            fmt = options.pop('format')
+            if result.mode not in ('RGB', 'RGBA'):
+                result = result.convert('RGBA' if 'A' in result.getbands() else 'RGB')
+            buffer = io.BytesIO()
+            result.save(buffer, format=fmt, **options)
+            result = buffer.getvalue()
+        elif name == 'data_uri':
+            result = f"data:{params['mimetype']};base64,{base64.b64encode(result).decode('ascii')}"
+        else:
+            raise ValueError(f"Unknown image operation: {name}")
+        timings[f"{name}_ms"] = _elapsed_ms(start)
+    return result
+
+
+def _process_shared(shm_name, nbytes, mode, size, operations):
+    """Worker entry point: load pixels (or encoded bytes) from shared memory and process them"""
+    timings = {}
+    start = time.perf_counter()
+    shm = _open_shared(shm_name)
+    try:
+        view = shm.buf[:nbytes]
+        data = bytes(view)
+        view.release()
+    finally:
+        shm.close()
+    if mode is None:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    else:
+        image = Image.frombytes(mode, size, data)
+    timings['attach_ms'] = _elapsed_ms(start)
+    return apply_operations(image, operations, timings), timings
+
+
+class ImagePostProcessor:
+    """Process pool for CPU-heavy image post-processing (resize, overlay, encode, base64)
+
+    Pixel buffers are handed to workers through shared memory instead of
+    pickling PIL objects. With ``IMAGE_POOL_WORKERS=0`` (or if the pool
+    cannot start) operations run inline on the calling thread.
+    """
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = int(os.getenv('IMAGE_POOL_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None and self.max_workers > 0:
+                # spawn avoids forking a process that holds Flask/SocketIO threads; spawned workers
+                # re-import the launching script as __mp_main__, which app.py guards its services against
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"Image post-processing pool started with {self.max_workers} workers")
+            return self.executor
+
+    def run(self, source, operations):
+        """Process a PIL image or encoded image bytes; returns (result, timings)"""
+        start = time.perf_counter()
+        executor = self._get_executor() if PIL_AVAILABLE else None
+        if executor is None:
+            timings = {}
+            image = Image.open(io.BytesIO(source)) if isinstance(source, (bytes, bytearray)) else source
+            result = apply_operations(image, operations, timings)
+            timings['total_ms'] = _elapsed_ms(start)
+            return result, timings
+
+        if isinstance(source, (bytes, bytearray)):
+            data, mode, size = source, None, None
+        else:
+            data, mode, size = source.tobytes(), source.mode, source.size
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            shm.buf[:len(data)] = data
+            share_ms = _elapsed_ms(start)
+            future = executor.submit(_process_shared, shm.name, len(data), mode, size, operations)
+            result, timings = future.result()
+        except BrokenProcessPool:
+            logger.warning("Image post-processing pool broke; running inline")
+            with self.lock:
+                self.executor = None
+                self.max_workers = 0
+            return self.run(source, operations)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        timings['share_ms'] = share_ms
+        timings['total_ms'] = _elapsed_ms(start)
+        logger.debug(f"Image post-processing timings: {timings}")
+        return result, timings
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
@@ -1,10 +1,12 @@
-import base64
-import io
 import logging
 import os
 import random
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from services.image_utils import derive_seed, compute_etag, normalize_variation_count, variation_seeds
+from services.image_pool import ImagePostProcessor
 
 # Try to import PIL (Pillow), handle gracefully if not available
 try:
@@ -36,6 +38,9 @@ class ImageService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
+        # Encoding, resizing and text overlay run in a process pool
+        self.post_processor = ImagePostProcessor()
+        
         # Initialize OpenAI API if available
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         if self.openai_api_key and OPENAI_AVAILABLE:
@@ -79,8 +84,46 @@ class ImageService:
         
         self.logger.info("Image service initialized")
     
-    def generate_dalle_image(self, prompt, size="1024x1024"):
-        """Generate image using DALL-E with base64 response (like the reference repo)"""
+    def _build_result(self, service, images, **extra):
+        """Assemble a provider result from (image_data, seed) pairs
+
+        The first image fills the usual top-level fields; when several
+        variations were generated they are all listed under 'variations'.
+        """
+        result = {
+            'success': True,
+            'image_data': images[0][0],
+            'service': service,
+            'seed': images[0][1]
+        }
+        result.update(extra)
+        if len(images) > 1:
+            result['variations'] = [
+                {'image_data': image_data, 'seed': seed, 'etag': compute_etag(image_data)}
+                for image_data, seed in images
+            ]
+        return result
+    
+    def _dalle_request(self, prompt, size):
+        """Single DALL-E 3 call returning a PNG data URI"""
+        # Use the same approach as the reference repository
+        response = self.client.images.generate(
+            model="dall-e-3",
+            prompt=prompt,
+            size=size,
+            quality="standard",
+            response_format="b64_json",  # Get base64 directly like the reference
+            n=1,
+        )
+        return f"data:image/png;base64,{response.data[0].b64_json}"
+    
+    def generate_dalle_image(self, prompt, size="1024x1024", seed=None, n=1):
+        """Generate image using DALL-E with base64 response (like the reference repo)
+
+        DALL-E does not accept a seed, so ``seed`` is ignored. DALL-E 3 only
+        returns one image per call, so ``n`` variations are requested
+        concurrently.
+        """
         try:
             if not self.client:
                 self.logger.warning("OpenAI API key not configured")
@@ -88,33 +131,29 @@ class ImageService:
             
             self.logger.info(f"🎨 Generating DALL-E image for prompt: {prompt[:50]}...")
             
-            # Use the same approach as the reference repository
-            response = self.client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size=size,
-                quality="standard",
-                response_format="b64_json",  # Get base64 directly like the reference
-                n=1,
-            )
-            
-            # Extract base64 image data directly
-            image_b64 = response.data[0].b64_json
-            self.logger.info("✅ DALL-E image generated successfully with base64 format")
-            
-            return {
-                'success': True,
-                'image_data': f"data:image/png;base64,{image_b64}",
-                'service': 'dalle',
-                'model': 'dall-e-3'
-            }
+            if n == 1:
+                images = [self._dalle_request(prompt, size)]
+            else:
+                with ThreadPoolExecutor(max_workers=n) as executor:
+                    futures = [executor.submit(self._dalle_request, prompt, size) for _ in range(n)]
+                images = []
+                for future in futures:
+                    try:
+                        images.append(future.result())
+                    except Exception as e:
+                        self.logger.warning(f"DALL-E variation failed: {e}")
+                if not images:
+                    return None
+            self.logger.info(f"✅ DALL-E generated {len(images)} image(s) with base64 format")
+            
+            return self._build_result('dalle', [(image_data, None) for image_data in images], model='dall-e-3')
             
         except Exception as e:
             self.logger.error(f"❌ Error generating DALL-E image: {e}")
             return None
     
-    def generate_stability_ai_image(self, prompt, size="512x512"):
-        """Generate image using Stability AI API"""
+    def generate_stability_ai_image(self, prompt, size="512x512", seed=None, n=1):
+        """Generate image using Stability AI API (``n`` images via ``samples``)"""
         try:
             stability_api_key = os.getenv('STABILITY_API_KEY')
             if not stability_api_key:
@@ -134,9 +173,11 @@ class ImageService:
                 "cfg_scale": 7,
                 "height": int(size.split('x')[1]),
                 "width": int(size.split('x')[0]),
-                "samples": 1,
+                "samples": n,
                 "steps": 30,
             }
+            if seed is not None:
+                data["seed"] = seed
             
             response = requests.post(url, headers=headers, json=data)
             response.raise_for_status()
@@ -144,19 +185,23 @@ class ImageService:
             response_data = response.json()
             
             if response_data.get('artifacts'):
-                image_data = response_data['artifacts'][0]['base64']
-                return {
-                    'success': True,
-                    'image_data': f"data:image/png;base64,{image_data}",
-                    'service': 'stability_ai'
-                }
+                images = [
+                    (f"data:image/png;base64,{artifact['base64']}", artifact.get('seed', seed))
+                    for artifact in response_data['artifacts']
+                ]
+                return self._build_result('stability_ai', images)
             
         except Exception as e:
             self.logger.error(f"Error generating Stability AI image: {e}")
             return None
     
-    def generate_stable_diffusion_image(self, prompt, size="512x512"):
-        """Generate image using local Stable Diffusion model"""
+    def generate_stable_diffusion_image(self, prompt, size="512x512", seed=None, n=1):
+        """Generate image using local Stable Diffusion model
+
+        The seed defaults to one derived from the prompt so identical
+        prompts render identical images. ``n`` variations run as one batch,
+        each with its own generator seed.
+        """
         try:
             if not self.sd_pipeline:
                 self.logger.warning("Stable Diffusion pipeline not available")
@@ -167,79 +212,78 @@ class ImageService:
             # Parse size
             width, height = map(int, size.split('x'))
             
-            # Generate image
-            with torch.autocast("cuda" if torch.cuda.is_available() else "cpu"):
-                image = self.sd_pipeline(
+            if seed is None:
+                seed = derive_seed(prompt)
+            seeds = variation_seeds(seed, n)
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            generators = [torch.Generator(device=device).manual_seed(s) for s in seeds]
+            
+            # Generate the whole batch in one pipeline call
+            with torch.autocast(device):
+                images = self.sd_pipeline(
                     prompt=prompt,
                     width=width,
                     height=height,
                     num_inference_steps=20,
-                    guidance_scale=7.5
-                ).images[0]
-            
-            # Convert to base64
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            image_data = base64.b64encode(buffered.getvalue()).decode()
-            
-            return {
-                'success': True,
-                'image_data': f"data:image/png;base64,{image_data}",
-                'service': 'stable_diffusion'
-            }
+                    guidance_scale=7.5,
+                    num_images_per_prompt=n,
+                    generator=generators if n > 1 else generators[0]
+                ).images
+            
+            # Encode to PNG data URIs off the request thread, in parallel
+            operations = [
+                ('encode', {'format': 'PNG'}),
+                ('data_uri', {'mimetype': 'image/png'})
+            ]
+            with ThreadPoolExecutor(max_workers=n) as executor:
+                encoded = list(executor.map(lambda image: self.post_processor.run(image, operations), images))
+            
+            return self._build_result(
+                'stable_diffusion',
+                [(image_data, s) for (image_data, _), s in zip(encoded, seeds)],
+                timings=encoded[0][1]
+            )
             
         except Exception as e:
             self.logger.error(f"Error generating Stable Diffusion image: {e}")
             return None
     
-    def create_placeholder_image(self, prompt, size="512x512"):
+    def create_placeholder_image(self, prompt, size="512x512", seed=None, n=1):
         """Create a placeholder image with the prompt text"""
         try:
             width, height = map(int, size.split('x'))
             
-            # Create a new image with a random background color
-            colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF']
-            bg_color = random.choice(colors)
-            
-            image = Image.new('RGB', (width, height), bg_color)
-            draw = ImageDraw.Draw(image)
+            # Seeded RNG so the same prompt always renders the same bytes
+            if seed is None:
+                seed = derive_seed(prompt)
             
-            # Try to load a font, fallback to default if not available
-            try:
-                font_size = max(16, min(width, height) // 20)
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-            
-            # Add text to the image
             text = f"Generated from:\\n{prompt[:100]}..."
+            colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF']
+            operations = [
+                ('text_overlay', {'text': text}),
+                ('encode', {'format': 'PNG'}),
+                ('data_uri', {'mimetype': 'image/png'})
+            ]
+            
+            def render(variation_seed):
+                # Create a new image with a seeded background color
+                bg_color = random.Random(variation_seed).choice(colors)
+                image = Image.new('RGB', (width, height), bg_color)
+                # Text overlay, PNG encoding and base64 run in the post-processing pool
+                return self.post_processor.run(image, operations)
+            
+            seeds = variation_seeds(seed, n)
+            if n == 1:
+                encoded = [render(seed)]
+            else:
+                with ThreadPoolExecutor(max_workers=n) as executor:
+                    encoded = list(executor.map(render, seeds))
             
-            # Calculate text position (centered)
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            x = (width - text_width) // 2
-            y = (height - text_height) // 2
-            
-            # Add a semi-transparent background for text readability
-            padding = 20
-            draw.rectangle([x - padding, y - padding, x + text_width + padding, y + text_height + padding], 
-                          fill=(255, 255, 255, 128))
-            
-            # Draw the text
-            draw.multiline_text((x, y), text, fill='black', font=font, align='center')
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            image_data = base64.b64encode(buffer.getvalue()).decode()
-            
-            return {
-                'success': True,
-                'image_data': f"data:image/png;base64,{image_data}",
-                'service': 'placeholder'
-            }
+            return self._build_result(
+                'placeholder',
+                [(image_data, s) for (image_data, _), s in zip(encoded, seeds)],
+                timings=encoded[0][1]
+            )
             
         except Exception as e:
             self.logger.error(f"Error creating placeholder image: {e}")
@@ -250,9 +294,15 @@ class ImageService:
                 'service': 'fallback'
             }
     
-    def generate_image(self, prompt, size="512x512", preferred_service=None):
-        """Generate an image using the best available service"""
+    def generate_image(self, prompt, size="512x512", preferred_service=None, seed=None, n=1):
+        """Generate an image using the best available service
+
+        ``n`` asks the provider for several variations of the same prompt in
+        one call; they are returned under 'variations'.
+        """
         try:
+            # n sizes thread pools and provider requests, so it is bounded by MAX_VARIATIONS
+            n = normalize_variation_count(n)
             self.logger.info(f"Generating image for prompt: {prompt[:50]}...")
             
             # Try services in order of preference
@@ -270,8 +320,9 @@ class ImageService:
             
             for service_func in services:
                 try:
-                    result = service_func(prompt, size)
+                    result = service_func(prompt, size, seed=seed, n=n)
                     if result and result.get('success'):
+                        result['etag'] = compute_etag(result.get('image_data'))
                         self.logger.info(f"Image generated successfully using {result.get('service', 'unknown')}")
                         return result
                 except Exception as e:
@@ -325,6 +376,15 @@ class ImageService:
             size = prompt_data.get('size', '512x512')
             preferred_service = prompt_data.get('service')
             sentiment = prompt_data.get('sentiment_analysis')
+            seed = prompt_data.get('seed')
+            try:
+                n = normalize_variation_count(prompt_data.get('n'))
+            except ValueError as e:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'image_data': None
+                }
             
             if not prompt:
                 return {
@@ -337,7 +397,7 @@ class ImageService:
             enhanced_prompt = self.enhance_prompt_for_generation(prompt, sentiment)
             
             # Generate the image
-            result = self.generate_image(enhanced_prompt, size, preferred_service)
+            result = self.generate_image(enhanced_prompt, size, preferred_service, seed=seed, n=n)
             
             # Add additional metadata
             if result.get('success'):
@@ -345,7 +405,8 @@ class ImageService:
                 result['enhanced_prompt'] = enhanced_prompt
                 result['generation_params'] = {
                     'size': size,
-                    'service': preferred_service
+                    'service': preferred_service,
+                    'seed': result.get('seed', seed)
                 }
             
             return result
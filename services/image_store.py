@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Where session image bytes live: 'gridfs', 'filesystem' or 'inline' (inside the session document)
+IMAGE_STORE = os.getenv('IMAGE_STORE', 'gridfs').lower()
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'image_store')
+
+
+def blob_id_for(content):
+    """Content address of an image; identical images (same seed) share one blob"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class FilesystemImageStore:
+    """Image blobs as files under ``root``, fanned out by the first two hex digits"""
+
+    def __init__(self, root=None):
+        self.root = root or IMAGE_STORE_DIR
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def put(self, content, mimetype=None):
+        blob_id = blob_id_for(content)
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            # Reusing the blob claims it, so a pending release sweep leaves it alone
+            os.utime(path)
+            return blob_id
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return blob_id
+
+    def get(self, blob_id):
+        try:
+            with open(self._path(blob_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def claimed_at(self, blob_id):
+        """When the blob was last stored or reused (epoch seconds), 0 if missing"""
+        try:
+            return os.path.getmtime(self._path(blob_id))
+        except FileNotFoundError:
+            return 0
+
+    def delete(self, blob_id):
+        try:
+            os.remove(self._path(blob_id))
+        except FileNotFoundError:
+            pass
+
+
+class GridFSImageStore:
+    """Image blobs in a GridFS bucket next to the sessions collection"""
+
+    def __init__(self, db, bucket_name='images'):
+        import gridfs
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f'{bucket_name}.files']
+
+    def put(self, content, mimetype=None):
+        blob_id = blob_id_for(content)
+        # Reusing the blob claims it, so a pending release sweep leaves it alone
+        if self.files.update_one({'filename': blob_id},
+                                 {'$set': {'metadata.claimed': datetime.now(timezone.utc)}}).matched_count:
+            return blob_id
+        self.bucket.upload_from_stream(blob_id, content, metadata={'contentType': mimetype})
+        return blob_id
+
+    def claimed_at(self, blob_id):
+        """When the blob was last stored or reused (epoch seconds), 0 if missing"""
+        grid_file = self.files.find_one({'filename': blob_id}, {'uploadDate': 1, 'metadata.claimed': 1})
+        if grid_file is None:
+            return 0
+        claimed = (grid_file.get('metadata') or {}).get('claimed') or grid_file['uploadDate']
+        return claimed.replace(tzinfo=timezone.utc).timestamp()
+
+    def get(self, blob_id):
+        import gridfs
+        try:
+            return self.bucket.open_download_stream_by_name(blob_id).read()
+        except gridfs.errors.NoFile:
+            return None
+
+    def delete(self, blob_id):
+        for grid_file in self.bucket.find({'filename': blob_id}):
+            self.bucket.delete(grid_file._id)
+
+
+def create_image_store(db, kind=None):
+    """Image store for the configured kind, or None to keep images inline"""
+    kind = kind or IMAGE_STORE
+    if kind == 'filesystem':
+        return FilesystemImageStore()
+    if kind == 'gridfs' and db is not None:
+        return GridFSImageStore(db)
+    return None
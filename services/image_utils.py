@@ -0,0 +1,91 @@
+import base64
+import binascii
+import hashlib
+import json
+from urllib.parse import unquote_to_bytes
+
+# Seeds are kept in the 32-bit range so they can be passed straight to
+# provider APIs (Stability) and torch generators without overflow.
+MAX_SEED = 2 ** 32 - 1
+
+# Upper bound on variations per request (provider batch limits and cost)
+MAX_VARIATIONS = 4
+
+
+def derive_seed(prompt, concepts=None):
+    """Derive a stable seed from the prompt text and extracted concepts"""
+    payload = json.dumps(
+        {'prompt': prompt or '', 'concepts': concepts or {}},
+        sort_keys=True,
+        default=str
+    )
+    digest = hashlib.sha256(payload.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+def normalize_seed(value):
+    """Validate a user supplied seed, returning None when not provided"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError('Seed must be an integer')
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Seed must be an integer')
+    if seed < 0 or seed > MAX_SEED:
+        raise ValueError(f'Seed must be between 0 and {MAX_SEED}')
+    return seed
+
+
+def variation_seeds(seed, n):
+    """Seeds for n variations of one request, starting from the base seed"""
+    return [(seed + i) % (MAX_SEED + 1) for i in range(n)]
+
+
+def normalize_variation_count(value):
+    """Validate the number of variations requested (1..MAX_VARIATIONS)"""
+    if value is None or value == '':
+        return 1
+    if isinstance(value, bool):
+        raise ValueError('n must be an integer')
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('n must be an integer')
+    if n < 1 or n > MAX_VARIATIONS:
+        raise ValueError(f'n must be between 1 and {MAX_VARIATIONS}')
+    return n
+
+
+def compute_etag(image_data):
+    """Compute a strong ETag for image content (data URI string or raw bytes)
+
+    Data URIs are hashed on their decoded bytes so the ETag matches the one
+    sent when the same image is delivered raw.
+    """
+    if image_data is None:
+        return None
+    if isinstance(image_data, str):
+        _, content = decode_data_uri(image_data)
+        image_data = content if content is not None else image_data.encode('utf-8')
+    return '"' + hashlib.sha256(image_data).hexdigest()[:32] + '"'
+
+
+def encode_data_uri(mimetype, content):
+    """Wrap raw image bytes in a base64 data URI"""
+    return f"data:{mimetype};base64,{base64.b64encode(content).decode('ascii')}"
+
+
+def decode_data_uri(data_uri):
+    """Split a data URI into (mimetype, raw bytes); returns (None, None) if invalid"""
+    if not data_uri or not isinstance(data_uri, str) or not data_uri.startswith('data:'):
+        return None, None
+    try:
+        header, payload = data_uri[5:].split(',', 1)
+        mimetype, _, encoding = header.partition(';')
+        if encoding == 'base64':
+            return mimetype or 'application/octet-stream', base64.b64decode(payload)
+        return mimetype or 'application/octet-stream', unquote_to_bytes(payload)
+    except (ValueError, binascii.Error):
+        return None, None
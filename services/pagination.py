@@ -0,0 +1,75 @@
+import base64
+import bisect
+import json
+import threading
+from datetime import datetime
+
+from flask import jsonify, request
+
+
+def encode_cursor(timestamp, session_id):
+    """Opaque cursor for the position after (timestamp, session_id) in newest-first order"""
+    payload = {'id': str(session_id)}
+    if isinstance(timestamp, datetime):
+        payload['dt'] = timestamp.isoformat()
+    else:
+        payload['t'] = timestamp
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, session_id) from ``encode_cursor``; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        timestamp = datetime.fromisoformat(payload['dt']) if 'dt' in payload else payload['t']
+        # A forged cursor must not reach the (timestamp, id) comparisons with other types
+        if not isinstance(timestamp, (str, datetime)) or not isinstance(payload['id'], str):
+            raise TypeError("cursor fields must be strings")
+        return timestamp, payload['id']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def paginated_response(items, next_cursor, limit):
+    """JSON list of one page; the next page is advertised in X-Next-Cursor and a Link header"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?limit={limit}&cursor={next_cursor}>; rel="next"'
+    return response
+
+
+class OrderedSessionIndex:
+    """(timestamp, id) keys kept sorted so each history page is a bisect plus a slice"""
+
+    def __init__(self):
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def add(self, timestamp, session_id):
+        with self.lock:
+            # Sessions mostly arrive in time order, so this is usually an append
+            bisect.insort(self.keys, (timestamp, session_id))
+
+    def remove(self, timestamp, session_id):
+        with self.lock:
+            index = bisect.bisect_left(self.keys, (timestamp, session_id))
+            if index < len(self.keys) and self.keys[index] == (timestamp, session_id):
+                del self.keys[index]
+
+    def page(self, limit, cursor=None):
+        """Newest-first ids after ``cursor`` and the cursor for the next page (None at the end)"""
+        limit = max(1, limit)
+        with self.lock:
+            end = len(self.keys)
+            if cursor:
+                end = bisect.bisect_left(self.keys, decode_cursor(cursor))
+            start = max(0, end - limit)
+            keys = self.keys[start:end][::-1]
+        next_cursor = encode_cursor(*keys[-1]) if keys and start > 0 else None
+        return [session_id for _, session_id in keys], next_cursor
+
+    def __len__(self):
+        return len(self.keys)
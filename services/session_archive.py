@@ -0,0 +1,135 @@
+import gzip
+import io
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from bson import json_util
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Sessions older than SESSION_ARCHIVE_DAYS move to SESSION_ARCHIVE_DIR (0 disables archiving);
+# SESSION_RETENTION_DAYS deletes them from the hot collection on the same schedule (0 keeps them)
+SESSION_ARCHIVE_DAYS = int(os.getenv('SESSION_ARCHIVE_DAYS', 0))
+SESSION_ARCHIVE_DIR = os.getenv('SESSION_ARCHIVE_DIR', 'session_archive')
+SESSION_ARCHIVE_INTERVAL_SECONDS = int(os.getenv('SESSION_ARCHIVE_INTERVAL_SECONDS', 3600))
+SESSION_RETENTION_DAYS = int(os.getenv('SESSION_RETENTION_DAYS', 0))
+SESSION_ARCHIVE_COMPRESSION = os.getenv('SESSION_ARCHIVE_COMPRESSION', 'zstd' if ZSTD_AVAILABLE else 'gzip')
+
+EXTENSIONS = {'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+INDEX_FILE = 'index.tsv'
+
+
+def archive_day(timestamp):
+    """UTC day a session is filed under"""
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc)
+        return timestamp.strftime('%Y-%m-%d')
+    return str(timestamp)[:10] or 'undated'
+
+
+class SessionArchive:
+    """Append-only compressed NDJSON files of archived sessions, one per UTC day
+
+    Each append adds a new gzip member / zstd frame, so files are never
+    rewritten. ``index.tsv`` maps session ids to their day file for lookups.
+    """
+
+    def __init__(self, directory=None, compression=None):
+        self.directory = directory or SESSION_ARCHIVE_DIR
+        self.compression = compression or SESSION_ARCHIVE_COMPRESSION
+        if self.compression == 'zstd' and not ZSTD_AVAILABLE:
+            logger.warning("zstandard not installed; archiving sessions with gzip")
+            self.compression = 'gzip'
+        self.lock = threading.Lock()
+        self.index = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        if self.index is None:
+            self.index = {}
+            try:
+                with open(self._path(INDEX_FILE), encoding='utf-8') as f:
+                    for line in f:
+                        session_id, _, filename = line.rstrip('\n').partition('\t')
+                        self.index[session_id] = filename
+            except FileNotFoundError:
+                pass
+        return self.index
+
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)
+        return gzip.compress(data, mtime=0)
+
+    def append(self, documents):
+        """Archive documents (skipping ids already archived); returns the ids now in the archive"""
+        by_file = {}
+        with self.lock:
+            index = self._load_index()
+            archived = []
+            for document in documents:
+                session_id = str(document['_id'])
+                archived.append(session_id)
+                if session_id not in index:
+                    filename = f"sessions-{archive_day(document.get('timestamp'))}{EXTENSIONS[self.compression]}"
+                    by_file.setdefault(filename, []).append((session_id, document))
+            if not by_file:
+                return archived
+
+            os.makedirs(self.directory, exist_ok=True)
+            index_lines = []
+            for filename, entries in by_file.items():
+                payload = ''.join(json_util.dumps(document) + '\n' for _, document in entries)
+                with open(self._path(filename), 'ab') as f:
+                    f.write(self._compress(payload.encode('utf-8')))
+                    f.flush()
+                    os.fsync(f.fileno())
+                index_lines += [f"{session_id}\t{filename}\n" for session_id, _ in entries]
+            # The index is written after the data, so an indexed id is always readable
+            with open(self._path(INDEX_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(index_lines)
+                f.flush()
+                os.fsync(f.fileno())
+            for filename, entries in by_file.items():
+                for session_id, _ in entries:
+                    index[session_id] = filename
+            return archived
+
+    def _read_lines(self, filename):
+        with open(self._path(filename), 'rb') as f:
+            if filename.endswith(EXTENSIONS['zstd']):
+                if not ZSTD_AVAILABLE:
+                    raise RuntimeError(f"zstandard is required to read {filename}")
+                stream = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            else:
+                stream = gzip.GzipFile(fileobj=f)
+            for line in io.TextIOWrapper(stream, encoding='utf-8'):
+                yield line
+
+    def get(self, session_id):
+        """Archived session document by id, or None"""
+        with self.lock:
+            filename = self._load_index().get(str(session_id))
+        if filename is None:
+            return None
+        for line in self._read_lines(filename):
+            document = json_util.loads(line)
+            if str(document['_id']) == str(session_id):
+                return document
+        return None
+
+    def __contains__(self, session_id):
+        with self.lock:
+            return str(session_id) in self._load_index()
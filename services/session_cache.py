@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+
+
+def document_size(document):
+    """Approximate in-memory cost of a session document (its BSON size)"""
+    try:
+        return len(bson.encode(document))
+    except Exception:
+        return len(json.dumps(document, default=str))
+
+
+class SessionCache:
+    """Byte-bounded LRU of session documents keyed by id (and view)
+
+    Sizes vary from a few hundred bytes to megabytes of inline image data, so
+    capacity is counted in bytes; a document larger than the whole cache is
+    not cached. ``max_bytes=0`` disables caching.
+
+    Each process (gunicorn worker) has its own cache and only sees its own
+    writes, so entries expire after ``max_age`` seconds: another worker's
+    update or delete shows up within that time.
+    """
+
+    def __init__(self, max_bytes=None, max_age=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('SESSION_CACHE_BYTES', 64 * 1024 * 1024))
+        self.max_age = max_age if max_age is not None else float(os.getenv('SESSION_CACHE_MAX_AGE_SECONDS', 30))
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, document):
+        size = document_size(document)
+        with self.lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self.cache[key] = (dict(document), size, time.monotonic() + self.max_age)
+            self.cache_bytes += size
+            while self.cache_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self.cache_bytes -= entry[1]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.cache),
+                'bytes': self.cache_bytes,
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pyarrow = None
+    parquet = None
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Sessions fetched (and, for Parquet, written as one row group) at a time
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+# Parquet needs one schema up front; nested values are stored as JSON text
+SESSION_COLUMNS = ('_id', 'timestamp', 'transcript', 'enhanced_prompt', 'service_used', 'response_time',
+                   'visual_concepts', 'image_data')
+NUMERIC_COLUMNS = {'response_time'}
+
+
+def parse_date(value):
+    """Aware datetime from an ISO date or datetime (naive values are UTC); None if empty"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {value!r}") from e
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_fields(value):
+    """Field names from a comma-separated list, or None for every field"""
+    fields = [field.strip() for field in (value or '').split(',') if field.strip()]
+    return fields or None
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def ndjson_chunks(sessions, batch_size=None):
+    """NDJSON bytes, one chunk per ``batch_size`` sessions"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    for batch in _batches(sessions, batch_size):
+        yield ''.join(json.dumps(session, default=_json_value) + '\n' for session in batch).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file for ParquetWriter whose bytes are drained after every row group"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _column_value(session, column):
+    value = session.get(column)
+    if value is None or column in NUMERIC_COLUMNS:
+        return value
+    if column == 'timestamp' and isinstance(value, datetime):
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=_json_value)
+
+
+def parquet_chunks(sessions, fields=None, batch_size=None):
+    """Parquet bytes, one row group per ``batch_size`` sessions"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    columns = ['_id'] + [field for field in (fields or SESSION_COLUMNS) if field != '_id']
+    schema = pyarrow.schema([
+        (column, pyarrow.timestamp('us', tz='UTC') if column == 'timestamp'
+         else pyarrow.float64() if column in NUMERIC_COLUMNS else pyarrow.string())
+        for column in columns
+    ])
+    sink = _ChunkSink()
+    with parquet.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for batch in _batches(sessions, batch_size):
+            writer.write_table(pyarrow.Table.from_pydict(
+                {column: [_column_value(session, column) for session in batch] for column in columns},
+                schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _batches(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_chunks(storage, fmt='ndjson', since=None, until=None, fields=None, include_images=False,
+                  batch_size=None):
+    """Export sessions from ``storage`` as a stream of byte chunks; memory stays at one batch"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export requires the pyarrow package")
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    sessions = storage.iter_sessions(since=since, until=until, fields=fields, include_images=include_images,
+                                     batch_size=batch_size)
+    if fmt == 'parquet':
+        return parquet_chunks(sessions, fields, batch_size)
+    return ndjson_chunks(sessions, batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export EchoSketch sessions as NDJSON or Parquet")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--since', help="first timestamp to include (ISO date or datetime, UTC unless given)")
+    parser.add_argument('--until', help="timestamp to stop before")
+    parser.add_argument('--fields', help="comma-separated fields to export (default: all)")
+    parser.add_argument('--include-images', action='store_true', help="include image bytes as data URIs")
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument('--database-uri', help="defaults to DATABASE_URI / MONGODB_URI")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        since, until, fields = parse_date(args.since), parse_date(args.until), parse_fields(args.fields)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == 'parquet' and not PARQUET_AVAILABLE:
+        parser.error("Parquet export requires the pyarrow package")
+
+    from services.storage_backends import create_storage
+    # A plain client: the app's maintenance (archiving deletes sessions) must not run mid-export
+    storage = create_storage(args.database_uri, background=False)
+    exported = 0
+    try:
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(storage, args.format, since, until, fields, args.include_images,
+                                       args.batch_size):
+                output.write(chunk)
+                exported += len(chunk)
+        finally:
+            if args.output:
+                output.close()
+    finally:
+        storage.close_connection()
+    logger.info(f"Exported {exported} bytes of sessions")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from services.facet_index import FacetIndex
+from services.pagination import OrderedSessionIndex
+
+# Sessions kept in memory before the least recently used are evicted
+SESSION_MEMORY_LIMIT = int(os.getenv('SESSION_MEMORY_LIMIT', 1000))
+
+# Concept fields indexed alongside the transcript words
+CONCEPT_FIELDS = ('objects', 'colors', 'settings', 'mood', 'style', 'keywords')
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def session_terms(session):
+    """Search terms for a session: transcript words plus its visual concept values"""
+    terms = set(tokenize(session.get('transcript', '')))
+    concepts = session.get('visual_concepts') or {}
+    for field in CONCEPT_FIELDS:
+        values = concepts.get(field) or []
+        for value in ([values] if isinstance(values, str) else values):
+            terms.update(tokenize(value))
+    return terms
+
+
+class InvertedIndex:
+    """Term -> ids postings; each posting keeps insertion (i.e. time) order"""
+
+    def __init__(self):
+        self.postings = {}
+        self.terms = {}
+
+    def add(self, doc_id, terms):
+        self.terms[doc_id] = terms
+        for term in terms:
+            self.postings.setdefault(term, {})[doc_id] = None
+
+    def remove(self, doc_id):
+        for term in self.terms.pop(doc_id, ()):
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, terms, limit):
+        """Newest ids containing every term, walking the shortest posting list only"""
+        postings = sorted((self.postings.get(term, {}) for term in set(terms)), key=len)
+        if not postings or not postings[0]:
+            return []
+        shortest, others = postings[0], postings[1:]
+        results = []
+        for doc_id in reversed(shortest):
+            if all(doc_id in posting for posting in others):
+                results.append(doc_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class SessionMemory:
+    """Bounded in-memory session store with time-ordered paging and term search
+
+    Holds at most ``capacity`` sessions; reads refresh recency and the least
+    recently used session is evicted when a new one is added beyond that.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or SESSION_MEMORY_LIMIT
+        self.sessions = OrderedDict()
+        self.order = OrderedSessionIndex()
+        self.index = InvertedIndex()
+        self.facets = FacetIndex()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def add(self, session):
+        session_id = session['id']
+        with self.lock:
+            self.sessions[session_id] = session
+            self.order.add(session['timestamp'], session_id)
+            self.index.add(session_id, session_terms(session))
+            self.facets.add(session_id, session)
+            while len(self.sessions) > self.capacity:
+                _, oldest = self.sessions.popitem(last=False)
+                self.order.remove(oldest['timestamp'], oldest['id'])
+                self.index.remove(oldest['id'])
+                self.facets.remove(oldest['id'])
+                self.evicted += 1
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def page(self, limit, cursor=None):
+        """Newest-first sessions after ``cursor`` and the next cursor"""
+        session_ids, next_cursor = self.order.page(limit, cursor)
+        with self.lock:
+            sessions = [self.sessions[session_id] for session_id in session_ids if session_id in self.sessions]
+        return sessions, next_cursor
+
+    def search(self, query, limit):
+        """Newest sessions matching every word of ``query``; an empty query lists the newest"""
+        limit = max(1, limit)
+        terms = tokenize(query)
+        if not terms:
+            return self.page(limit)[0]
+        with self.lock:
+            return [self.sessions[session_id] for session_id in self.index.search(terms, limit)]
+
+    def values(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self.sessions
@@ -0,0 +1,168 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Mongo duplicate key error; a retried batch may hit documents already written
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindFull(RuntimeError):
+    """The queue is full and the synchronous fallback write failed"""
+
+
+class WriteBehindWriter:
+    """Bounded queue of documents flushed to a collection by a background thread
+
+    Documents are written with ``insert_many(ordered=False)`` once
+    ``batch_size`` are waiting or ``flush_interval`` seconds have passed.
+    When the queue is full, ``submit`` writes synchronously instead, which
+    throttles callers rather than dropping data; if that write fails too it
+    waits up to ``submit_timeout`` for queue room and otherwise raises
+    WriteBehindFull, so a document is never acknowledged unstored. Pending documents stay
+    readable through ``pending`` until written and are flushed at exit.
+    ``prepare`` is called on each document in the flusher just before it is
+    written, and ``on_write`` with each batch once it is stored.
+    """
+
+    def __init__(self, get_collection, batch_size=100, flush_interval=0.2, max_queue=10000, on_write=None,
+                 submit_timeout=5.0, prepare=None):
+        self.get_collection = get_collection
+        self.submit_timeout = submit_timeout
+        self.prepare = prepare
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.thread = threading.Thread(target=self._run, name='session-write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, document):
+        """Queue a document that already carries its ``_id``"""
+        with self.lock:
+            self.pending[document['_id']] = document
+        try:
+            self.queue.put_nowait(document)
+        except queue.Full:
+            logger.warning("Write-behind queue full; writing session synchronously")
+            if self._write([document]):
+                return
+            try:
+                # Hand it to the flusher, which retries until MongoDB takes it
+                self.queue.put(document, timeout=self.submit_timeout)
+            except queue.Full:
+                with self.lock:
+                    self.pending.pop(document['_id'], None)
+                raise WriteBehindFull("Write-behind queue full and the direct write failed")
+
+    def get_pending(self, document_id):
+        with self.lock:
+            return self.pending.get(document_id)
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        backoff = self.flush_interval
+        while not self.stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            # Keep retrying with capped backoff; documents stay readable meanwhile
+            while not self._write(batch) and not self.stopping.is_set():
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            backoff = self.flush_interval
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch):
+        collection = self.get_collection()
+        if collection is None:
+            self.failures += 1
+            return False
+        if self.prepare:
+            for document in batch:
+                self.prepare(document)
+        try:
+            collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+            if errors:
+                logger.error(f"Write-behind batch had {len(errors)} failed inserts: {errors[0].get('errmsg')}")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Write-behind flush failed, will retry: {e}")
+            return False
+        with self.lock:
+            for document in batch:
+                self.pending.pop(document['_id'], None)
+            self.written += len(batch)
+            self.batches += 1
+        if self.on_write:
+            self.on_write(batch)
+        return True
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Stop the flusher and write whatever is still queued"""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        self.thread.join(timeout=5)
+        remaining = []
+        while True:
+            try:
+                remaining.append(self.queue.get_nowait())
+                self.queue.task_done()
+            except queue.Empty:
+                break
+        with self.lock:
+            # A batch the thread gave up on mid-retry is still pending
+            queued_ids = {document['_id'] for document in remaining}
+            remaining += [document for document_id, document in self.pending.items()
+                          if document_id not in queued_ids]
+        for start in range(0, len(remaining), self.batch_size):
+            if not self._write(remaining[start:start + self.batch_size]):
+                logger.error(f"Could not persist {len(remaining) - start} queued sessions at shutdown")
+                break
+        if remaining:
+            logger.info(f"Flushed {len(remaining)} queued sessions at shutdown")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'pending': len(self.pending),
+                'written': self.written,
+                'batches': self.batches,
+                'failures': self.failures,
+            }
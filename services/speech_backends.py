@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from services.audio_processing import TARGET_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Try to import the offline engines, handle gracefully if not available
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except (ImportError, Exception):
+    VOSK_AVAILABLE = False
+    vosk = None
+
+try:
+    from faster_whisper import WhisperModel
+    WHISPER_AVAILABLE = True
+except (ImportError, Exception):
+    WHISPER_AVAILABLE = False
+    WhisperModel = None
+
+# Rank offline engines ahead of network ones so the hot path has no external dependency
+PREFER_OFFLINE = os.getenv('SPEECH_PREFER_OFFLINE', 'true').lower() == 'true'
+# Consecutive failures that take a backend out of rotation, and for how long
+FAILURE_THRESHOLD = int(os.getenv('SPEECH_BACKEND_FAILURES', 3))
+COOLDOWN_SECONDS = float(os.getenv('SPEECH_BACKEND_COOLDOWN_SECONDS', 30))
+# Weight of the newest sample in the latency and error moving averages
+EWMA_ALPHA = 0.3
+
+VOSK_MODEL_PATH = os.getenv('VOSK_MODEL_PATH', 'models/vosk')
+
+
+@lru_cache(maxsize=None)
+def load_vosk_model(path=VOSK_MODEL_PATH):
+    """Load a Vosk model once per process (shared by batch and streaming recognition)"""
+    logger.info(f"Loading Vosk model from {path}")
+    return vosk.Model(path)
+
+
+class SpeechBackend:
+    """Base class for speech recognition backends
+
+    ``transcribe_pcm`` takes 16 kHz mono int16 samples; ``transcribe_native``
+    takes an upload in one of ``native_formats`` without decoding it. Both
+    return text ('' or None when nothing was recognized) and raise on failure.
+    """
+
+    name = None
+    offline = False
+    native_formats = frozenset()
+    default_concurrency = 4
+    expected_latency_ms = 1000
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.load_lock = threading.Lock()
+        self.load_error = None
+
+    def available(self):
+        return True
+
+    def preload(self):
+        """Load models or warm clients; called once at startup"""
+        self.ready.set()
+
+    def ensure_ready(self):
+        """Preload exactly once, whether at startup or on first use"""
+        if self.ready.is_set():
+            return
+        with self.load_lock:
+            if not self.ready.is_set():
+                self.preload()
+
+    def transcribe_native(self, audio_bytes, audio_format):
+        raise NotImplementedError(f"{self.name} cannot read {audio_format['format']} audio natively")
+
+    def transcribe_pcm(self, samples):
+        raise NotImplementedError
+
+
+class GoogleCloudBackend(SpeechBackend):
+    """Google Cloud Speech synchronous recognize"""
+
+    name = 'google'
+    native_formats = frozenset({'flac', 'ogg_opus', 'webm_opus'})
+    default_concurrency = 8
+    expected_latency_ms = 1200
+    encodings = {'wav': 'LINEAR16', 'flac': 'FLAC', 'ogg_opus': 'OGG_OPUS', 'webm_opus': 'WEBM_OPUS'}
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def transcribe_native(self, audio_bytes, audio_format):
+        from google.cloud import speech
+
+        encoding_name = self.encodings.get(audio_format['format'])
+        if not encoding_name:
+            raise ValueError(f"Google Speech cannot read {audio_format['format'] or 'unknown'} audio natively")
+        options = {'encoding': getattr(speech.RecognitionConfig.AudioEncoding, encoding_name)}
+        # Leave the rate unset when the header lacks it; Google reads it from the file
+        if audio_format['sample_rate']:
+            options['sample_rate_hertz'] = audio_format['sample_rate']
+        return self._recognize(speech.RecognitionAudio(content=audio_bytes), options)
+
+    def transcribe_pcm(self, samples):
+        from google.cloud import speech
+
+        options = {
+            'encoding': speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            'sample_rate_hertz': TARGET_SAMPLE_RATE,
+        }
+        return self._recognize(speech.RecognitionAudio(content=samples.tobytes()), options)
+
+    def _recognize(self, audio, options):
+        from google.cloud import speech
+
+        config = speech.RecognitionConfig(
+            language_code="en-US",
+            enable_automatic_punctuation=True,
+            model="latest_long",
+            **options,
+        )
+        response = self.client.recognize(config=config, audio=audio)
+        if not response.results:
+            logger.warning("No speech detected by Google Cloud Speech")
+            return None
+        # Each result covers a consecutive stretch of the audio
+        transcript = ' '.join(result.alternatives[0].transcript.strip()
+                              for result in response.results if result.alternatives)
+        confidence = response.results[0].alternatives[0].confidence
+        logger.info(f"Google Speech API transcript: {transcript} (confidence: {confidence})")
+        return transcript
+
+
+class SpeechRecognitionBackend(SpeechBackend):
+    """SpeechRecognition's free Google Web Speech endpoint"""
+
+    name = 'speechrecognition'
+    native_formats = frozenset({'flac'})
+    expected_latency_ms = 1500
+
+    def __init__(self, recognizer):
+        super().__init__()
+        self.recognizer = recognizer
+
+    def transcribe_native(self, audio_bytes, audio_format):
+        import speech_recognition as sr
+
+        # recognize_google uploads FLAC, so hand it the original file as-is
+        # rather than decoding to PCM only to have it re-encoded
+        class FlacAudioData(sr.AudioData):
+            def get_flac_data(self, convert_rate=None, convert_width=None):
+                return audio_bytes
+
+        if audio_format['format'] not in self.native_formats:
+            return super().transcribe_native(audio_bytes, audio_format)
+        return self._recognize(FlacAudioData(b'', audio_format['sample_rate'] or TARGET_SAMPLE_RATE, 2))
+
+    def transcribe_pcm(self, samples):
+        import speech_recognition as sr
+
+        return self._recognize(sr.AudioData(samples.tobytes(), TARGET_SAMPLE_RATE, 2))
+
+    def _recognize(self, audio_data):
+        import speech_recognition as sr
+
+        try:
+            text = self.recognizer.recognize_google(audio_data)
+        except sr.UnknownValueError:
+            return ''
+        logger.info(f"SpeechRecognition transcription successful: {text[:50]}...")
+        return text
+
+
+class VoskBackend(SpeechBackend):
+    """Offline Kaldi recognition with a Vosk model, in-process"""
+
+    name = 'vosk'
+    offline = True
+    default_concurrency = os.cpu_count() or 2
+    expected_latency_ms = 400
+
+    def available(self):
+        return VOSK_AVAILABLE and os.path.isdir(VOSK_MODEL_PATH)
+
+    def preload(self):
+        load_vosk_model()
+        self.ready.set()
+
+    def transcribe_pcm(self, samples):
+        recognizer = vosk.KaldiRecognizer(load_vosk_model(), TARGET_SAMPLE_RATE)
+        recognizer.AcceptWaveform(samples.tobytes())
+        return json.loads(recognizer.FinalResult()).get('text', '')
+
+
+class WhisperBackend(SpeechBackend):
+    """Offline Whisper recognition via faster-whisper (CTranslate2, int8 on CPU)"""
+
+    name = 'whisper'
+    offline = True
+    default_concurrency = 1
+    expected_latency_ms = 1500
+
+    def __init__(self):
+        super().__init__()
+        self.model = None
+
+    def available(self):
+        return WHISPER_AVAILABLE
+
+    def preload(self):
+        self.model = WhisperModel(
+            os.getenv('WHISPER_MODEL', 'base.en'),
+            device='cpu',
+            compute_type=os.getenv('WHISPER_COMPUTE_TYPE', 'int8'),
+            cpu_threads=int(os.getenv('WHISPER_CPU_THREADS', 0)),
+        )
+        self.ready.set()
+
+    def transcribe_pcm(self, samples):
+        audio = samples.astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(audio, language='en', beam_size=1, vad_filter=False)
+        return ' '.join(segment.text.strip() for segment in segments)
+
+
+class SpeechBackendRegistry:
+    """Registered speech backends with per-backend concurrency limits and health tracking
+
+    ``candidates()`` orders ready backends by expected cost: a moving average of
+    observed latency, inflated by the recent error rate and current load.
+    Backends failing repeatedly sit out a cooldown period.
+    """
+
+    def __init__(self):
+        self.backends = OrderedDict()
+        self.slots = {}
+        self.limits = {}
+        self.health = {}
+        self.lock = threading.Lock()
+
+    def register(self, backend, max_concurrency=None):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv(f"SPEECH_{backend.name.upper()}_CONCURRENCY",
+                                            backend.default_concurrency))
+        self.backends[backend.name] = backend
+        self.limits[backend.name] = max_concurrency
+        self.slots[backend.name] = threading.BoundedSemaphore(max_concurrency)
+        self.health[backend.name] = {
+            'calls': 0,
+            'errors': 0,
+            'consecutive_errors': 0,
+            'latency_ms': None,
+            'error_rate': 0.0,
+            'in_flight': 0,
+            'disabled_until': 0.0,
+        }
+        return backend
+
+    def names(self):
+        return list(self.backends)
+
+    def preload(self, background=True):
+        """Load every backend's models, optionally on background threads"""
+        def load(backend):
+            try:
+                started = time.perf_counter()
+                backend.ensure_ready()
+                logger.info(f"Speech backend {backend.name} ready in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Could not preload speech backend {backend.name}: {e}")
+                backend.load_error = str(e)
+
+        for backend in self.backends.values():
+            if background:
+                threading.Thread(target=load, args=(backend,), daemon=True).start()
+            else:
+                load(backend)
+
+    def _score(self, name):
+        backend = self.backends[name]
+        health = self.health[name]
+        latency = health['latency_ms'] or backend.expected_latency_ms
+        load = health['in_flight'] / self.limits[name]
+        return latency * (1 + 4 * health['error_rate']) * (1 + load)
+
+    def candidates(self):
+        """Backends to try in order; unready or cooling-down backends only as a last resort"""
+        now = time.time()
+        with self.lock:
+            preferred, fallback = [], []
+            for name, backend in self.backends.items():
+                if backend.load_error:
+                    continue
+                usable = backend.ready.is_set() and self.health[name]['disabled_until'] <= now
+                (preferred if usable else fallback).append(name)
+            rank = lambda name: (PREFER_OFFLINE and not self.backends[name].offline, self._score(name))
+            ordered = sorted(preferred, key=rank) + sorted(fallback, key=rank)
+        return [self.backends[name] for name in ordered]
+
+    def call(self, backend, method, *args):
+        """Run ``method`` within the backend's concurrency limit, recording latency and errors"""
+        name = backend.name
+        # Callers queued for a slot count as load too, so a saturated backend ranks behind idle ones
+        with self.lock:
+            self.health[name]['in_flight'] += 1
+        try:
+            with self.slots[name]:
+                backend.ensure_ready()
+                started = time.perf_counter()
+                try:
+                    result = method(*args)
+                except (ValueError, NotImplementedError):
+                    # The audio was rejected, not the backend at fault; leave its health alone
+                    raise
+                except Exception:
+                    self._record(name, None, failed=True)
+                    raise
+                self._record(name, (time.perf_counter() - started) * 1000, failed=False)
+                return result
+        finally:
+            with self.lock:
+                self.health[name]['in_flight'] -= 1
+
+    def _record(self, name, latency_ms, failed):
+        with self.lock:
+            health = self.health[name]
+            health['calls'] += 1
+            health['error_rate'] = (1 - EWMA_ALPHA) * health['error_rate'] + EWMA_ALPHA * (1.0 if failed else 0.0)
+            if failed:
+                health['errors'] += 1
+                health['consecutive_errors'] += 1
+                if health['consecutive_errors'] >= FAILURE_THRESHOLD:
+                    health['disabled_until'] = time.time() + COOLDOWN_SECONDS
+                    logger.warning(f"Speech backend {name} disabled for {COOLDOWN_SECONDS}s after repeated errors")
+            else:
+                health['consecutive_errors'] = 0
+                previous = health['latency_ms']
+                health['latency_ms'] = latency_ms if previous is None else (
+                    (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * latency_ms)
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    'offline': backend.offline,
+                    'ready': backend.ready.is_set(),
+                    'load_error': backend.load_error,
+                    'max_concurrency': self.limits[name],
+                    **{key: (round(value, 1) if isinstance(value, float) else value)
+                       for key, value in self.health[name].items()},
+                }
+                for name, backend in self.backends.items()
+            }
+
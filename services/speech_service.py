@@ -1,9 +1,29 @@
 import os
 import logging
-import io
+
+from services.audio_formats import native_duration, sniff_format
+from services.audio_processing import TARGET_SAMPLE_RATE, decode_to_pcm, read_audio_bytes
+from services.streaming_service import VoiceStreamSession
+from services.voice_activity import trim_silence
+from services.chunked_transcription import CHUNK_MAX_SECONDS, transcribe_chunked
+from services.transcript_cache import TranscriptCache, transcript_key
+from services.speech_backends import (GoogleCloudBackend, SpeechBackendRegistry, SpeechRecognitionBackend,
+                                      VoskBackend, WhisperBackend)
 
 logger = logging.getLogger(__name__)
 
+# Trim silence before recognition; VAD_SPLIT also drops long inner pauses
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+VAD_SPLIT = os.getenv('VAD_SPLIT', 'false').lower() == 'true'
+
+# Send uploads the recognizer reads natively as-is instead of transcoding them; only audio known to be
+# no longer than one recognition chunk (CHUNK_MAX_SECONDS) goes as is, longer audio gets VAD and chunking
+NATIVE_PASSTHROUGH = os.getenv('SPEECH_NATIVE_PASSTHROUGH', 'true').lower() == 'true'
+
+# Enabled backends in preference order, and whether their models load at startup
+SPEECH_BACKENDS = os.getenv('SPEECH_BACKENDS', 'vosk,whisper,google,speechrecognition')
+SPEECH_PRELOAD = os.getenv('SPEECH_PRELOAD', 'true').lower() == 'true'
+
 class SpeechService:
     def __init__(self):
         # Initialize Google Cloud Speech client if credentials are available
@@ -24,98 +44,176 @@ class SpeechService:
             logger.info("SpeechRecognition library initialized as fallback")
         except ImportError:
             logger.warning("SpeechRecognition library not available")
+        
+        # speech_to_text dispatches through the registry of available backends
+        self.backends = SpeechBackendRegistry()
+        factories = {
+            'vosk': VoskBackend,
+            'whisper': WhisperBackend,
+            'google': lambda: GoogleCloudBackend(self.google_client) if self.google_client else None,
+            'speechrecognition': lambda: SpeechRecognitionBackend(self.sr_recognizer) if self.sr_recognizer else None,
+        }
+        for name in (name.strip() for name in SPEECH_BACKENDS.split(',')):
+            factory = factories.get(name)
+            backend = factory() if factory else None
+            if backend is not None and backend.available():
+                self.backends.register(backend)
+        logger.info(f"Speech backends: {', '.join(self.backends.names()) or 'none'}")
+        if SPEECH_PRELOAD:
+            self.backends.preload(background=True)
+        
+        # Retried uploads and regenerations reuse the transcript for identical audio
+        self.transcript_cache = TranscriptCache()
+    
+    def register_backend(self, backend, max_concurrency=None):
+        """
+        Add a custom backend (e.g. another offline engine) to the selection pool
+        """
+        self.backends.register(backend, max_concurrency)
+        if SPEECH_PRELOAD:
+            self.backends.preload(background=True)
+        return backend
+    
+    def _recognizer_config(self):
+        """
+        Settings that change the transcript for the same audio (part of the cache key)
+        """
+        return {
+            'backends': self.backends.names(),
+            'language': 'en-US',
+            'vad': VAD_ENABLED,
+            'vad_split': VAD_SPLIT,
+            'chunk_seconds': CHUNK_MAX_SECONDS,
+            'native_passthrough': NATIVE_PASSTHROUGH,
+        }
     
-    def speech_to_text(self, audio_file_path):
+    def speech_to_text(self, audio, stats=None, decoded=None):
         """
-        Convert audio file to text using available speech recognition services
+        Convert audio to text using available speech recognition services
+
+        ``audio`` may be an AudioBuffer, raw bytes, a file-like object or a
+        path; it is processed in memory without writing intermediate files.
+        Silence is trimmed first; pass a dict as ``stats`` to receive the VAD
+        report (original/kept/removed milliseconds) and the backend used.
+        ``decoded`` is an optional ``(samples, frame_energy)`` pair already
+        produced while the audio streamed in, which skips decoding and VAD analysis.
         """
         try:
-            # First try with Google Cloud Speech API if available
-            if self.google_client:
-                return self._google_speech_to_text(audio_file_path)
-            # Then try with SpeechRecognition library
-            elif self.sr_recognizer:
-                return self._speechrecognition_to_text(audio_file_path)
-            else:
-                # For demo purposes, return a placeholder response
-                logger.warning("No speech recognition service available. Using placeholder.")
-                return "This is a placeholder transcript. Please configure speech recognition services."
-                
+            audio_bytes = read_audio_bytes(audio)
+            config = self._recognizer_config()
+            cache_key = transcript_key(audio_bytes, config) if config['backends'] else None
+            if cache_key:
+                cached = self.transcript_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Transcript cache hit; skipping recognition")
+                    if stats is not None:
+                        stats['cached'] = True
+                    return cached
+            
+            transcript = self._transcribe(audio_bytes, stats, decoded)
+            if cache_key and transcript:
+                self.transcript_cache.put(cache_key, transcript)
+            return transcript
+        
         except Exception as e:
             logger.error(f"Error in speech to text conversion: {e}")
-            # Try fallback if primary method fails
-            if self.sr_recognizer and not self.google_client:
-                try:
-                    return self._speechrecognition_to_text(audio_file_path)
-                except:
-                    pass
             return None
     
-    def _speechrecognition_to_text(self, audio_file_path):
+    def _transcribe(self, audio_bytes, stats=None, decoded=None):
         """
-        Use SpeechRecognition library for transcription
+        Try backends in selection order: native upload when supported, else decoded PCM
         """
-        try:
-            import speech_recognition as sr
-            from pydub import AudioSegment
-            
-            logger.info("Converting audio with SpeechRecognition library...")
-            
-            # Convert WebM to WAV for SpeechRecognition
-            audio = AudioSegment.from_file(audio_file_path)
-            wav_path = audio_file_path.replace('.webm', '.wav')
-            audio.export(wav_path, format="wav")
-            
-            # Use SpeechRecognition
-            with sr.AudioFile(wav_path) as source:
-                audio_data = self.sr_recognizer.record(source)
-                text = self.sr_recognizer.recognize_google(audio_data)
-                
-            # Clean up temporary WAV file
-            if os.path.exists(wav_path):
-                os.remove(wav_path)
+        candidates = self.backends.candidates()
+        if not candidates:
+            # For demo purposes, return a placeholder response
+            logger.warning("No speech recognition service available. Using placeholder.")
+            return "This is a placeholder transcript. Please configure speech recognition services."
+        
+        audio_format = sniff_format(audio_bytes)
+        if stats is not None:
+            stats['format'] = audio_format['format']
+        
+        samples = None
+        prepared = False
+        last_error = None
+        native = NATIVE_PASSTHROUGH and self._fits_one_chunk(audio_bytes, audio_format, decoded)
+        for backend in candidates:
+            try:
+                # Short uploads in a format the backend reads natively skip decoding;
+                # if the backend rejects them fall through to decoded PCM
+                if native and audio_format['format'] in backend.native_formats:
+                    try:
+                        # Spilled uploads arrive memory-mapped; recognizer clients need real bytes
+                        transcript = self.backends.call(backend, backend.transcribe_native, bytes(audio_bytes),
+                                                        audio_format)
+                        if stats is not None:
+                            stats.update({'backend': backend.name, 'transcoded': False})
+                        return transcript or None
+                    except Exception as e:
+                        logger.warning(f"Native {audio_format['format']} recognition failed on {backend.name}, "
+                                       f"decoding instead: {e}")
+                        last_error = e
                 
-            logger.info(f"SpeechRecognition transcription successful: {text[:50]}...")
-            return text
-            
-        except Exception as e:
-            logger.error(f"Error in SpeechRecognition transcription: {e}")
-            raise e
+                if not prepared:
+                    samples = self._prepare_samples(audio_bytes, stats, decoded)
+                    prepared = True
+                if samples is None:
+                    # Undecodable here; only a backend that reads this format itself (and has not
+                    # just been tried with it) gets the upload
+                    if audio_format['format'] not in backend.native_formats or native:
+                        continue
+                    transcript = self.backends.call(backend, backend.transcribe_native, bytes(audio_bytes),
+                                                    audio_format)
+                elif len(samples) == 0:
+                    logger.info("No speech detected by voice activity detection")
+                    return None
+                else:
+                    transcript = transcribe_chunked(
+                        samples, lambda chunk: self.backends.call(backend, backend.transcribe_pcm, chunk))
+                if stats is not None:
+                    stats.update({'backend': backend.name, 'transcoded': audio_format['format'] != 'wav'})
+                return transcript or None
+            except Exception as e:
+                logger.warning(f"Speech backend {backend.name} failed: {e}")
+                last_error = e
+        if last_error is None:
+            logger.warning(f"Could not decode {audio_format['format'] or 'unrecognized'} audio and no backend reads it")
+            return None
+        raise last_error
+    
+    def _fits_one_chunk(self, audio_bytes, audio_format, decoded=None):
+        """Whether the upload is known to be no longer than one recognition chunk"""
+        if decoded is not None and decoded[0] is not None:
+            seconds = len(decoded[0]) / TARGET_SAMPLE_RATE
+        else:
+            seconds = native_duration(audio_bytes, audio_format)
+        return seconds is not None and seconds <= CHUNK_MAX_SECONDS
     
-    def _google_speech_to_text(self, audio_file_path):
+    def _prepare_samples(self, audio_bytes, stats=None, decoded=None):
         """
-        Use Google Cloud Speech API for transcription
+        Decode to 16 kHz PCM and trim silence when VAD is on; None if decoding fails
         """
-        try:
-            from google.cloud import speech
-            
-            with io.open(audio_file_path, "rb") as audio_file:
-                content = audio_file.read()
-            
-            audio = speech.RecognitionAudio(content=content)
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-                sample_rate_hertz=48000,
-                language_code="en-US",
-                enable_automatic_punctuation=True,
-                model="latest_long",
-            )
-            
-            response = self.google_client.recognize(config=config, audio=audio)
-            
-            if response.results:
-                transcript = response.results[0].alternatives[0].transcript
-                confidence = response.results[0].alternatives[0].confidence
-                
-                logger.info(f"Google Speech API transcript: {transcript} (confidence: {confidence})")
-                return transcript
-            else:
-                logger.warning("No speech detected by Google Cloud Speech")
+        samples, energy = decoded if decoded is not None else (None, None)
+        if samples is None:
+            try:
+                samples = decode_to_pcm(audio_bytes, TARGET_SAMPLE_RATE)
+            except Exception as e:
+                logger.warning(f"Could not decode audio in memory, sending it as uploaded: {e}")
                 return None
-                
-        except Exception as e:
-            logger.error(f"Google Cloud Speech error: {e}")
-            return None
+        if not VAD_ENABLED:
+            return samples
+        trimmed, report = trim_silence(samples, TARGET_SAMPLE_RATE, split=VAD_SPLIT, energy=energy)
+        logger.info(f"VAD removed {report['removed_ms']} ms of {report['original_ms']} ms audio")
+        if stats is not None:
+            stats.update(report)
+        return trimmed
+    
+    def create_stream_session(self, on_transcript, encoding='pcm_s16le', sample_rate=TARGET_SAMPLE_RATE):
+        """
+        Start a streaming recognition session emitting interim and final transcripts
+        """
+        return VoiceStreamSession(on_transcript, google_client=self.google_client,
+                                  encoding=encoding, sample_rate=sample_rate)
     
     def listen_continuously(self, callback):
         """
@@ -128,4 +226,4 @@ class SpeechService:
         """
         Check if microphone is available (placeholder implementation)
         """
-        return True  # Assume available for demo purposes
\ No newline at end of file
+        return True  # Assume available for demo purposes
@@ -0,0 +1,389 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from services.facet_index import FacetIndex
+from services.image_store import IMAGE_STORE, create_image_store
+from services.pagination import decode_cursor, encode_cursor
+from services.storage_backends import StorageBackend, without_heavy_fields
+
+logger = logging.getLogger(__name__)
+
+# Writes share one transaction until this many have accumulated or the interval passes
+SQLITE_COMMIT_BATCH = int(os.getenv('SQLITE_COMMIT_BATCH', 50))
+SQLITE_COMMIT_INTERVAL_MS = int(os.getenv('SQLITE_COMMIT_INTERVAL_MS', 200))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    transcript TEXT NOT NULL DEFAULT '',
+    keywords TEXT NOT NULL DEFAULT '',
+    enhanced_prompt TEXT NOT NULL DEFAULT '',
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_timestamp_id ON sessions (timestamp DESC, id DESC);
+CREATE TABLE IF NOT EXISTS session_images (
+    session_id TEXT NOT NULL,
+    blob_id TEXT NOT NULL,
+    PRIMARY KEY (session_id, blob_id)
+);
+CREATE INDEX IF NOT EXISTS session_images_blob ON session_images (blob_id);
+"""
+
+# External-content FTS5 index over the searchable columns, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+    transcript, keywords, enhanced_prompt, content='sessions', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+    INSERT INTO sessions_fts (rowid, transcript, keywords, enhanced_prompt)
+    VALUES (new.rowid, new.transcript, new.keywords, new.enhanced_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN
+    INSERT INTO sessions_fts (sessions_fts, rowid, transcript, keywords, enhanced_prompt)
+    VALUES ('delete', old.rowid, old.transcript, old.keywords, old.enhanced_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE ON sessions BEGIN
+    INSERT INTO sessions_fts (sessions_fts, rowid, transcript, keywords, enhanced_prompt)
+    VALUES ('delete', old.rowid, old.transcript, old.keywords, old.enhanced_prompt);
+    INSERT INTO sessions_fts (rowid, transcript, keywords, enhanced_prompt)
+    VALUES (new.rowid, new.transcript, new.keywords, new.enhanced_prompt);
+END;
+"""
+
+# Same field weights as the Mongo text index
+FTS_WEIGHTS = (10.0, 5.0, 2.0)
+
+
+def sqlite_path(uri):
+    """File path from sqlite:///relative.db or sqlite:////absolute.db; sqlite:// is in-memory"""
+    path = uri.split('://', 1)[1] if '://' in uri else ''
+    if path in ('', '/', '/:memory:'):
+        return ':memory:'
+    return path[1:] if path.startswith('/') else path
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot store {type(value).__name__} in a session document")
+
+
+def _json_object(value):
+    if len(value) == 1 and '$date' in value:
+        return datetime.fromisoformat(value['$date'])
+    return value
+
+
+def _timestamp_key(timestamp):
+    """Sortable text form of a session timestamp (aware datetimes normalised to UTC)"""
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp.isoformat()
+    return str(timestamp)
+
+
+def _search_columns(document):
+    concepts = document.get('visual_concepts') or {}
+    return (
+        document.get('transcript') or '',
+        ' '.join(str(keyword) for keyword in concepts.get('keywords') or []),
+        document.get('enhanced_prompt') or '',
+    )
+
+
+def _fts_query(query):
+    """Any of the words, each quoted so FTS5 syntax characters are taken literally"""
+    return ' OR '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+class SQLiteBackend(StorageBackend):
+    """Sessions in an embedded SQLite database: WAL journal, FTS5 search, batched commits
+
+    One connection is shared under a lock so reads see writes that are still
+    waiting for their batch commit. Image bytes go to the filesystem image store.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, uri='sqlite:///echosketch.db', commit_batch=None, commit_interval=None, background=True):
+        self.path = sqlite_path(uri)
+        if self.path != ':memory:' and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.commit_batch = commit_batch or SQLITE_COMMIT_BATCH
+        self.commit_interval = commit_interval or SQLITE_COMMIT_INTERVAL_MS / 1000
+        self.lock = threading.RLock()
+        self.uncommitted = 0
+
+        # Autocommit mode: transactions are opened and committed explicitly in batches
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                    cached_statements=256)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, searching with LIKE: {e}")
+            self.fts = False
+
+        # GridFS needs Mongo; keep image bytes on disk instead
+        self.images = create_image_store(None, 'filesystem' if IMAGE_STORE == 'gridfs' else IMAGE_STORE)
+        self.connected = True
+
+        self.stopping = threading.Event()
+        self.committer = threading.Thread(target=self._commit_loop, name='sqlite-commit', daemon=True)
+        self.committer.start()
+        self.facets = FacetIndex()
+        if background:
+            self.facets_loading = threading.Thread(target=self.load_facets, name='facet-index', daemon=True)
+            self.facets_loading.start()
+        atexit.register(self.close_connection)
+        logger.info(f"Using SQLite session storage: {self.path}")
+
+    def _commit_loop(self):
+        while not self.stopping.wait(self.commit_interval):
+            try:
+                self.commit()
+            except sqlite3.Error as e:
+                logger.error(f"SQLite batch commit failed: {e}")
+
+    def _write(self, statements):
+        """Run write statements in the open batch transaction, committing when the batch is full"""
+        with self.lock:
+            if not self.conn.in_transaction:
+                self.conn.execute('BEGIN')
+            # A savepoint keeps one failed write from leaving half its rows in the batch
+            self.conn.execute('SAVEPOINT write')
+            try:
+                for sql, params in statements:
+                    self.conn.execute(sql, params)
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK TO write')
+                raise
+            finally:
+                self.conn.execute('RELEASE write')
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_batch:
+                self.commit()
+
+    def commit(self):
+        with self.lock:
+            if self.conn.in_transaction:
+                self.conn.execute('COMMIT')
+            self.uncommitted = 0
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _load(self, document_json):
+        return json.loads(document_json, object_hook=_json_object)
+
+    def save_session(self, session_data: dict) -> str:
+        """Save session data to the database"""
+        try:
+            if 'timestamp' not in session_data:
+                session_data['timestamp'] = self.get_current_timestamp()
+            self._externalize_images(session_data)
+            session_data['_id'] = session_id = str(session_data.get('_id') or ObjectId())
+
+            statements = [(
+                'INSERT INTO sessions (id, timestamp, transcript, keywords, enhanced_prompt, document) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (session_id, _timestamp_key(session_data['timestamp']), *_search_columns(session_data),
+                 json.dumps(session_data, default=_json_default)),
+            )]
+            statements += [('INSERT OR IGNORE INTO session_images (session_id, blob_id) VALUES (?, ?)',
+                            (session_id, blob_id)) for blob_id in session_data.get('image_blobs', [])]
+            self._write(statements)
+            self.facets.add(session_id, session_data)
+
+            logger.info(f"Session saved with ID: {session_id}")
+            return session_id
+
+        except Exception as e:
+            logger.error(f"Error saving session: {e}")
+            return "error_session"
+
+    def get_session(self, session_id: str, include_images: bool = True) -> dict:
+        """Get session data by ID"""
+        try:
+            rows = self._query('SELECT document FROM sessions WHERE id = ?', (session_id,))
+            if not rows:
+                logger.warning(f"Session not found: {session_id}")
+                return None
+            document = self._load(rows[0][0])
+            if include_images:
+                self._inline_images(document)
+            return document
+        except Exception as e:
+            logger.error(f"Error retrieving session: {e}")
+            return None
+
+    def get_sessions_page(self, limit: int = 10, cursor: str = None) -> tuple:
+        """Newest-first sessions after ``cursor`` (seeking on the timestamp index) and the next cursor"""
+        limit = max(1, limit)
+        if cursor:
+            timestamp, session_id = decode_cursor(cursor)
+            timestamp = _timestamp_key(timestamp)
+            rows = self._query(
+                'SELECT document FROM sessions WHERE timestamp < ? OR (timestamp = ? AND id < ?) '
+                'ORDER BY timestamp DESC, id DESC LIMIT ?', (timestamp, timestamp, session_id, limit + 1))
+        else:
+            rows = self._query('SELECT document FROM sessions ORDER BY timestamp DESC, id DESC LIMIT ?',
+                               (limit + 1,))
+        sessions = [without_heavy_fields(self._load(row[0])) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(sessions[-1].get('timestamp'), sessions[-1]['_id'])
+        return sessions, next_cursor
+
+    def iter_sessions(self, since=None, until=None, fields=None, include_images=False, batch_size=500):
+        """Oldest-first sessions with since <= timestamp < until, read in keyset batches
+
+        The lock is held for one batch query at a time, so writers are not
+        blocked for the length of an export.
+        """
+        conditions, params = [], []
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(_timestamp_key(since))
+        if until is not None:
+            conditions.append('timestamp < ?')
+            params.append(_timestamp_key(until))
+        position = None
+        while True:
+            where, args = list(conditions), list(params)
+            if position:
+                where.append('(timestamp > ? OR (timestamp = ? AND id > ?))')
+                args += [position[0], position[0], position[1]]
+            rows = self._query(
+                'SELECT timestamp, id, document FROM sessions ' + ('WHERE ' + ' AND '.join(where) + ' ' if where else '') +
+                'ORDER BY timestamp, id LIMIT ?', (*args, batch_size))
+            for _, _, document_json in rows:
+                yield self._export_document(self._load(document_json), fields, include_images)
+            if len(rows) < batch_size:
+                return
+            position = rows[-1][:2]
+
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session by ID, and any image blobs only it referenced"""
+        try:
+            blob_ids = [row[0] for row in self._query(
+                'SELECT blob_id FROM session_images WHERE session_id = ?', (session_id,))]
+            with self.lock:
+                exists = self._query('SELECT 1 FROM sessions WHERE id = ?', (session_id,))
+                if not exists:
+                    logger.warning(f"Session not found for deletion: {session_id}")
+                    return False
+                self._write([('DELETE FROM sessions WHERE id = ?', (session_id,)),
+                             ('DELETE FROM session_images WHERE session_id = ?', (session_id,))])
+            self.facets.remove(session_id)
+            for blob_id in blob_ids:
+                if self.images is not None and not self._query(
+                        'SELECT 1 FROM session_images WHERE blob_id = ? LIMIT 1', (blob_id,)):
+                    self.images.delete(blob_id)
+            logger.info(f"Session deleted: {session_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting session: {e}")
+            return False
+
+    def update_session(self, session_id: str, update_data: dict) -> bool:
+        """Update top-level (or dotted-path) fields of a session, like Mongo's $set"""
+        try:
+            with self.lock:
+                rows = self._query('SELECT document FROM sessions WHERE id = ?', (session_id,))
+                if not rows:
+                    logger.warning(f"Session not found for update: {session_id}")
+                    return False
+                document = self._load(rows[0][0])
+                update_data['updated_at'] = self.get_current_timestamp()
+                for path, value in update_data.items():
+                    *parents, field = path.split('.')
+                    target = document
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[field] = value
+                self._write([(
+                    'UPDATE sessions SET timestamp = ?, transcript = ?, keywords = ?, enhanced_prompt = ?, '
+                    'document = ? WHERE id = ?',
+                    (_timestamp_key(document['timestamp']), *_search_columns(document),
+                     json.dumps(document, default=_json_default), session_id),
+                )])
+            self._reindex_facets(session_id, update_data, document)
+            logger.info(f"Session updated: {session_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error updating session: {e}")
+            return False
+
+    def search_sessions(self, query: str, limit: int = 20) -> list:
+        """Search transcripts, keywords and prompts, best matches first"""
+        try:
+            if not query.strip():
+                return []
+            if self.fts:
+                # bm25 is lower for better matches; score mirrors Mongo's textScore (higher is better)
+                rows = self._query(
+                    'SELECT s.document, -bm25(sessions_fts, ?, ?, ?) AS score FROM sessions_fts '
+                    'JOIN sessions s ON s.rowid = sessions_fts.rowid WHERE sessions_fts MATCH ? '
+                    'ORDER BY score DESC, s.timestamp DESC LIMIT ?', (*FTS_WEIGHTS, _fts_query(query), limit))
+            else:
+                pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                rows = self._query(
+                    "SELECT document, NULL FROM sessions WHERE transcript LIKE ?1 ESCAPE '\\' "
+                    "OR keywords LIKE ?1 ESCAPE '\\' OR enhanced_prompt LIKE ?1 ESCAPE '\\' "
+                    'ORDER BY timestamp DESC LIMIT ?2', (pattern, limit))
+            sessions = []
+            for document_json, score in rows:
+                session = without_heavy_fields(self._load(document_json))
+                if score is not None:
+                    session['score'] = score
+                sessions.append(session)
+            logger.info(f"Found {len(sessions)} sessions matching: {query}")
+            return sessions
+        except Exception as e:
+            logger.error(f"Error searching sessions: {e}")
+            return []
+
+    def get_statistics(self) -> dict:
+        """Get database statistics"""
+        try:
+            count, oldest, newest = self._query('SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM sessions')[0]
+            stats = {
+                'total_sessions': count,
+                'database_connected': True,
+                'database_name': self.path,
+                'collection_name': 'sessions',
+            }
+            if count:
+                stats['oldest_session'] = oldest
+                stats['newest_session'] = newest
+            return stats
+        except Exception as e:
+            logger.error(f"Error getting statistics: {e}")
+            return {'total_sessions': 0, 'database_connected': False, 'error': str(e)}
+
+    def close_connection(self):
+        """Commit pending writes and close the database"""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        self.committer.join(timeout=5)
+        with self.lock:
+            self.commit()
+            self.conn.close()
+        logger.info("SQLite database closed")
@@ -0,0 +1,191 @@
+import logging
+import os
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from services.image_utils import decode_data_uri, encode_data_uri
+
+logger = logging.getLogger(__name__)
+
+# Where sessions are stored; the URI scheme picks the backend (mongodb://, mongodb+srv://, sqlite://)
+DATABASE_URI = os.getenv('DATABASE_URI') or os.getenv('MONGODB_URI', 'mongodb://localhost:27017/echosketch')
+
+# Image bytes are never needed by listings or search results
+HEAVY_FIELDS_PROJECTION = {'image_data.image_data': 0, 'image_data.variations': 0}
+
+
+def without_heavy_fields(document):
+    """Copy of a session document with HEAVY_FIELDS_PROJECTION applied"""
+    document = dict(document)
+    if isinstance(document.get('image_data'), dict):
+        document['image_data'] = {key: value for key, value in document['image_data'].items()
+                                  if key not in ('image_data', 'variations')}
+    return document
+
+
+class StorageBackend:
+    """Session persistence interface implemented by DatabaseService (Mongo) and SQLiteBackend
+
+    Session ids are strings; ``images`` is an image store for separately kept
+    image bytes, or None to leave them inline in the session.
+    """
+
+    name = 'base'
+    connected = False
+    images = None
+    facets = None
+    facets_loading = None
+
+    def save_session(self, session_data: dict) -> str:
+        raise NotImplementedError
+
+    def get_session(self, session_id: str, include_images: bool = True) -> dict:
+        raise NotImplementedError
+
+    def get_sessions_page(self, limit: int = 10, cursor: str = None) -> tuple:
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def update_session(self, session_id: str, update_data: dict) -> bool:
+        raise NotImplementedError
+
+    def search_sessions(self, query: str, limit: int = 20) -> list:
+        raise NotImplementedError
+
+    def get_statistics(self) -> dict:
+        raise NotImplementedError
+
+    def iter_sessions(self, since=None, until=None, fields=None, include_images=False, batch_size=500):
+        """Oldest-first sessions with since <= timestamp < until, fetched ``batch_size`` at a time"""
+        raise NotImplementedError
+
+    def close_connection(self):
+        pass
+
+    def _externalize_images(self, session_data):
+        """Replace inline image bytes with image store references (image_ref) in place"""
+        image_data = session_data.get('image_data')
+        if self.images is None or not isinstance(image_data, dict):
+            return
+        blob_ids = []
+
+        def externalize(entry):
+            mimetype, content = decode_data_uri(entry.get('image_data'))
+            if content is None:
+                return dict(entry)
+            blob_id = self.images.put(content, mimetype)
+            blob_ids.append(blob_id)
+            return dict(entry, image_data=None,
+                        image_ref={'blob_id': blob_id, 'mimetype': mimetype, 'size': len(content)})
+
+        try:
+            # Copies: callers keep using the original dict in their responses
+            stored = externalize(image_data)
+            if image_data.get('variations'):
+                stored['variations'] = [externalize(variation) for variation in image_data['variations']]
+        except Exception as e:
+            logger.warning(f"Could not store image separately, keeping it inline: {e}")
+            return
+        session_data['image_data'] = stored
+        if blob_ids:
+            session_data['image_blobs'] = sorted(set(blob_ids))
+
+    def _load_image(self, entry):
+        """(mimetype, bytes) for an image entry, whether stored separately or inline"""
+        ref = (entry or {}).get('image_ref')
+        if ref and self.images is not None:
+            return ref.get('mimetype'), self.images.get(ref['blob_id'])
+        return decode_data_uri((entry or {}).get('image_data'))
+
+    def _inline_images(self, document):
+        """Restore data URIs in a session document whose images were stored separately"""
+        image_data = document.get('image_data')
+        if not isinstance(image_data, dict):
+            return
+
+        def inline(entry):
+            if not entry.get('image_ref'):
+                return entry
+            mimetype, content = self._load_image(entry)
+            return dict(entry, image_data=encode_data_uri(mimetype, content) if content is not None else None)
+
+        document['image_data'] = inline(image_data)
+        if image_data.get('variations'):
+            document['image_data']['variations'] = [inline(variation) for variation in image_data['variations']]
+
+    def _export_document(self, document, fields=None, include_images=False):
+        """Session document as exported: only ``fields`` (plus _id), image bytes inlined or left out"""
+        document.pop('image_blobs', None)
+        if include_images:
+            self._inline_images(document)
+        else:
+            document = without_heavy_fields(document)
+        if fields:
+            document = {key: value for key, value in document.items() if key == '_id' or key in fields}
+        document['_id'] = str(document['_id'])
+        return document
+
+    def load_facets(self):
+        """Build the concept facet index from every stored session (run in the background)"""
+        try:
+            loaded = self.facets.load(self.iter_sessions(fields=['visual_concepts']))
+            logger.info(f"Indexed concept facets of {loaded} sessions")
+        except Exception as e:
+            logger.error(f"Could not build the facet index: {e}")
+
+    def facet_search(self, filters: dict, limit: int = 50, facet_limit: int = 10) -> dict:
+        """Newest session ids having every facet value in ``filters``, with per-facet counts
+
+        ``loading`` is true until the index has been built from stored sessions;
+        results meanwhile cover only what has been indexed so far.
+        """
+        result = self.facets.query(filters, limit, facet_limit)
+        result['loading'] = self.facets_loading is None or self.facets_loading.is_alive()
+        return result
+
+    def _reindex_facets(self, session_id, update_data, document=None):
+        """Re-index a session's facets after an update that touched its visual concepts"""
+        if any(path.split('.')[0] == 'visual_concepts' for path in update_data):
+            if document is None:
+                document = self.get_session(session_id, include_images=False) or {}
+            self.facets.add(session_id, document)
+
+    def get_image(self, session_id: str, variation: int = None):
+        """(mimetype, bytes) of a session's image or one of its variations; (None, None) if missing"""
+        document = self.get_session(session_id, include_images=False)
+        image_data = (document or {}).get('image_data') or {}
+        if variation is not None:
+            variations = image_data.get('variations') or [image_data]
+            image_data = variations[variation] if 0 <= variation < len(variations) else {}
+        try:
+            return self._load_image(image_data)
+        except Exception as e:
+            logger.error(f"Error loading image for session {session_id}: {e}")
+            return None, None
+
+    def get_recent_sessions(self, limit: int = 10) -> list:
+        """Get recent sessions without image bytes"""
+        return self.get_sessions_page(limit)[0]
+
+    def get_current_timestamp(self) -> datetime:
+        """Get current timestamp in UTC"""
+        return datetime.now(timezone.utc)
+
+
+def create_storage(uri=None, background=True):
+    """Storage backend for ``uri`` (default DATABASE_URI), chosen by its scheme
+
+    ``background=False`` skips maintenance threads (health monitor, index
+    builds, facet loading, archiving) for short-lived tools like exports.
+    """
+    uri = uri or DATABASE_URI
+    scheme = urlparse(uri).scheme.lower()
+    if scheme == 'sqlite':
+        from services.sqlite_store import SQLiteBackend
+        return SQLiteBackend(uri, background=background)
+    if scheme in ('mongodb', 'mongodb+srv'):
+        from services.database_service import DatabaseService
+        return DatabaseService(uri, background=background)
+    raise ValueError(f"Unsupported database URI scheme: {scheme or uri!r}")
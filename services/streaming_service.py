@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+import numpy as np
+
+from services.audio_formats import sniff_format
+from services.audio_processing import TARGET_SAMPLE_RATE, StreamResampler, transcoder
+from services.speech_backends import VOSK_AVAILABLE, VOSK_MODEL_PATH, load_vosk_model, vosk
+
+logger = logging.getLogger(__name__)
+
+# Seconds of audio kept per connection and how often interim results are produced
+STREAM_BUFFER_SECONDS = int(os.getenv('STREAM_BUFFER_SECONDS', 60))
+STREAM_INTERIM_SECONDS = float(os.getenv('STREAM_INTERIM_SECONDS', 0.5))
+# The windowed engine transcribes at most this much audio per call; longer speech is committed in segments
+STREAM_SEGMENT_SECONDS = float(os.getenv('STREAM_SEGMENT_SECONDS', 10))
+
+# Raw PCM needs no container decoding; anything else is decoded with ffmpeg
+PCM_ENCODINGS = {'pcm_s16le', 'linear16'}
+
+
+class AudioRingBuffer:
+    """Fixed-capacity byte ring holding the most recent audio of a stream"""
+
+    def __init__(self, capacity_bytes):
+        self.capacity = capacity_bytes
+        self.buffer = bytearray(capacity_bytes)
+        self.start = 0
+        self.length = 0
+        self.total_written = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.total_written += len(data)
+        if len(data) >= self.capacity:
+            data = data[-self.capacity:]
+        end = (self.start + self.length) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self.buffer[end:end + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+        overflow = max(0, self.length + len(data) - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.length = min(self.capacity, self.length + len(data))
+
+    def read_since(self, offset):
+        """Audio written since absolute byte ``offset`` (as much of it as is still buffered)"""
+        kept = min(self.length, self.total_written - offset)
+        return self.read_all()[self.length - kept:] if kept > 0 else b''
+
+    def read_all(self):
+        """Buffered audio from oldest to newest"""
+        end = self.start + self.length
+        if end <= self.capacity:
+            return bytes(self.buffer[self.start:end])
+        return bytes(self.buffer[self.start:]) + bytes(self.buffer[:end - self.capacity])
+
+    def __len__(self):
+        return self.length
+
+
+class WindowedEngine:
+    """Local engine that re-transcribes the current segment every few hundred ms
+
+    Works with any batch ``transcribe(pcm_bytes, sample_rate)`` callable; at
+    most one interim transcription runs at a time so slow engines never queue.
+    Once a segment reaches STREAM_SEGMENT_SECONDS its transcript is committed
+    and a new segment starts, so no call sends more than one segment of audio.
+    """
+
+    def __init__(self, ring, sample_rate, on_result, transcribe=None):
+        self.ring = ring
+        self.sample_rate = sample_rate
+        self.on_result = on_result
+        self.transcribe = transcribe or _speechrecognition_transcribe
+        self.interim_bytes = int(STREAM_INTERIM_SECONDS * sample_rate * 2)
+        self.segment_bytes = int(STREAM_SEGMENT_SECONDS * sample_rate * 2)
+        self.pending_bytes = 0
+        self.segment_start = 0
+        self.committed = []
+        self.segment_text = ''
+        self.busy = threading.Lock()
+        self.last_text = ''
+
+    def accept(self, pcm):
+        self.pending_bytes += len(pcm)
+        if self.pending_bytes < self.interim_bytes or not self.busy.acquire(blocking=False):
+            return
+        self.pending_bytes = 0
+        segment = self.ring.read_since(self.segment_start)
+        closes = self.ring.total_written - self.segment_start >= self.segment_bytes
+        if closes:
+            self.segment_start = self.ring.total_written
+        threading.Thread(target=self._interim, args=(segment, closes), daemon=True).start()
+
+    def _interim(self, pcm, closes):
+        try:
+            text = self.transcribe(pcm, self.sample_rate)
+            if closes:
+                if text:
+                    self.committed.append(text)
+                self.segment_text = ''
+            elif text:
+                self.segment_text = text
+            text = ' '.join(self.committed + [self.segment_text]).strip()
+            if text and text != self.last_text:
+                self.last_text = text
+                self.on_result(text, False)
+        except Exception as e:
+            logger.debug(f"Interim transcription failed: {e}")
+        finally:
+            self.busy.release()
+
+    def finish(self):
+        with self.busy:
+            segment = self.ring.read_since(self.segment_start)
+            text = self.transcribe(segment, self.sample_rate) if segment else ''
+            text = ' '.join(self.committed + [text or self.segment_text]).strip()
+        self.on_result(text or self.last_text, True)
+
+
+class VoskEngine:
+    """Fully offline streaming engine backed by a Vosk/Kaldi model"""
+
+    def __init__(self, ring, sample_rate, on_result):
+        self.recognizer = vosk.KaldiRecognizer(load_vosk_model(), sample_rate)
+        self.on_result = on_result
+        self.final_parts = []
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(pcm):
+            text = json.loads(self.recognizer.Result()).get('text', '')
+            if text:
+                self.final_parts.append(text)
+                self.on_result(' '.join(self.final_parts), False)
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+            if partial:
+                self.on_result(' '.join(self.final_parts + [partial]), False)
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get('text', '')
+        if text:
+            self.final_parts.append(text)
+        self.on_result(' '.join(self.final_parts), True)
+
+
+def _speechrecognition_transcribe(pcm, sample_rate):
+    import speech_recognition as sr
+    recognizer = sr.Recognizer()
+    try:
+        return recognizer.recognize_google(sr.AudioData(pcm, sample_rate, 2))
+    except sr.UnknownValueError:
+        return ''
+
+
+# Local streaming engines by name; register_local_engine() adds more
+LOCAL_ENGINES = {
+    'windowed': WindowedEngine,
+}
+if VOSK_AVAILABLE and os.path.isdir(VOSK_MODEL_PATH):
+    LOCAL_ENGINES['vosk'] = VoskEngine
+
+
+def register_local_engine(name, factory):
+    """Register a local engine factory called as factory(ring, sample_rate, on_result)"""
+    LOCAL_ENGINES[name] = factory
+
+
+def _default_local_engine():
+    configured = os.getenv('STREAMING_LOCAL_ENGINE')
+    if configured in LOCAL_ENGINES:
+        return configured
+    return 'vosk' if 'vosk' in LOCAL_ENGINES else 'windowed'
+
+
+class GoogleStreamingEngine:
+    """Google Cloud streaming_recognize fed from a request queue in a background thread"""
+
+    def __init__(self, client, encoding, sample_rate, on_result):
+        from google.cloud import speech
+
+        self.speech = speech
+        self.client = client
+        self.on_result = on_result
+        self.requests = queue.Queue()
+        self.final_parts = []
+        audio_encoding = (speech.RecognitionConfig.AudioEncoding.LINEAR16 if encoding in PCM_ENCODINGS
+                          else speech.RecognitionConfig.AudioEncoding.WEBM_OPUS)
+        self.config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=audio_encoding,
+                sample_rate_hertz=sample_rate,
+                language_code="en-US",
+                enable_automatic_punctuation=True,
+            ),
+            interim_results=True,
+        )
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _request_iter(self):
+        while True:
+            chunk = self.requests.get()
+            if chunk is None:
+                return
+            yield self.speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    def _run(self):
+        try:
+            responses = self.client.streaming_recognize(self.config, self._request_iter())
+            for response in responses:
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    text = result.alternatives[0].transcript
+                    if result.is_final:
+                        self.final_parts.append(text.strip())
+                        self.on_result(' '.join(self.final_parts), False)
+                    else:
+                        self.on_result(' '.join(self.final_parts + [text.strip()]), False)
+        except Exception as e:
+            logger.error(f"Google streaming recognition error: {e}")
+
+    def accept(self, chunk):
+        self.requests.put(bytes(chunk))
+
+    def finish(self):
+        self.requests.put(None)
+        self.thread.join(timeout=30)
+        self.on_result(' '.join(self.final_parts), True)
+
+
+class VoiceStreamSession:
+    """Per-connection streaming recognition state
+
+    Chunks go to Google ``streaming_recognize`` when a client is configured,
+    otherwise they are decoded to 16 kHz PCM, kept in a ring buffer and fed
+    to the local engine. ``on_transcript(text, is_final)`` receives results.
+    """
+
+    def __init__(self, on_transcript, google_client=None, encoding='pcm_s16le',
+                 sample_rate=TARGET_SAMPLE_RATE, engine=None):
+        self.encoding = (encoding or 'pcm_s16le').lower()
+        self.sample_rate = int(sample_rate or TARGET_SAMPLE_RATE)
+        self.resampler = StreamResampler(self.sample_rate, TARGET_SAMPLE_RATE)
+        self.encoded = bytearray()
+        self.decoder = None
+        self.decode_failed = False
+        self.closed = False
+        self.ring = AudioRingBuffer(STREAM_BUFFER_SECONDS * TARGET_SAMPLE_RATE * 2)
+
+        if google_client is not None:
+            self.engine = GoogleStreamingEngine(google_client, self.encoding, self.sample_rate, on_transcript)
+            self.forward_raw = True
+        else:
+            factory = LOCAL_ENGINES[engine or _default_local_engine()]
+            self.engine = factory(self.ring, TARGET_SAMPLE_RATE, on_transcript)
+            self.forward_raw = False
+
+    def feed(self, chunk):
+        if self.closed or not chunk:
+            return
+        if self.forward_raw:
+            self.engine.accept(chunk)
+            return
+        pcm = self._to_pcm(chunk)
+        if len(pcm):
+            self.ring.write(pcm)
+            self.engine.accept(pcm)
+
+    def _to_pcm(self, chunk):
+        if self.encoding in PCM_ENCODINGS:
+            return self.resampler.feed(np.frombuffer(bytes(chunk), dtype='<i2')).tobytes()
+        if self.decode_failed:
+            return b''
+        # Container formats (webm/ogg) only decode from the start of the stream: hold the
+        # bytes until an ffmpeg stream decoder is free, then feed it chunk by chunk
+        if self.decoder is None:
+            self.encoded.extend(chunk)
+            if not transcoder.ffmpeg:
+                logger.warning(f"ffmpeg not found; cannot decode {self.encoding} stream")
+                self._stop_decoder()
+                return b''
+            self.decoder = transcoder.open_stream(TARGET_SAMPLE_RATE, sniff_format(self.encoded)['format'])
+            if self.decoder is None:
+                if len(self.encoded) > self.ring.capacity:
+                    logger.warning("No ffmpeg decoder became free for this stream; dropping its audio")
+                    self._stop_decoder()
+                return b''
+            chunk, self.encoded = bytes(self.encoded), bytearray()
+        try:
+            return self.decoder.feed(chunk).tobytes()
+        except Exception as e:
+            logger.warning(f"Stream decode stopped: {e}")
+            self._stop_decoder()
+            return b''
+
+    def _stop_decoder(self):
+        self.decode_failed = True
+        self.encoded = bytearray()
+        if self.decoder is not None:
+            self.decoder.abort()
+            self.decoder = None
+
+    def finish(self):
+        """Flush the recognizer and emit the final transcript"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.decoder is not None:
+            decoder, self.decoder = self.decoder, None
+            try:
+                pcm = decoder.close().tobytes()
+                if pcm:
+                    self.ring.write(pcm)
+                    self.engine.accept(pcm)
+            except Exception as e:
+                logger.warning(f"Stream decode failed at the end of the stream: {e}")
+        self.engine.finish()
+
+    def close(self):
+        """Drop the stream without waiting for a final result"""
+        self.closed = True
+        if self.decoder is not None:
+            self._stop_decoder()
+        if isinstance(self.engine, GoogleStreamingEngine):
+            self.engine.requests.put(None)
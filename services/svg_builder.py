@@ -0,0 +1,82 @@
+from xml.sax.saxutils import escape, quoteattr
+
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+
+
+def fmt_number(value):
+    """Format a coordinate as compactly as possible (2 decimals, no trailing zeros)"""
+    if isinstance(value, int):
+        return str(value)
+    text = f"{value:.2f}".rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    return text if text not in ('', '-') else '0'
+
+
+def _attr_value(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return fmt_number(value)
+    return str(value)
+
+
+def element(tag, attrs=None, children=None, text=None):
+    """Render a single minified SVG element
+
+    Attribute names use underscores for dashes (``stroke_width`` becomes
+    ``stroke-width``); ``None`` values are skipped.
+    """
+    parts = [tag]
+    for name, value in (attrs or {}).items():
+        if value is None:
+            continue
+        parts.append(f"{name.rstrip('_').replace('_', '-')}={quoteattr(_attr_value(value))}")
+    opening = ' '.join(parts)
+    if children is None and text is None:
+        return f"<{opening}/>"
+    inner = ''.join(children or []) + (escape(text) if text is not None else '')
+    return f"<{opening}>{inner}</{tag}>"
+
+
+class SvgBuilder:
+    """Builds minified SVG documents with shared <defs> for repeated shapes"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.defs = []
+        self.def_ids = set()
+        self.elements = []
+
+    def define(self, def_id, tag, attrs=None, children=None):
+        """Add a reusable shape to <defs> once; returns its reference id"""
+        if def_id not in self.def_ids:
+            self.def_ids.add(def_id)
+            self.defs.append(element(tag, dict({'id': def_id}, **(attrs or {})), children))
+        return def_id
+
+    def add(self, tag, attrs=None, children=None, text=None):
+        self.elements.append(element(tag, attrs, children, text))
+
+    def group(self, children, **attrs):
+        self.elements.append(element('g', attrs, children))
+
+    @staticmethod
+    def use(def_id, x=0, y=0, scale=None, **attrs):
+        """Reference a shape defined with define() at a position and scale"""
+        transform = f"translate({fmt_number(x)} {fmt_number(y)})"
+        if scale is not None and scale != 1:
+            transform += f"scale({fmt_number(scale)})"
+        return element('use', dict({'href': f"#{def_id}", 'transform': transform}, **attrs))
+
+    def to_string(self):
+        body = ''
+        if self.defs:
+            body += f"<defs>{''.join(self.defs)}</defs>"
+        body += ''.join(self.elements)
+        return (f'<svg xmlns="{SVG_NAMESPACE}" width="{self.width}" height="{self.height}" '
+                f'viewBox="0 0 {self.width} {self.height}">{body}</svg>')
+
+    def to_bytes(self):
+        return self.to_string().encode('utf-8')
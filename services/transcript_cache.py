@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bytes of transcript files kept in TRANSCRIPT_CACHE_DIR; least recently used files are deleted beyond this
+TRANSCRIPT_CACHE_DISK_BYTES = int(os.getenv('TRANSCRIPT_CACHE_DISK_BYTES', 64 * 1024 * 1024))
+
+
+def transcript_key(audio_bytes, config=None):
+    """Hash of the audio bytes plus the recognizer config that produced the transcript"""
+    digest = hashlib.sha256(json.dumps(config or {}, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(audio_bytes)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """LRU of transcripts by audio hash, optionally persisted as one JSON file per entry
+
+    Retried uploads and "regenerate" re-sends hash to the same key and skip
+    decoding and recognition entirely. Files on disk are capped at
+    ``max_disk_bytes``; a file's mtime is refreshed when it is read, so the
+    least recently used files go first, also across restarts.
+    """
+
+    def __init__(self, max_entries=None, cache_dir=None, max_disk_bytes=None):
+        self.max_entries = max_entries or int(os.getenv('TRANSCRIPT_CACHE_SIZE', 1024))
+        self.cache_dir = cache_dir if cache_dir is not None else os.getenv('TRANSCRIPT_CACHE_DIR')
+        self.max_disk_bytes = max_disk_bytes or TRANSCRIPT_CACHE_DISK_BYTES
+        self.cache = OrderedDict()
+        self.disk = OrderedDict()
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._scan_disk()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan_disk(self):
+        """Index existing cache files, oldest first, and trim them to the byte cap"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(files):
+            self.disk[key] = size
+            self.disk_bytes += size
+        self._evict_disk()
+
+    def get(self, key):
+        with self.lock:
+            transcript = self.cache.get(key)
+            if transcript is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return transcript
+
+        transcript = self._load(key)
+        with self.lock:
+            if transcript is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._remember(key, transcript)
+        return transcript
+
+    def put(self, key, transcript):
+        if not transcript:
+            return
+        self._remember(key, transcript)
+        if self.cache_dir:
+            try:
+                tmp_path = f"{self._path(key)}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'transcript': transcript}, f)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.warning(f"Could not persist transcript cache entry: {e}")
+                return
+            with self.lock:
+                self._track_disk(key)
+                self._evict_disk()
+
+    def _remember(self, key, transcript):
+        with self.lock:
+            self.cache[key] = transcript
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def _track_disk(self, key):
+        try:
+            size = os.path.getsize(self._path(key))
+        except OSError:
+            size = 0
+        self.disk_bytes += size - self.disk.pop(key, 0)
+        self.disk[key] = size
+
+    def _evict_disk(self):
+        while self.disk_bytes > self.max_disk_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass  # already removed, e.g. by another worker sharing the directory
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                transcript = json.load(f).get('transcript')
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            else:
+                self._track_disk(key)
+                self._evict_disk()
+        return transcript
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.cache),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'persistent': bool(self.cache_dir),
+                'disk_entries': len(self.disk),
+                'disk_bytes': self.disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes,
+            }
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+
+from services.audio_processing import TARGET_SAMPLE_RATE
+
+# Frame size for energy analysis and the padding kept around detected speech
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = int(os.getenv('VAD_PADDING_MS', 200))
+# Frames this far above the noise floor count as speech (never below VAD_MIN_DBFS)
+VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', 15))
+VAD_MIN_DBFS = float(os.getenv('VAD_MIN_DBFS', -50))
+# Frames at least this loud always count as speech, however high the noise floor
+VAD_SPEECH_DBFS = float(os.getenv('VAD_SPEECH_DBFS', -30))
+# Pauses at least this long are split points
+VAD_MIN_SILENCE_MS = int(os.getenv('VAD_MIN_SILENCE_MS', 700))
+
+
+def frame_energy(samples, sample_rate=TARGET_SAMPLE_RATE, frame_ms=VAD_FRAME_MS):
+    """RMS energy in dBFS for each frame of an int16 sample array"""
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    frame_count = -(-len(samples) // frame_length)
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    padded = np.zeros(frame_count * frame_length, dtype=np.float32)
+    padded[:len(samples)] = samples
+    frames = padded.reshape(frame_count, frame_length) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def speech_mask(samples, sample_rate=TARGET_SAMPLE_RATE, frame_ms=VAD_FRAME_MS, energy=None):
+    """Boolean speech/non-speech flag per frame using an adaptive noise-floor threshold
+
+    Audio without VAD_MARGIN_DB of dynamic range (no pauses to measure the
+    noise floor from) is judged against VAD_MIN_DBFS alone. Pass precomputed ``energy`` (e.g. accumulated while audio streamed in) to
+    skip the energy pass.
+    """
+    if energy is None:
+        energy = frame_energy(samples, sample_rate, frame_ms)
+    if len(energy) == 0:
+        return energy.astype(bool)
+    noise_floor = np.percentile(energy, 10)
+    if energy.max() - noise_floor < VAD_MARGIN_DB:
+        return energy > VAD_MIN_DBFS
+    threshold = min(max(noise_floor + VAD_MARGIN_DB, VAD_MIN_DBFS), VAD_SPEECH_DBFS)
+    return energy > threshold
+
+
+def speech_segments(samples, sample_rate=TARGET_SAMPLE_RATE, min_silence_ms=VAD_MIN_SILENCE_MS,
+                    padding_ms=VAD_PADDING_MS, frame_ms=VAD_FRAME_MS, energy=None):
+    """(start, end) sample ranges of speech, split where pauses exceed ``min_silence_ms``"""
+    mask = speech_mask(samples, sample_rate, frame_ms, energy)
+    voiced = np.flatnonzero(mask)
+    if len(voiced) == 0:
+        return []
+    # Break wherever the gap between voiced frames is a long pause
+    gap_frames = max(1, min_silence_ms // frame_ms)
+    breaks = np.flatnonzero(np.diff(voiced) > gap_frames)
+    starts = np.concatenate(([voiced[0]], voiced[breaks + 1]))
+    ends = np.concatenate((voiced[breaks], [voiced[-1]])) + 1
+
+    frame_length = sample_rate * frame_ms // 1000
+    padding = sample_rate * padding_ms // 1000
+    segments = []
+    for start, end in zip(starts * frame_length, ends * frame_length):
+        start = max(0, int(start) - padding)
+        end = min(len(samples), int(end) + padding)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def trim_silence(samples, sample_rate=TARGET_SAMPLE_RATE, split=False, min_silence_ms=VAD_MIN_SILENCE_MS,
+                 energy=None):
+    """Drop leading/trailing silence (and long inner pauses when ``split``)
+
+    Returns ``(samples, report)`` where report gives the original, kept and
+    removed durations in milliseconds plus the kept segment count.
+    """
+    segments = speech_segments(samples, sample_rate, min_silence_ms, energy=energy)
+    if not segments:
+        trimmed = samples[:0]
+    elif split:
+        trimmed = np.concatenate([samples[start:end] for start, end in segments])
+    else:
+        trimmed = samples[segments[0][0]:segments[-1][1]]
+
+    original_ms = round(len(samples) * 1000 / sample_rate)
+    kept_ms = round(len(trimmed) * 1000 / sample_rate)
+    report = {
+        'original_ms': original_ms,
+        'kept_ms': kept_ms,
+        'removed_ms': original_ms - kept_ms,
+        'segments': len(segments),
+    }
+    return trimmed, report
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Test container sniffing and native-format pass-through to the recognizer"""
+
+import struct
+import sys
+sys.path.append('.')
+import numpy as np
+import speech_recognition as sr
+
+import services.speech_service as speech_module
+from services.audio_formats import native_duration, sniff_format
+from services.speech_service import SpeechService
+from services.transcript_cache import TranscriptCache
+
+
+def tone_audio(sample_rate=16000, seconds=1):
+    t = np.arange(sample_rate * seconds) / sample_rate
+    samples = (np.sin(2 * np.pi * 300 * t) * 8000).astype('<i2')
+    return sr.AudioData(samples.tobytes(), sample_rate, 2)
+
+
+def test_sniff_container_headers():
+    audio = tone_audio(22050)
+    assert sniff_format(audio.get_wav_data()) == {'format': 'wav', 'sample_rate': 22050, 'channels': 1}
+    assert sniff_format(audio.get_flac_data())['format'] == 'flac'
+    assert sniff_format(audio.get_flac_data())['sample_rate'] == 22050
+
+    opus_head = b'OpusHead' + bytes([1, 2]) + struct.pack('<HI', 312, 16000)
+    assert sniff_format(b'OggS' + bytes(24) + opus_head) == {'format': 'ogg_opus', 'sample_rate': 16000, 'channels': 2}
+    webm = b'\x1a\x45\xdf\xa3' + bytes(20) + b'webm' + bytes(10) + b'A_OPUS'
+    assert sniff_format(webm)['format'] == 'webm_opus'
+    assert sniff_format(webm)['sample_rate'] == 48000
+    assert sniff_format(b'ID3\x04' + bytes(20))['format'] == 'mp3'
+    assert sniff_format(b'not audio')['format'] is None
+
+
+def test_native_duration_without_decoding():
+    assert native_duration(tone_audio(22050, seconds=2).get_flac_data()) == 2.0
+    opus_head = b'OpusHead' + bytes([1, 1]) + struct.pack('<HI', 312, 48000)
+    last_page = b'OggS' + bytes(2) + struct.pack('<q', 312 + 48000 * 3)
+    assert native_duration(b'OggS' + bytes(24) + opus_head + bytes(100) + last_page + bytes(20)) == 3.0
+    webm = b'\x1a\x45\xdf\xa3' + bytes(20) + b'A_OPUS'
+    assert native_duration(webm + bytes(7500)) <= 10.1  # an upper bound from the size
+    assert native_duration(b'ID3\x04' + bytes(20)) is None
+
+
+def test_flac_skips_transcoding(monkeypatch):
+    service = SpeechService()
+    service.google_client = None
+    service.transcript_cache = TranscriptCache(cache_dir='')
+    flac = tone_audio().get_flac_data()
+    service.sr_recognizer.recognize_google = (
+        lambda audio_data: f"{audio_data.sample_rate}hz" if audio_data.get_flac_data() == flac else None)
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("FLAC should not be decoded before recognition")
+
+    monkeypatch.setattr(speech_module, 'decode_to_pcm', fail_decode)
+    stats = {}
+    assert service.speech_to_text(flac, stats=stats) == '16000hz'
+    assert stats == {'format': 'flac', 'backend': 'speechrecognition', 'transcoded': False}
+
+
+def test_long_native_audio_is_decoded_for_vad_and_chunking(monkeypatch):
+    service = SpeechService()
+    service.google_client = None
+    service.transcript_cache = TranscriptCache(cache_dir='')
+    seconds = int(speech_module.CHUNK_MAX_SECONDS) + 5
+    long_flac = tone_audio(seconds=seconds).get_flac_data()
+    sent = []
+    service.sr_recognizer.recognize_google = lambda audio_data: sent.append(audio_data) or 'part'
+    decoded = tone_audio(seconds=seconds).frame_data
+    monkeypatch.setattr(speech_module, 'decode_to_pcm', lambda *args, **kwargs: np.frombuffer(decoded, dtype='<i2'))
+    stats = {}
+    assert service.speech_to_text(long_flac, stats=stats)
+    assert stats['transcoded'] and len(sent) >= 2  # recognized in chunks, not as one upload
+
+
+if __name__ == "__main__":
+    test_sniff_container_headers()
+    test_native_duration_without_decoding()
+    print("🏁 Audio format tests PASSED")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Test in-memory audio buffering, decoding and resampling"""
+
+import io
+import sys
+import wave
+sys.path.append('.')
+import numpy as np
+
+from services.audio_processing import AudioBuffer, StreamResampler, decode_to_pcm, read_audio_bytes
+
+
+def make_wav(seconds=1.0, sample_rate=48000, channels=2, frequency=440):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = (np.sin(2 * np.pi * frequency * t) * 12000).astype('<i2')
+    frames = np.repeat(tone[:, None], channels, axis=1).tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def test_audio_buffer_spills_above_threshold():
+    data = b'x' * 1024
+    with AudioBuffer(max_memory_bytes=4096) as small:
+        small.write(data)
+        assert not small.spilled
+        assert read_audio_bytes(small) == data
+    with AudioBuffer(max_memory_bytes=512) as large:
+        large.write(data)
+        assert large.spilled
+        assert large.getvalue() == data
+
+
+def test_wav_decoded_to_16k_mono():
+    samples = decode_to_pcm(make_wav(seconds=0.5))
+    assert samples.dtype == np.int16
+    assert len(samples) == 8000
+    assert 10000 < np.abs(samples).max() <= 12001
+
+
+def test_spilled_audio_is_mapped_not_read():
+    wav = make_wav(seconds=0.5)
+    with AudioBuffer(max_memory_bytes=1024) as buffer:
+        buffer.write(wav)
+        assert buffer.spilled
+        view = read_audio_bytes(buffer)
+        assert not isinstance(view, bytes) and len(view) == len(wav)
+        assert view[:4] == b'RIFF'
+        samples = decode_to_pcm(view)
+        assert np.array_equal(samples, decode_to_pcm(wav))
+        assert len(samples) == 8000
+    assert buffer.mapping is None
+
+
+def test_block_resampling_matches_whole_stream():
+    t = np.arange(44100) / 44100
+    tone = (np.sin(2 * np.pi * 440 * t) * 12000).astype(np.int16)
+    whole = StreamResampler(44100, 16000).feed(tone)
+    blocks = StreamResampler(44100, 16000)
+    pieces = [blocks.feed(tone[i:i + 1001]) for i in range(0, len(tone), 1001)]
+    streamed = np.concatenate(pieces)
+    assert len(streamed) == len(whole)
+    assert np.abs(streamed.astype(np.int32) - whole).max() <= 1  # rounding only
+    assert abs(len(whole) - 16000) <= 1
+
+
+if __name__ == "__main__":
+    test_audio_buffer_spills_above_threshold()
+    test_wav_decoded_to_16k_mono()
+    test_spilled_audio_is_mapped_not_read()
+    test_block_resampling_matches_whole_stream()
+    print("🏁 Audio processing tests PASSED")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test splitting long recordings into overlapping chunks and stitching transcripts"""
+
+import sys
+import threading
+import time
+sys.path.append('.')
+import numpy as np
+
+from services.chunked_transcription import plan_chunks, stitch_transcripts, transcribe_chunked
+
+RATE = 16000
+
+
+def speech_with_pauses(blocks=6, speech_seconds=8, pause_seconds=1):
+    t = np.arange(speech_seconds * RATE) / RATE
+    speech = (np.sin(2 * np.pi * 250 * t) * 8000).astype(np.int16)
+    pause = np.zeros(pause_seconds * RATE, dtype=np.int16)
+    return np.concatenate([np.concatenate([speech, pause]) for _ in range(blocks)])
+
+
+def test_chunks_cut_at_pauses_with_overlap():
+    samples = speech_with_pauses()
+    chunks = plan_chunks(samples, RATE, max_seconds=20, overlap_ms=500)
+    assert len(chunks) == 3
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(samples)
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end - start == RATE  # 500 ms either side of the cut
+    # Cuts land in the silent gaps, never mid-speech
+    for _, end in chunks[:-1]:
+        cut = end - RATE // 2
+        assert (cut % (9 * RATE)) >= 8 * RATE
+
+
+def test_hard_cut_without_pauses():
+    samples = np.full(50 * RATE, 8000, dtype=np.int16)
+    chunks = plan_chunks(samples, RATE, max_seconds=20, overlap_ms=0)
+    assert chunks == [(0, 20 * RATE), (20 * RATE, 40 * RATE), (40 * RATE, 50 * RATE)]
+
+
+def test_stitch_removes_overlap_duplicates():
+    parts = ['draw a red barn', 'Barn next to a lake,', '', 'a lake, at sunset']
+    assert stitch_transcripts(parts) == 'draw a red barn next to a lake, at sunset'
+
+
+def test_chunks_transcribed_concurrently_in_order():
+    samples = speech_with_pauses()
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def transcribe(chunk):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.1)
+        with lock:
+            active.pop()
+        return f"part{len(chunk) // RATE}"
+
+    text = transcribe_chunked(samples, transcribe, RATE, max_seconds=20)
+    assert max(peak) > 1
+    assert len(text.split()) == 3
+
+
+if __name__ == "__main__":
+    test_chunks_cut_at_pauses_with_overlap()
+    test_hard_cut_without_pauses()
+    test_stitch_removes_overlap_duplicates()
+    test_chunks_transcribed_concurrently_in_order()
+    print("🏁 Chunked transcription tests PASSED")
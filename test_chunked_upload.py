@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Test chunked, resumable uploads with incremental decoding"""
+
+import hashlib
+import sys
+import time
+sys.path.append('.')
+import numpy as np
+
+from services.audio_processing import FfmpegTranscoder, decode_to_pcm
+from services.chunked_upload import UploadError, UploadStore
+from services.voice_activity import frame_energy
+from test_audio_processing import make_wav
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_resumable_chunks_decode_incrementally():
+    wav = make_wav(seconds=1.5, sample_rate=48000, channels=2)
+    chunks = split(wav, 7001)  # odd size so frames straddle chunk boundaries
+    store = UploadStore()
+    upload = store.create('clip.wav')
+
+    for index, chunk in enumerate(chunks[:3]):
+        upload.append(index, chunk)
+    # A retried chunk is acknowledged again without being stored twice
+    assert upload.append(1, chunks[1])['next_index'] == 3
+    try:
+        upload.append(5, chunks[5])
+        assert False, "out-of-order chunk accepted"
+    except UploadError as e:
+        assert e.status == 409
+    try:
+        upload.append(3, chunks[3], checksum=hashlib.sha256(b'other').hexdigest())
+        assert False, "corrupt chunk accepted"
+    except UploadError as e:
+        assert e.status == 400
+
+    # Resume from the acknowledged position
+    resumed = store.get(upload.upload_id)
+    for index in range(resumed.status()['next_index'], len(chunks)):
+        resumed.append(index, chunks[index], checksum=hashlib.sha256(chunks[index]).hexdigest())
+    assert resumed.status()['received_bytes'] == len(wav)
+    assert resumed.status()['decoded_ms'] > 1400
+
+    samples, energy = resumed.finish_decode()
+    assert resumed.buffer.getvalue() == wav
+    expected = decode_to_pcm(wav)
+    assert abs(len(samples) - len(expected)) <= len(chunks)
+    assert len(energy) == len(frame_energy(samples))
+    assert store.discard(upload.upload_id)
+    assert store.get(upload.upload_id) is None
+
+
+def test_stalled_uploads_give_back_their_decoder():
+    class StreamDecoder:
+        aborted = False
+
+        def abort(self):
+            self.aborted = True
+
+    store = UploadStore(decode_idle_seconds=5)
+    stalled, active = store.create('a.webm'), store.create('b.webm')
+    stalled.decoder, active.decoder = StreamDecoder(), StreamDecoder()
+    decoder = stalled.decoder
+    stalled.updated = time.time() - 10
+    store._expire()
+    assert decoder.aborted and stalled.decoder is None and stalled.decode_failed
+    assert active.decoder is not None  # still receiving chunks
+    assert store.reaper.is_alive()
+    store.discard(stalled.upload_id)
+    store.discard(active.upload_id)
+
+
+def test_open_uploads_are_capped():
+    store = UploadStore(max_active=2)
+    uploads = [store.create('a.wav'), store.create('b.wav')]
+    try:
+        store.create('c.wav')
+        assert False, "upload opened past the limit"
+    except UploadError as e:
+        assert e.status == 503
+    store.discard(uploads[0].upload_id)
+    uploads[0] = store.create('c.wav')
+    for upload in uploads:
+        store.discard(upload.upload_id)
+
+
+def test_transcoder_keeps_a_slot_for_one_shot_decodes():
+    transcoder = FfmpegTranscoder(max_processes=2, slot_timeout=0.05)
+    transcoder.ffmpeg = 'ffmpeg'
+    transcoder.streams = 1
+    assert transcoder.open_stream() is None
+
+    transcoder.slots.acquire()
+    transcoder.slots.acquire()
+    start = time.monotonic()
+    try:
+        transcoder.to_pcm(b'audio')
+        assert False, "decode started without a slot"
+    except RuntimeError as e:
+        assert 'busy' in str(e)
+    assert time.monotonic() - start < 1
+
+
+if __name__ == "__main__":
+    test_resumable_chunks_decode_incrementally()
+    test_stalled_uploads_give_back_their_decoder()
+    test_open_uploads_are_capped()
+    test_transcoder_keeps_a_slot_for_one_shot_decodes()
+    print("🏁 Chunked upload tests PASSED")
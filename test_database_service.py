@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""Test DatabaseService behaviour against an in-memory stand-in collection"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+sys.path.append('.')
+from bson import ObjectId
+from collections import OrderedDict
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+
+from services.database_service import DatabaseService
+from services.facet_index import FacetIndex
+from services.image_store import FilesystemImageStore
+from services.image_utils import encode_data_uri
+from services.session_archive import SessionArchive
+from services.session_cache import SessionCache
+from services.session_writer import WriteBehindWriter
+from services.storage_backends import HEAVY_FIELDS_PROJECTION
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.sort_spec = None
+        self.limit_count = None
+
+    def sort(self, key, direction=None):
+        self.sort_spec = key if direction is None else [(key, direction)]
+        if direction is not None:
+            self.documents.sort(key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def batch_size(self, count):
+        self.batch_count = count
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def __iter__(self):
+        return iter(self.documents[:self.limit_count])
+
+
+def in_range(value, condition):
+    if '$gte' in condition and not value >= condition['$gte']:
+        return False
+    return '$lt' not in condition or value < condition['$lt']
+
+
+class FakeCollection:
+    """Just enough of pymongo's Collection for these tests"""
+
+    name = 'sessions'
+
+    def __init__(self, delay=0.0):
+        self.documents = {}
+        self.batches = []
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.queries = []
+        self.text_index = True
+        self.down = False
+
+    def create_index(self, keys, name=None, **options):
+        self.indexes[name] = (keys, options)
+        return name
+
+    def index_information(self):
+        return {name: {'key': keys} for name, (keys, _) in self.indexes.items()}
+
+    def drop_index(self, name):
+        del self.indexes[name]
+
+    def find(self, query=None, projection=None):
+        query = query or {}
+        if '$text' in query and not self.text_index:
+            raise OperationFailure("text index required for $text query", code=27)
+        # Only range filters are evaluated; other operators return everything
+        ranges = [(key, value) for key, value in query.items() if isinstance(value, dict)]
+        cursor = FakeCursor([dict(document) for document in self.documents.values()
+                             if all(in_range(document.get(key), value) for key, value in ranges)])
+        self.queries.append((query, projection, cursor))
+        return cursor
+
+    def insert_one(self, document):
+        if self.down:
+            raise ServerSelectionTimeoutError("localhost:27017: connection refused")
+        time.sleep(self.delay)
+        document.setdefault('_id', ObjectId())
+        self.documents[document['_id']] = document
+
+        class Result:
+            inserted_id = document['_id']
+        return Result()
+
+    def insert_many(self, documents, ordered=True):
+        if self.down:
+            raise ServerSelectionTimeoutError("localhost:27017: connection refused")
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append(len(documents))
+            for document in documents:
+                self.documents[document['_id']] = document
+
+    def find_one(self, query, projection=None):
+        if '_id' in query:
+            return self.documents.get(query['_id'])
+        for document in self.documents.values():
+            if all(value == document.get(key) or value in (document.get(key) or [])
+                   for key, value in query.items()):
+                return document
+        return None
+
+    def delete_many(self, query):
+        for document_id in query['_id']['$in']:
+            self.documents.pop(document_id, None)
+
+    def estimated_document_count(self):
+        self.estimated_counts = getattr(self, 'estimated_counts', 0) + 1
+        return len(self.documents)
+
+    def update_one(self, query, update, upsert=False):
+        document = self.documents.get(query['_id'])
+        if document is None and upsert:
+            document = self.documents[query['_id']] = {'_id': query['_id']}
+        for field, amount in update.get('$inc', {}).items():
+            document[field] = document.get(field, 0) + amount
+        for field, value in update.get('$min', {}).items():
+            document[field] = min(document.get(field, value), value)
+        for field, value in update.get('$max', {}).items():
+            document[field] = max(document.get(field, value), value)
+        document.update(update.get('$set', {}))
+        for field in update.get('$unset', {}):
+            document.pop(field, None)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.update_one(query, update, upsert)
+        return self.documents.get(query['_id'])
+
+    def delete_one(self, query):
+        class Result:
+            deleted_count = int(self.documents.pop(query['_id'], None) is not None)
+        return Result()
+
+
+def make_service(collection):
+    service = DatabaseService.__new__(DatabaseService)
+    service.client = None
+    service.db = types.SimpleNamespace(name='echosketch')
+    service.collection = collection
+    service.connected = True
+    service.writer = None
+    service.images = None
+    service.counters = FakeCollection()
+    service.stats_cache = None
+    service.stats_lock = threading.Lock()
+    service.replay_buffer = OrderedDict()
+    service.replay_lock = threading.Lock()
+    service.released_blobs = {}
+    service.release_lock = threading.Lock()
+    service.stopping = threading.Event()
+    service.session_cache = SessionCache(max_bytes=0)
+    service.archive = None
+    service.facets = FacetIndex()
+    return service
+
+
+def test_write_behind_batches_and_flushes_on_close():
+    collection = FakeCollection(delay=0.05)
+    service = make_service(collection)
+    service.writer = WriteBehindWriter(lambda: collection, batch_size=10, flush_interval=0.05)
+
+    start = time.perf_counter()
+    ids = [service.save_session({'transcript': f'session {i}'}) for i in range(25)]
+    assert time.perf_counter() - start < 0.05  # no database round trip per request
+    assert len(set(ids)) == 25 and all(ObjectId.is_valid(i) for i in ids)
+
+    # Queued sessions are readable before they reach the database
+    assert service.get_session(ids[-1])['transcript'] == 'session 24'
+
+    service.close_connection()
+    assert len(collection.documents) == 25
+    assert max(collection.batches) > 1
+    assert service.writer.stats()['pending'] == 0
+
+
+def test_ensure_indexes_creates_text_and_concept_indexes():
+    collection = FakeCollection()
+    make_service(collection).ensure_indexes()
+
+    keys, options = collection.indexes['session_text']
+    assert [field for field, kind in keys] == ['transcript', 'visual_concepts.keywords', 'enhanced_prompt']
+    assert options['weights']['transcript'] > options['weights']['enhanced_prompt']
+    assert collection.indexes['timestamp_id_desc'][0] == [('timestamp', -1), ('_id', -1)]
+    assert {'keywords_timestamp', 'objects_timestamp', 'colors_timestamp'} <= set(collection.indexes)
+
+
+def test_search_uses_text_index_ranked_by_score_without_image_bytes():
+    collection = FakeCollection()
+    collection.insert_one({'transcript': 'a red balloon'})
+    service = make_service(collection)
+
+    results = service.search_sessions('balloon', limit=5)
+    query, projection, cursor = collection.queries[-1]
+    assert query == {'$text': {'$search': 'balloon'}}
+    assert projection['score'] == {'$meta': 'textScore'}
+    assert projection['image_data.image_data'] == 0
+    assert cursor.sort_spec[0] == ('score', {'$meta': 'textScore'})
+    assert cursor.limit_count == 5
+    assert isinstance(results[0]['_id'], str)
+
+    # Without the text index the search degrades to an escaped regex scan
+    collection.text_index = False
+    service.search_sessions('red (balloon')
+    query, projection, cursor = collection.queries[-1]
+    assert query['$or'][0]['transcript']['$regex'] == r'red\ \(balloon'
+    assert 'score' not in projection
+
+
+def test_images_stored_outside_session_documents():
+    collection = FakeCollection()
+    service = make_service(collection)
+    service.images = FilesystemImageStore(tempfile.mkdtemp())
+    png = b'\x89PNG' + bytes(range(256)) * 64
+    uri = encode_data_uri('image/png', png)
+    image_data = {'image_data': uri, 'service': 'test',
+                  'variations': [{'image_data': uri, 'seed': 1}, {'image_data': encode_data_uri('image/png', b'other'), 'seed': 2}]}
+
+    first = service.save_session({'transcript': 'one', 'image_data': image_data})
+    second = service.save_session({'transcript': 'two', 'image_data': dict(image_data, variations=[])})
+    assert image_data['image_data'] == uri  # the caller's response payload is untouched
+
+    stored = collection.documents[ObjectId(first)]
+    assert stored['image_data']['image_data'] is None
+    assert stored['image_data']['image_ref']['size'] == len(png)
+    assert len(stored['image_blobs']) == 2  # identical images share one blob
+
+    assert service.get_session(first)['image_data']['variations'][1]['image_data'] == encode_data_uri('image/png', b'other')
+    assert service.get_image(first) == ('image/png', png)
+    assert service.get_image(first, 1) == ('image/png', b'other')
+
+    # A blob is only deleted once no session references it
+    shared = stored['image_data']['image_ref']['blob_id']
+    assert service.delete_session(first)
+    service.sweep_images(grace_seconds=0)
+    assert service.images.get(shared) == png
+    assert service.delete_session(second)
+    assert service.images.get(shared) == png  # deleted by the sweep, not inline
+    service.sweep_images(grace_seconds=0)
+    assert service.images.get(shared) is None
+
+
+def test_queued_and_buffered_saves_leave_images_to_the_background():
+    class CountingStore(FilesystemImageStore):
+        puts = 0
+
+        def put(self, content, mimetype=None):
+            self.puts += 1
+            return super().put(content, mimetype)
+
+    uri = encode_data_uri('image/png', b'\x89PNG queued')
+    collection = FakeCollection()
+    service = make_service(collection)
+    service.images = CountingStore(tempfile.mkdtemp())
+    service.writer = WriteBehindWriter(lambda: collection, batch_size=10, flush_interval=1,
+                                       prepare=service._externalize_images)
+    queued = service.save_session({'transcript': 'queued', 'image_data': {'image_data': uri}})
+    assert service.images.puts == 0 and not collection.batches
+    service.writer.close()
+    assert service.images.puts == 1
+    assert collection.documents[ObjectId(queued)]['image_data']['image_ref']
+
+    service.writer = None
+    service.connected = False
+    buffered = service.save_session({'transcript': 'buffered', 'image_data': {'image_data': uri}})
+    assert service.images.puts == 1 and ObjectId(buffered) not in collection.documents
+    service.connected = True
+    service._replay()
+    assert service.images.puts == 2
+    assert collection.documents[ObjectId(buffered)]['image_data']['image_ref']
+
+
+def test_released_blobs_survive_concurrent_saves():
+    collection = FakeCollection()
+    service = make_service(collection)
+    service.images = FilesystemImageStore(tempfile.mkdtemp())
+    uri = encode_data_uri('image/png', b'\x89PNG shared')
+    first = service.save_session({'transcript': 'one', 'image_data': {'image_data': uri}})
+    blob_id = collection.documents[ObjectId(first)]['image_blobs'][0]
+    assert service.delete_session(first)
+
+    # A save queued behind the writer still holds the blob
+    service.writer = types.SimpleNamespace(lock=threading.Lock(), pending={})
+    service.writer.pending['queued'] = {'_id': 'queued', 'image_blobs': [blob_id]}
+    assert service.sweep_images(grace_seconds=0) == 0 and service.images.get(blob_id)
+    service.writer = None
+
+    # So does a save that just reused it but has not inserted its session yet
+    service._release_images([blob_id])
+    service.released_blobs[blob_id] -= 120
+    service.images.put(b'\x89PNG shared')
+    assert service.sweep_images(grace_seconds=60) == 0 and service.images.get(blob_id)
+    assert blob_id in service.released_blobs
+    os.utime(service.images._path(blob_id), (time.time() - 120, time.time() - 120))
+    assert service.sweep_images(grace_seconds=60) == 1 and service.images.get(blob_id) is None
+
+
+def test_sessions_page_seeks_on_timestamp_and_id():
+    collection = FakeCollection()
+    for i in range(3):
+        collection.insert_one({'transcript': f'session {i}', 'timestamp': datetime(2024, 1, 1, 12, i)})
+    service = make_service(collection)
+
+    page, cursor = service.get_sessions_page(limit=2)
+    query, projection, fake_cursor = collection.queries[-1]
+    assert query == {} and projection['image_data.image_data'] == 0
+    assert fake_cursor.sort_spec == [('timestamp', -1), ('_id', -1)]
+    assert fake_cursor.limit_count == 3 and len(page) == 2 and cursor
+
+    service.get_sessions_page(limit=2, cursor=cursor)
+    query = collection.queries[-1][0]
+    last = page[-1]
+    assert query['$or'][0] == {'timestamp': {'$lt': last['timestamp']}}
+    assert query['$or'][1] == {'timestamp': last['timestamp'], '_id': {'$lt': ObjectId(last['_id'])}}
+
+    try:
+        service.get_sessions_page(cursor='bogus')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_statistics_use_counters_and_cache():
+    collection = FakeCollection()
+    service = make_service(collection)
+    # Sessions written before counters existed are picked up from the timestamp index once
+    collection.insert_one({'transcript': 'legacy', 'timestamp': datetime(2023, 6, 1)})
+    ids = [service.save_session({'transcript': f'session {i}', 'timestamp': datetime(2024, 1, 1 + i)})
+           for i in range(3)]
+
+    stats = service.get_statistics()
+    assert stats['total_sessions'] == 4
+    assert stats['oldest_session'] == datetime(2023, 6, 1)
+    assert stats['newest_session'] == datetime(2024, 1, 3)
+    assert service.counters.documents['sessions']['inserted'] == 3
+
+    # Polling within the TTL does not touch the database
+    queries = len(collection.queries)
+    service.get_statistics()
+    assert collection.estimated_counts == 1 and len(collection.queries) == queries
+
+    # Deleting the newest session invalidates the cache and the stored bounds
+    assert service.delete_session(ids[-1])
+    stats = service.get_statistics()
+    assert stats['total_sessions'] == 3 and stats['newest_session'] == datetime(2024, 1, 2)
+    assert not service.counters.documents['sessions']['bounds_stale']
+
+
+def test_startup_does_not_block_on_unreachable_mongo():
+    start = time.perf_counter()
+    service = DatabaseService('mongodb://127.0.0.1:1/echosketch')
+    assert time.perf_counter() - start < 0.5
+    assert not service.connected and service.monitor.is_alive()
+    # Reads fail fast while disconnected instead of waiting for server selection
+    assert service.get_sessions_page() == ([], None)
+    service.close_connection()
+
+    # One-off tools (exports) get the client without any maintenance threads
+    tool = DatabaseService('mongodb://127.0.0.1:1/echosketch', background=False)
+    assert tool.monitor is None and tool.writer is None and tool.collection is not None
+    tool.close_connection()
+
+
+def test_writes_buffered_while_down_are_replayed():
+    collection = FakeCollection()
+    collection.down = True
+    service = make_service(collection)
+
+    # The insert fails, so the session is buffered and the service marks itself disconnected
+    first = service.save_session({'transcript': 'during outage'})
+    assert ObjectId.is_valid(first) and not service.connected
+    second = service.save_session({'transcript': 'still down'})
+    assert service.get_session(second)['transcript'] == 'still down'
+    assert service.get_statistics()['buffered_writes'] == 2
+
+    collection.down = False
+    service.connected = True
+    service._replay()
+    assert set(collection.documents) == {ObjectId(first), ObjectId(second)}
+    assert not service.replay_buffer
+    assert service.counters.documents['sessions']['inserted'] == 2
+
+
+def test_full_write_behind_queue_never_drops_a_session():
+    collection = FakeCollection()
+    collection.down = True
+    service = make_service(collection)
+    service.writer = WriteBehindWriter(lambda: collection, batch_size=1, flush_interval=0.01, max_queue=1,
+                                       submit_timeout=0.05)
+    # One batch stuck retrying in the flusher, one queued, then the queue is full and MongoDB is down
+    ids = [service.save_session({'transcript': f'queued {i}'}) for i in range(2)]
+    time.sleep(0.05)
+    ids += [service.save_session({'transcript': f'overflow {i}'}) for i in range(3)]
+    assert all(ObjectId.is_valid(session_id) for session_id in ids)
+    assert len(service.replay_buffer) >= 1  # rejected by the writer, held for replay instead
+
+    collection.down = False
+    service._replay()
+    service.writer.close()
+    assert set(collection.documents) == {ObjectId(session_id) for session_id in ids}
+
+
+def test_session_cache_serves_reads_and_is_invalidated():
+    collection = FakeCollection()
+    service = make_service(collection)
+    service.session_cache = SessionCache(max_bytes=1024 * 1024)
+    service.images = FilesystemImageStore(tempfile.mkdtemp())
+    uri = encode_data_uri('image/png', b'\x89PNG' + b'\x01' * 2048)
+
+    session_id = service.save_session({'transcript': 'cached', 'image_data': {'image_data': uri}})
+    collection.find_one = None  # any database read would now fail
+    assert service.get_session(session_id)['image_data']['image_data'] == uri
+    assert service.get_session(session_id, include_images=False)['image_data']['image_data'] is None
+    assert service.session_cache.stats()['hit_rate'] == 1.0
+
+    # Writes drop the cached copies so the next read sees the change
+    del collection.find_one
+    collection.update_one = lambda query, update: collection.documents[query['_id']].update(update['$set']) or \
+        types.SimpleNamespace(modified_count=1)
+    assert service.update_session(session_id, {'transcript': 'edited'})
+    assert service.get_session(session_id)['transcript'] == 'edited'
+    assert service.delete_session(session_id)
+    assert service.get_session(session_id) is None
+
+
+def test_session_cache_is_bounded_by_bytes():
+    cache = SessionCache(max_bytes=3000)
+    cache.put('small', {'transcript': 'x' * 500})
+    cache.put('big', {'transcript': 'y' * 1900})
+    assert cache.get('small') and cache.get('big')
+    cache.put('huge', {'transcript': 'z' * 5000})  # larger than the whole cache: not stored
+    cache.put('medium', {'transcript': 'w' * 1000})
+    assert cache.get('huge') is None and cache.get('small') is None  # least recently used went first
+    stats = cache.stats()
+    assert stats['bytes'] <= 3000 and stats['evictions'] == 1 and stats['entries'] == 2
+
+    # Entries expire, so changes made by other workers show up
+    aging = SessionCache(max_bytes=3000, max_age=0.05)
+    aging.put('session', {'transcript': 'old'})
+    assert aging.get('session')['transcript'] == 'old'
+    time.sleep(0.06)
+    assert aging.get('session') is None and aging.stats()['bytes'] == 0
+
+
+def test_old_sessions_move_to_archive_and_stay_readable():
+    collection = FakeCollection()
+    service = make_service(collection)
+    service.images = FilesystemImageStore(tempfile.mkdtemp())
+    service.archive = SessionArchive(tempfile.mkdtemp(), compression='gzip')
+    uri = encode_data_uri('image/png', b'\x89PNG old')
+    now = service.get_current_timestamp()
+
+    old = [service.save_session({'transcript': f'old {i}', 'timestamp': now - timedelta(days=40 + i),
+                                 'image_data': {'image_data': uri}}) for i in range(3)]
+    recent = service.save_session({'transcript': 'recent', 'timestamp': now - timedelta(days=1)})
+
+    assert service.archive_sessions(older_than_days=30, batch_size=2) == 3
+    assert set(collection.documents) == {ObjectId(recent)}
+    service.sweep_images(grace_seconds=0)
+    assert not [f for _, _, files in os.walk(service.images.root) for f in files]  # blobs inlined, then released
+
+    archived = service.get_session(old[1])
+    assert archived['transcript'] == 'old 1' and archived['image_data']['image_data'] == uri
+    assert service.get_image(old[2]) == ('image/png', b'\x89PNG old')
+    assert 'index.tsv' in os.listdir(service.archive.directory)
+    assert service.archive_sessions(older_than_days=30) == 0
+
+
+def test_expired_sessions_release_images_and_leave_indexes():
+    collection = FakeCollection()
+    collection.create_index([('timestamp', 1)], name='timestamp_ttl', expireAfterSeconds=86400)
+    service = make_service(collection)
+    service.images = FilesystemImageStore(tempfile.mkdtemp())
+    service.session_cache = SessionCache(max_bytes=1 << 20)
+    now = service.get_current_timestamp()
+    old = service.save_session({'transcript': 'old', 'timestamp': now - timedelta(days=100),
+                                'image_data': {'image_data': encode_data_uri('image/png', b'\x89PNG expired')},
+                                'visual_concepts': {'objects': ['kite']}})
+    recent = service.save_session({'transcript': 'recent', 'visual_concepts': {'objects': ['kite']}})
+    assert service.get_session(old)['transcript'] == 'old'  # now cached
+
+    service.ensure_indexes()
+    assert 'timestamp_ttl' not in collection.indexes  # the TTL index skipped all of the below
+    assert service.expire_sessions(older_than_days=90) == 1
+    assert set(collection.documents) == {ObjectId(recent)}
+    assert service.get_session(old) is None
+    assert service.facet_search({'objects': ['kite']})['session_ids'] == [recent]
+    assert service.counters.documents['sessions']['bounds_stale']
+    service.sweep_images(grace_seconds=0)
+    assert not [f for _, _, files in os.walk(service.images.root) for f in files]
+
+
+def test_export_streams_a_date_range_without_image_bytes():
+    collection = FakeCollection()
+    service = make_service(collection)
+    start = datetime(2024, 1, 1)
+    for day in range(5):
+        service.save_session({'transcript': f'day {day}', 'timestamp': start + timedelta(days=day),
+                              'image_data': {'image_data': 'data:image/png;base64,AAAA', 'service': 'local'}})
+
+    sessions = list(service.iter_sessions(since=start + timedelta(days=1), until=start + timedelta(days=4),
+                                          batch_size=2))
+    assert [session['transcript'] for session in sessions] == ['day 1', 'day 2', 'day 3']
+    assert sessions[0]['image_data'] == {'service': 'local'} and isinstance(sessions[0]['_id'], str)
+    query, projection, cursor = collection.queries[-1]
+    assert projection == HEAVY_FIELDS_PROJECTION and cursor.batch_count == 2 and cursor.closed
+
+    sessions = list(service.iter_sessions(fields=['transcript'], include_images=True))
+    assert len(sessions) == 5 and set(sessions[0]) == {'_id', 'transcript'}
+    assert collection.queries[-1][1] == {'transcript': 1}
+
+
+def test_facets_follow_saves_and_rebuild_from_mongo():
+    collection = FakeCollection()
+    service = make_service(collection)
+
+    def concepts(objects, colors, time_of_day):
+        # Shape stored by app.py: the NLP service's nested analysis
+        return {'visual_elements': {'objects': objects, 'colors': colors, 'weather': [], 'time': [time_of_day]},
+                'attributes': {'mood': 'calm', 'style': 'realistic'}}
+
+    moon = service.save_session({'transcript': 'a blue moon', 'visual_concepts': concepts(['moon'], ['blue'], 'night')})
+    service.save_session({'transcript': 'a red moon', 'visual_concepts': concepts(['moon'], ['red'], 'night')})
+    service.save_session({'transcript': 'blue sea', 'visual_concepts': concepts(['sea'], ['blue'], 'morning')})
+
+    result = service.facet_search({'objects': ['moon'], 'colors': ['blue'], 'settings': ['night']})
+    assert result['session_ids'] == [moon] and result['total'] == 1
+    assert service.facet_search({'objects': ['Moon']})['facets']['colors'] == {'blue': 1, 'red': 1}
+
+    assert service.delete_session(moon)
+    assert service.facet_search({'colors': ['blue']})['total'] == 1
+
+    # A fresh service builds the index from the collection
+    rebuilt = make_service(collection)
+    rebuilt.load_facets()
+    assert rebuilt.facet_search({})['facets'] == service.facet_search({})['facets']
+    assert collection.queries[-1][1] == {'visual_concepts': 1}
+
+
+def test_forked_worker_gets_its_own_client_and_monitor():
+    # gunicorn --preload: the service is built before the workers are forked
+    service = DatabaseService('mongodb://127.0.0.1:1/echosketch')
+    parent_client = service.client
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = (service.monitor.is_alive() and service.client is not parent_client
+              and service.collection.database.client is service.client)
+        os.write(write_fd, b'1' if ok else b'0')
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 1)
+    os.waitpid(pid, 0)
+    service.close_connection()
+    assert result == b'1'
+
+
+if __name__ == "__main__":
+    test_write_behind_batches_and_flushes_on_close()
+    test_ensure_indexes_creates_text_and_concept_indexes()
+    test_search_uses_text_index_ranked_by_score_without_image_bytes()
+    test_images_stored_outside_session_documents()
+    test_queued_and_buffered_saves_leave_images_to_the_background()
+    test_released_blobs_survive_concurrent_saves()
+    test_sessions_page_seeks_on_timestamp_and_id()
+    test_statistics_use_counters_and_cache()
+    test_startup_does_not_block_on_unreachable_mongo()
+    test_writes_buffered_while_down_are_replayed()
+    test_full_write_behind_queue_never_drops_a_session()
+    test_session_cache_serves_reads_and_is_invalidated()
+    test_session_cache_is_bounded_by_bytes()
+    test_old_sessions_move_to_archive_and_stay_readable()
+    test_expired_sessions_release_images_and_leave_indexes()
+    test_export_streams_a_date_range_without_image_bytes()
+    test_facets_follow_saves_and_rebuild_from_mongo()
+    test_forked_worker_gets_its_own_client_and_monitor()
+    print("🏁 Database service tests PASSED")
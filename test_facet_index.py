@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Test the roaring-bitmap concept facet index"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.append('.')
+
+from werkzeug.datastructures import MultiDict
+
+from app_minimal import app
+from services.facet_index import ARRAY_LIMIT, FacetIndex, RoaringBitmap, parse_facet_filters
+from services.sqlite_store import SQLiteBackend
+
+
+def test_bitmap_matches_set_semantics():
+    rng = random.Random(7)
+    for size in (10, ARRAY_LIMIT + 500, 20000):
+        a = set(rng.sample(range(200000), size))
+        b = set(rng.sample(range(200000), size // 2)) | set(range(70000, 75000))  # one dense container
+        A, B = RoaringBitmap(a), RoaringBitmap(b)
+        assert list(A) == sorted(a) and len(A) == len(a)
+        assert list(A & B) == sorted(a & b) and len(A & B) == len(a & b) == A.intersection_len(B)
+        assert list(B.iter_descending()) == sorted(b, reverse=True)
+
+        # Removing values turns bitset containers back into arrays
+        for value in rng.sample(sorted(b), len(b) * 9 // 10):
+            B.discard(value)
+            b.discard(value)
+        assert list(B) == sorted(b) and len(B) == len(b) and all(value in B for value in list(b)[:100])
+
+        bulk = RoaringBitmap()
+        bulk.update(sorted(a))
+        assert list(bulk) == sorted(a) and len(bulk) == len(a)
+
+
+def concepts(objects, colors, settings, mood='calm', style='sketch'):
+    return {'visual_concepts': {'objects': objects, 'colors': colors, 'settings': settings, 'mood': mood, 'style': style}}
+
+
+def test_query_intersects_facets_and_counts_values():
+    index = FacetIndex()
+    rng = random.Random(3)
+    objects, colors, settings = ['moon', 'sun', 'tree', 'boat'], ['blue', 'red', 'gold'], ['night', 'day']
+    documents = {}
+    for number in range(8000):
+        documents[f's{number}'] = concepts([rng.choice(objects), rng.choice(objects)], [rng.choice(colors)],
+                                           [rng.choice(settings)], mood=rng.choice(['calm', 'eerie']))
+        index.add(f's{number}', documents[f's{number}'])
+
+    def expected(filters):
+        return [session_id for session_id, document in reversed(documents.items())
+                if all(value in document['visual_concepts'][facet] for facet, values in filters.items() for value in values)]
+
+    for filters in ({'objects': ['moon'], 'colors': ['blue'], 'settings': ['night']}, {'objects': ['moon', 'boat']},
+                    {'mood': ['eerie']}, {}, {'objects': ['unicorn']}):
+        matches = expected(filters)
+        result = index.query(filters, limit=25, facet_limit=3)
+        assert result['total'] == len(matches) and result['session_ids'] == matches[:25], filters
+        if matches:
+            colour_counts = {colour: sum(documents[s]['visual_concepts']['colors'] == [colour] for s in matches)
+                             for colour in colors}
+            top = sorted(colour_counts.items(), key=lambda item: (-item[1], item[0]))[:3]
+            assert result['facets']['colors'] == {colour: count for colour, count in top if count}
+        else:
+            assert result['facets']['colors'] == {}
+
+    # Bulk loading gives the same answers as indexing one session at a time
+    loaded = FacetIndex()
+    loaded.load(({'_id': session_id, **document} for session_id, document in documents.items()), batch_size=3000)
+    assert loaded.query({'objects': ['sun'], 'colors': ['gold']}) == index.query({'objects': ['sun'], 'colors': ['gold']})
+
+    index.remove('s7999')
+    index.add('s5', concepts(['zeppelin'], [], []))
+    assert index.query({'objects': ['zeppelin']})['session_ids'] == ['s5']
+    assert 's7999' not in index.query({}, limit=1)['session_ids'] and len(index) == 7999
+
+    start = time.perf_counter()
+    index.query({'objects': ['moon'], 'colors': ['blue'], 'settings': ['night']})
+    print(f"   facet query over {len(index)} sessions: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+def test_sessions_saved_during_a_load_stay_newest():
+    index = FacetIndex()
+
+    def stored():
+        for number in range(6):
+            if number == 3:
+                # Saved, updated and deleted while the load is still reading older sessions
+                index.add('new', concepts(['moon'], [], []))
+                index.add('s4', concepts(['moon'], ['gold'], []))
+                index.add('gone', concepts(['moon'], [], []))
+                index.remove('gone')
+                assert index.query({'objects': ['moon']})['session_ids'] == ['s1', 's0']  # loaded so far
+            yield {'_id': f's{number}', **concepts(['moon'], [], [])}
+
+    assert index.load(stored(), batch_size=2) == 6
+    assert index.query({'objects': ['moon']})['session_ids'] == ['new', 's5', 's4', 's3', 's2', 's1', 's0']
+    assert index.query({'colors': ['gold']})['session_ids'] == ['s4']  # the newer facets won
+
+
+def test_filters_from_query_arguments():
+    args = MultiDict([('objects', 'moon, star'), ('objects', 'sky'), ('colors', 'blue'), ('limit', '5'), ('style', '')])
+    assert parse_facet_filters(args) == {'objects': ['moon', 'star', 'sky'], 'colors': ['blue']}
+    try:
+        parse_facet_filters(MultiDict([('shape', 'round')]))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_sqlite_backend_indexes_and_reloads_facets():
+    path = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sessions.db')}"
+    backend = SQLiteBackend(path)
+    backend.facets_loading.join()
+    assert backend.facet_search({})['loading'] is False
+    moon = backend.save_session(concepts(['moon'], ['blue'], ['night']))
+    backend.save_session(concepts(['moon'], ['red'], ['night']))
+    assert backend.facet_search({'objects': ['moon'], 'colors': ['blue']})['session_ids'] == [moon]
+    backend.update_session(moon, {'visual_concepts.colors': ['green']})
+    assert backend.facet_search({'colors': ['green']})['session_ids'] == [moon]
+    backend.close_connection()
+
+    reopened = SQLiteBackend(path)
+    reopened.facets_loading.join()
+    assert reopened.facet_search({'objects': ['moon']})['facets']['colors'] == {'green': 1, 'red': 1}
+    reopened.close_connection()
+
+
+def test_facets_endpoint():
+    client = app.test_client()
+    for text in ['a blue moon at night', 'a red moon at night', 'a blue boat']:
+        client.post('/api/text-to-image', json={'text': text})
+
+    result = client.get('/api/sessions/facets?objects=moon&colors=blue').get_json()
+    assert result['total'] >= 1 and all(session_id.startswith('session_') for session_id in result['session_ids'])
+    assert result['facets']['objects']['moon'] == result['total']
+    everything = client.get('/api/sessions/facets?limit=2').get_json()
+    assert len(everything['session_ids']) == 2 and everything['total'] >= 3
+    assert client.get('/api/sessions/facets?shape=round').status_code == 400
+
+
+if __name__ == "__main__":
+    test_bitmap_matches_set_semantics()
+    test_query_intersects_facets_and_counts_values()
+    test_sessions_saved_during_a_load_stay_newest()
+    test_filters_from_query_arguments()
+    test_sqlite_backend_indexes_and_reloads_facets()
+    test_facets_endpoint()
+    print("🏁 Facet index tests PASSED")
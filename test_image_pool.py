@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Test the shared-memory image post-processing pool"""
+
+import io
+import sys
+sys.path.append('.')
+from PIL import Image
+
+from services.image_pool import ImagePostProcessor
+
+OPERATIONS = [
+    ('text_overlay', {'text': 'Generated from:\nsunset'}),
+    ('resize', {'width': 128}),
+    ('encode', {'format': 'PNG'}),
+    ('data_uri', {'mimetype': 'image/png'}),
+]
+
+
+def make_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_pool_matches_inline():
+    image = Image.new('RGB', (512, 256), '#45B7D1')
+    inline_result, inline_timings = ImagePostProcessor(max_workers=0).run(image, OPERATIONS)
+
+    pool = ImagePostProcessor(max_workers=2)
+    try:
+        pooled_result, timings = pool.run(image, OPERATIONS)
+        # Encoded bytes travel through shared memory too
+        thumbnail, _ = pool.run(make_png(image), [('resize', {'width': 64}), ('encode', {'format': 'PNG'})])
+    finally:
+        pool.shutdown()
+
+    assert pooled_result == inline_result
+    assert pooled_result.startswith('data:image/png;base64,')
+    for stage in ('attach_ms', 'text_overlay_ms', 'resize_ms', 'encode_ms', 'data_uri_ms', 'share_ms', 'total_ms'):
+        assert stage in timings
+    assert 'total_ms' in inline_timings
+    assert Image.open(io.BytesIO(thumbnail)).size == (64, 32)
+
+
+if __name__ == "__main__":
+    test_pool_matches_inline()
+    print("🏁 Image pool tests PASSED")
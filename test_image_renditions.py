@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test multi-format, multi-resolution image renditions and thumbnail listings"""
+
+import io
+import sys
+sys.path.append('.')
+from PIL import Image
+
+from app_minimal import app
+from services.image_encoding import RENDITION_WIDTHS, ImageEncoder, snap_width
+
+
+def make_png(width=1024, height=768):
+    image = Image.new('RGB', (width, height))
+    for x in range(0, width, 32):
+        image.paste((x % 256, 120, 200), (x, 0, x + 32, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_snap_width():
+    assert snap_width(None) is None
+    assert snap_width(10) == 64
+    assert snap_width(200) == 256
+    assert snap_width(2000) is None
+
+
+def test_thumbnail_renditions():
+    encoder = ImageEncoder()
+    source = make_png()
+    thumbnail, mimetype = encoder.rendition(source, 'image/png', 64, 'image/png')
+    assert mimetype == 'image/png'
+    assert Image.open(io.BytesIO(thumbnail)).size == (64, 48)
+    assert len(thumbnail) < len(source)
+
+    if 'webp' in encoder.formats:
+        webp, mimetype = encoder.rendition(source, 'image/png', 256, 'image/webp')
+        assert mimetype == 'image/webp'
+        assert Image.open(io.BytesIO(webp)).size == (256, 192)
+
+    # Full size in the source format is passed through untouched
+    assert encoder.rendition(source, 'image/png', None, 'image/png') == (source, 'image/png')
+
+
+def test_prepare_encodes_in_the_background():
+    encoder = ImageEncoder()
+    source = make_png(512, 384)
+    future = encoder.prepare(source, 'image/png')
+    assert future is not None
+    future.result(timeout=30)
+    assert len(encoder.cache) == len(RENDITION_WIDTHS) * len(encoder.formats)
+    assert encoder.preparing == 0
+    assert encoder.prepare(b'<svg/>', 'image/svg+xml') is None  # vectors need no renditions
+
+
+def test_session_listing_references_thumbnails():
+    client = app.test_client()
+    created = client.post('/api/text-to-image', json={'text': 'a red flower garden'}).get_json()
+    listing = client.get('/api/sessions?limit=50').get_json()
+    entry = next(s for s in listing if s['id'] == created['session_id'])
+    assert 'image_data' not in entry
+    assert entry['thumbnail_url'].endswith('/image?w=256')
+    assert client.get(entry['thumbnail_url']).status_code == 200
+
+
+if __name__ == "__main__":
+    test_snap_width()
+    test_thumbnail_renditions()
+    test_prepare_encodes_in_the_background()
+    test_session_listing_references_thumbnails()
+    print("🏁 Image rendition tests PASSED")
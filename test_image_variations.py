@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Test generating several image variations in one request"""
+
+import sys
+sys.path.append('.')
+from app_minimal import app
+from services.image_pool import ImagePostProcessor
+from services.image_service import ImageService
+
+
+def test_text_to_image_variations():
+    client = app.test_client()
+    data = client.post('/api/text-to-image', json={'text': 'stars over the ocean', 'n': 3, 'seed': 10}).get_json()
+    variations = data['variations']
+    assert [v['seed'] for v in variations] == [10, 11, 12]
+    assert len({v['image_etag'] for v in variations}) == 3
+    assert data['image_data'] == variations[0]['image_data']
+
+    image = client.get(variations[2]['image_url'])
+    assert image.status_code == 200
+    assert image.headers['ETag'] == variations[2]['image_etag']
+
+    assert client.post('/api/text-to-image', json={'text': 'stars', 'n': 50}).status_code == 400
+
+
+def test_placeholder_variations():
+    service = ImageService()
+    service.post_processor = ImagePostProcessor(max_workers=0)
+    result = service.generate_image('a quiet lake at dawn', preferred_service='none', seed=1, n=2)
+    assert result['service'] == 'placeholder'
+    assert [v['seed'] for v in result['variations']] == [1, 2]
+    assert result['image_data'] == result['variations'][0]['image_data']
+
+    for n in (10 ** 6, -1, 'many'):
+        rejected = service.process_image_generation_request({'prompt': 'a quiet lake', 'n': n})
+        assert not rejected['success'] and 'n must be' in rejected['error']
+        assert not service.generate_image('a quiet lake', preferred_service='none', n=n)['success']
+
+
+if __name__ == "__main__":
+    test_text_to_image_variations()
+    test_placeholder_variations()
+    print("🏁 Image variation tests PASSED")
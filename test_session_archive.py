@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Test the append-only compressed session archive"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+sys.path.append('.')
+from bson import ObjectId
+
+from services.session_archive import SessionArchive, archive_day
+
+
+def test_daily_files_append_and_lookup_by_id():
+    directory = tempfile.mkdtemp()
+    archive = SessionArchive(directory, compression='gzip')
+    day_one = [{'_id': ObjectId(), 'transcript': f'first {i}', 'timestamp': datetime(2024, 3, 1, 23, i, tzinfo=timezone.utc)}
+               for i in range(3)]
+    day_two = {'_id': ObjectId(), 'transcript': 'second', 'timestamp': datetime(2024, 3, 2, 8, 0)}
+
+    archive.append(day_one[:2])
+    archive.append(day_one[2:] + [day_two])
+    # Re-archiving (e.g. after a crash before the hot copy was deleted) adds nothing
+    archive.append(day_one[:1])
+
+    assert sorted(os.listdir(directory)) == ['index.tsv', 'sessions-2024-03-01.ndjson.gz', 'sessions-2024-03-02.ndjson.gz']
+    reopened = SessionArchive(directory)
+    found = reopened.get(str(day_one[2]['_id']))
+    assert found['transcript'] == 'first 2' and found['_id'] == day_one[2]['_id']
+    assert found['timestamp'].replace(tzinfo=timezone.utc) == day_one[2]['timestamp']
+    assert reopened.get(day_two['_id'])['transcript'] == 'second'
+    assert reopened.get(ObjectId()) is None
+    lines = list(reopened._read_lines('sessions-2024-03-01.ndjson.gz'))
+    assert len(lines) == 3
+
+
+def test_archive_day_uses_utc():
+    from datetime import timedelta
+    eastern = timezone(timedelta(hours=-5))
+    assert archive_day(datetime(2024, 3, 1, 22, 0, tzinfo=eastern)) == '2024-03-02'
+    assert archive_day('2024-05-06T10:00:00') == '2024-05-06'
+
+
+if __name__ == "__main__":
+    test_daily_files_append_and_lookup_by_id()
+    test_archive_day_uses_utc()
+    print("🏁 Session archive tests PASSED")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Test streaming session export (NDJSON / Parquet) from the SQLite backend"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+sys.path.append('.')
+
+from services.image_store import FilesystemImageStore
+from services.image_utils import encode_data_uri
+from services.session_export import PARQUET_AVAILABLE, export_chunks, main, parse_date, parse_fields
+from services.sqlite_store import SQLiteBackend
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+IMAGE = encode_data_uri('image/png', b'\x89PNG export')
+
+
+def make_backend(directory, count=7):
+    backend = SQLiteBackend(f"sqlite:///{os.path.join(directory, 'sessions.db')}")
+    backend.images = FilesystemImageStore(os.path.join(directory, 'images'))
+    for day in range(count):
+        backend.save_session({'transcript': f'day {day}', 'timestamp': START + timedelta(days=day),
+                              'visual_concepts': {'keywords': ['sky']}, 'response_time': day * 10.0,
+                              'image_data': {'image_data': IMAGE, 'service': 'local'}})
+    return backend
+
+
+def test_ndjson_export_is_batched_and_filtered():
+    backend = make_backend(tempfile.mkdtemp())
+    chunks = list(export_chunks(backend, 'ndjson', since=START + timedelta(days=1), until=START + timedelta(days=6),
+                                batch_size=2))
+    assert len(chunks) == 3  # 5 sessions in batches of 2
+    rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+    assert [row['transcript'] for row in rows] == ['day 1', 'day 2', 'day 3', 'day 4', 'day 5']
+    assert rows[0]['timestamp'].startswith('2024-01-02')
+    assert 'image_data' not in rows[0]['image_data'] and 'image_blobs' not in rows[0]
+
+    rows = [json.loads(line) for line in b''.join(export_chunks(
+        backend, 'ndjson', fields=['transcript', 'image_data'], include_images=True)).splitlines()]
+    assert len(rows) == 7 and set(rows[0]) == {'_id', 'transcript', 'image_data'}
+    assert rows[0]['image_data']['image_data'] == IMAGE
+    backend.close_connection()
+
+
+def test_export_arguments():
+    assert parse_date('2024-03-01') == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert parse_date('2024-03-01T10:00:00+02:00').utcoffset() == timedelta(hours=2)
+    assert parse_date('') is None and parse_fields(' a, ,b') == ['a', 'b'] and parse_fields(None) is None
+    for bad in (lambda: parse_date('yesterday'), lambda: export_chunks(None, 'xml')):
+        try:
+            bad()
+            assert False
+        except ValueError:
+            pass
+
+
+def test_cli_writes_parquet_row_groups():
+    if not PARQUET_AVAILABLE:
+        print("pyarrow not installed, skipping Parquet export")
+        return
+    import pyarrow.parquet as parquet
+    directory = tempfile.mkdtemp()
+    make_backend(directory).close_connection()
+    output = os.path.join(directory, 'sessions.parquet')
+    main(['--format', 'parquet', '--batch-size', '3', '--since', '2024-01-02',
+          '--database-uri', f"sqlite:///{os.path.join(directory, 'sessions.db')}", '-o', output])
+
+    parquet_file = parquet.ParquetFile(output)
+    assert parquet_file.metadata.num_row_groups == 2 and parquet_file.metadata.num_rows == 6
+    table = parquet.read_table(io.BytesIO(open(output, 'rb').read()))
+    assert table.column('transcript').to_pylist()[0] == 'day 1'
+    assert table.column('response_time').to_pylist()[-1] == 60.0
+    assert json.loads(table.column('visual_concepts')[0].as_py()) == {'keywords': ['sky']}
+
+
+if __name__ == "__main__":
+    test_ndjson_export_is_batched_and_filtered()
+    test_export_arguments()
+    test_cli_writes_parquet_row_groups()
+    print("🏁 Session export tests PASSED")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Test the inverted-index, LRU-bounded in-memory session store used by app_minimal"""
+
+import sys
+sys.path.append('.')
+
+from app_minimal import app
+from services.session_index import InvertedIndex, SessionMemory, session_terms
+
+
+def make_session(number, transcript, **concepts):
+    return {'id': f's{number}', 'timestamp': f'2024-01-01T00:{number:02d}:00',
+            'transcript': transcript, 'visual_concepts': concepts}
+
+
+def test_terms_include_concepts():
+    terms = session_terms(make_session(1, 'A red car!', objects=['sports car'], mood='calm'))
+    assert terms == {'a', 'red', 'car', 'sports', 'calm'}
+
+
+def test_intersection_is_newest_first():
+    index = InvertedIndex()
+    index.add(1, {'red', 'car'})
+    index.add(2, {'blue', 'car'})
+    index.add(3, {'red', 'car', 'hill'})
+    index.add(4, {'red', 'boat'})
+    assert index.search(['car', 'red'], 10) == [3, 1]
+    assert index.search(['red'], 2) == [4, 3]
+    assert index.search(['red', 'plane'], 10) == []
+    index.remove(3)
+    assert index.search(['car'], 10) == [2, 1]
+    assert 'hill' not in index.postings
+
+
+def test_lru_eviction_drops_least_recently_used():
+    memory = SessionMemory(capacity=3)
+    for number, text in enumerate(['red car', 'blue car', 'green car']):
+        memory.add(make_session(number, text))
+    memory.get('s0')  # refreshed, so s1 is now the least recently used
+    memory.add(make_session(3, 'yellow car'))
+
+    assert len(memory) == 3 and 's1' not in memory and memory.evicted == 1
+    assert [s['id'] for s in memory.search('car', 10)] == ['s3', 's2', 's0']
+    assert memory.search('blue', 10) == []
+    assert [s['id'] for s in memory.page(10)[0]] == ['s3', 's2', 's0']
+    assert [s['id'] for s in memory.search('', 2)] == ['s3', 's2']
+
+
+def test_search_endpoint_matches_all_words():
+    client = app.test_client()
+    wanted = client.post('/api/text-to-image', json={'text': 'a purple dragon flying over mountains'}).get_json()
+    client.post('/api/text-to-image', json={'text': 'a purple flower in a vase'})
+    found = client.get('/api/search?q=Purple%20dragon').get_json()
+    assert [session['id'] for session in found] == [wanted['session_id']]
+
+
+if __name__ == "__main__":
+    test_terms_include_concepts()
+    test_intersection_is_newest_first()
+    test_lru_eviction_drops_least_recently_used()
+    test_search_endpoint_matches_all_words()
+    print("🏁 Session index tests PASSED")
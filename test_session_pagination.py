@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Test keyset (cursor) pagination of session history"""
+
+import base64
+import json
+import sys
+from datetime import datetime
+sys.path.append('.')
+
+from app_minimal import app
+from services.pagination import OrderedSessionIndex, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    moment = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(moment, 'abc')) == (moment, 'abc')
+    assert decode_cursor(encode_cursor('2024-05-01T12:30:00', 's1')) == ('2024-05-01T12:30:00', 's1')
+    forged = [base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+              for payload in ({'t': 5, 'id': 'x'}, {'t': 't', 'id': 7}, ['t', 'x'])]
+    for bad in ['not-a-cursor', encode_cursor('t', 'x')[:-3]] + forged:
+        try:
+            decode_cursor(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+def test_ordered_index_pages_newest_first():
+    index = OrderedSessionIndex()
+    # Out-of-order arrival and timestamp ties are handled by the (timestamp, id) key
+    for number in [3, 1, 4, 0, 2, 5, 6]:
+        index.add(f"2024-01-01T00:00:0{number // 2}", f"s{number}")
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.page(3, cursor)
+        seen += page
+        if cursor is None:
+            break
+    assert seen == ['s6', 's5', 's4', 's3', 's2', 's1', 's0']
+
+    # Sessions added after a cursor was issued do not shift later pages
+    first, cursor = index.page(3)
+    index.add('2024-01-01T00:00:09', 's9')
+    assert index.page(3, cursor)[0] == ['s3', 's2', 's1']
+
+
+def test_sessions_endpoint_follows_next_cursor():
+    client = app.test_client()
+    for text in ['a red car', 'a blue boat', 'a green tree']:
+        client.post('/api/text-to-image', json={'text': text})
+
+    first = client.get('/api/sessions?limit=2')
+    assert len(first.get_json()) == 2
+    cursor = first.headers['X-Next-Cursor']
+    assert 'rel="next"' in first.headers['Link']
+
+    second = client.get(f'/api/sessions?limit=2&cursor={cursor}').get_json()
+    first_ids = {session['id'] for session in first.get_json()}
+    assert second and not first_ids & {session['id'] for session in second}
+    assert client.get('/api/sessions?cursor=garbage').status_code == 400
+    forged = base64.urlsafe_b64encode(b'{"t":5,"id":"x"}').decode()
+    assert client.get(f'/api/sessions?cursor={forged}').status_code == 400
+
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_ordered_index_pages_newest_first()
+    test_sessions_endpoint_follows_next_cursor()
+    print("🏁 Session pagination tests PASSED")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Test speech backend registration, selection and concurrency limits"""
+
+import sys
+import threading
+import time
+sys.path.append('.')
+import numpy as np
+
+from services.speech_backends import SpeechBackend, SpeechBackendRegistry
+from services.speech_service import SpeechService
+
+
+class FakeBackend(SpeechBackend):
+    def __init__(self, name, offline=False, latency=0.0, fail=False):
+        super().__init__()
+        self.name = name
+        self.offline = offline
+        self.latency = latency
+        self.fail = fail
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def transcribe_pcm(self, samples):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} unavailable")
+        return f"from {self.name}"
+
+
+def test_offline_preferred_and_errors_demote():
+    registry = SpeechBackendRegistry()
+    cloud = registry.register(FakeBackend('cloud'), max_concurrency=2)
+    local = registry.register(FakeBackend('local', offline=True, fail=True), max_concurrency=2)
+    registry.preload(background=False)
+    assert [b.name for b in registry.candidates()] == ['local', 'cloud']
+
+    samples = np.zeros(160, dtype=np.int16)
+    for _ in range(3):
+        try:
+            registry.call(local, local.transcribe_pcm, samples)
+        except RuntimeError:
+            pass
+    # Repeated failures put the local engine in cooldown behind the cloud one
+    assert [b.name for b in registry.candidates()] == ['cloud', 'local']
+    assert registry.stats()['local']['errors'] == 3
+    assert registry.call(cloud, cloud.transcribe_pcm, samples) == 'from cloud'
+    assert registry.stats()['cloud']['latency_ms'] is not None
+
+
+def test_concurrency_limit():
+    registry = SpeechBackendRegistry()
+    backend = registry.register(FakeBackend('slow', latency=0.05), max_concurrency=2)
+    samples = np.zeros(160, dtype=np.int16)
+    threads = [threading.Thread(target=registry.call, args=(backend, backend.transcribe_pcm, samples))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.peak == 2
+
+
+def test_queued_callers_count_as_load():
+    registry = SpeechBackendRegistry()
+    busy = registry.register(FakeBackend('busy', latency=0.2), max_concurrency=1)
+    spare = registry.register(FakeBackend('spare'), max_concurrency=1)
+    spare.expected_latency_ms = 2500
+    registry.preload(background=False)
+    samples = np.zeros(160, dtype=np.int16)
+
+    running = threading.Thread(target=registry.call, args=(busy, busy.transcribe_pcm, samples))
+    running.start()
+    time.sleep(0.05)
+    # One call in flight still leaves the busy backend cheaper than the slow spare
+    assert [b.name for b in registry.candidates()] == ['busy', 'spare']
+    queued = threading.Thread(target=registry.call, args=(busy, busy.transcribe_pcm, samples))
+    queued.start()
+    time.sleep(0.05)
+    assert registry.stats()['busy']['in_flight'] == 2
+    assert [b.name for b in registry.candidates()] == ['spare', 'busy']
+    running.join()
+    queued.join()
+    assert registry.stats()['busy']['in_flight'] == 0
+
+
+def test_service_falls_back_between_backends():
+    service = SpeechService()
+    service.backends = SpeechBackendRegistry()
+    service.register_backend(FakeBackend('broken', offline=True, fail=True))
+    service.register_backend(FakeBackend('working'))
+    service.backends.preload(background=False)
+
+    t = np.arange(16000) / 16000
+    tone = (np.sin(2 * np.pi * 300 * t) * 8000).astype('<i2')
+    tone = np.concatenate([np.zeros(8000, dtype='<i2'), tone, np.zeros(8000, dtype='<i2')])
+    import speech_recognition as sr
+    wav = sr.AudioData(tone.tobytes(), 16000, 2).get_wav_data()
+    stats = {}
+    assert service.speech_to_text(wav, stats=stats) == 'from working'
+    assert stats['backend'] == 'working'
+
+
+def test_undecodable_audio_leaves_backend_health_alone():
+    service = SpeechService()
+    service.backends = SpeechBackendRegistry()
+    for backend in (FakeBackend('local', offline=True), FakeBackend('cloud')):
+        service.register_backend(backend)
+    service.backends.preload(background=False)
+    before = service.backends.stats()
+
+    for _ in range(5):
+        assert service.speech_to_text(b'not audio at all' * 64) is None
+    assert service.backends.stats() == before
+    # Rejections raised inside a call do not count as backend failures either
+    local = service.backends.backends['local']
+    try:
+        service.backends.call(local, local.transcribe_native, b'', {'format': None})
+    except NotImplementedError:
+        pass
+    assert service.backends.stats() == before
+    assert [b.name for b in service.backends.candidates()] == ['local', 'cloud']
+
+
+if __name__ == "__main__":
+    test_offline_preferred_and_errors_demote()
+    test_concurrency_limit()
+    test_queued_callers_count_as_load()
+    test_service_falls_back_between_backends()
+    test_undecodable_audio_leaves_backend_health_alone()
+    print("🏁 Speech backend tests PASSED")
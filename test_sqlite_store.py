@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Test the embedded SQLite session storage backend"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+sys.path.append('.')
+
+from services.database_service import DatabaseService
+from services.image_store import FilesystemImageStore
+from services.image_utils import encode_data_uri
+from services.sqlite_store import SQLiteBackend, sqlite_path
+from services.storage_backends import create_storage
+
+
+def make_backend(directory, **options):
+    backend = SQLiteBackend(f"sqlite:///{os.path.join(directory, 'sessions.db')}", **options)
+    backend.images = FilesystemImageStore(os.path.join(directory, 'images'))
+    return backend
+
+
+def session(transcript, keywords=(), prompt=''):
+    return {'transcript': transcript, 'enhanced_prompt': prompt,
+            'visual_concepts': {'keywords': list(keywords)}}
+
+
+def test_uri_scheme_selects_backend():
+    assert sqlite_path('sqlite:///data/echo.db') == 'data/echo.db'
+    assert sqlite_path('sqlite:////var/echo.db') == '/var/echo.db'
+    assert sqlite_path('sqlite://') == ':memory:'
+    backend = create_storage('sqlite://')
+    assert isinstance(backend, SQLiteBackend)
+    backend.close_connection()
+    try:
+        create_storage('redis://localhost')
+        assert False
+    except ValueError:
+        pass
+    assert DatabaseService.__mro__[1] is SQLiteBackend.__mro__[1]  # same StorageBackend interface
+
+
+def test_sessions_persist_page_and_search():
+    directory = tempfile.mkdtemp()
+    backend = make_backend(directory)
+    png = encode_data_uri('image/png', b'\x89PNG' + b'\x00' * 4096)
+    ids = [backend.save_session(session('a red balloon over the sea', ['balloon'])),
+           backend.save_session(session('green forest', ['tree'], 'a balloon festival poster')),
+           backend.save_session(dict(session('balloon balloon balloon'), image_data={'image_data': png}))]
+
+    # Uncommitted writes are visible to the backend itself before the batch commits
+    assert backend.get_session(ids[2])['image_data']['image_data'] == png
+    assert backend.get_image(ids[2])[1].startswith(b'\x89PNG')
+
+    page, cursor = backend.get_sessions_page(limit=2)
+    assert [s['_id'] for s in page] == ids[:0:-1] and cursor
+    rest, cursor = backend.get_sessions_page(limit=2, cursor=cursor)
+    assert [s['_id'] for s in rest] == ids[:1] and cursor is None
+    assert 'image_data' not in page[0]['image_data']
+
+    results = backend.search_sessions('balloon')
+    assert [s['_id'] for s in results][0] == ids[2]  # transcript matches outrank prompt matches
+    assert {s['_id'] for s in results} == set(ids)
+    assert backend.search_sessions('"unbalanced (query*') == []
+
+    assert backend.update_session(ids[1], {'transcript': 'a quiet lake'})
+    assert [s['_id'] for s in backend.search_sessions('lake')] == [ids[1]]
+    assert backend.delete_session(ids[0]) and not backend.delete_session(ids[0])
+    backend.close_connection()
+
+    reopened = make_backend(directory)
+    assert reopened.get_statistics()['total_sessions'] == 2
+    assert reopened.get_session(ids[1])['transcript'] == 'a quiet lake'
+    assert reopened.get_session(ids[1])['timestamp'].tzinfo is not None
+    reopened.close_connection()
+
+
+def test_commits_are_batched():
+    directory = tempfile.mkdtemp()
+    backend = make_backend(directory, commit_batch=3, commit_interval=60)
+    path = os.path.join(directory, 'sessions.db')
+
+    def committed():
+        with sqlite3.connect(path) as reader:
+            return reader.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    backend.save_session(session('one'))
+    backend.save_session(session('two'))
+    assert committed() == 0
+    backend.save_session(session('three'))
+    assert committed() == 3
+    backend.save_session(session('four'))
+    backend.close_connection()
+    assert committed() == 4
+
+
+if __name__ == "__main__":
+    test_uri_scheme_selects_backend()
+    test_sessions_persist_page_and_search()
+    test_commits_are_batched()
+    print("🏁 SQLite storage tests PASSED")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Test streaming recognition buffering and interim/final transcript delivery"""
+
+import sys
+import time
+sys.path.append('.')
+import numpy as np
+
+from services.streaming_service import AudioRingBuffer, VoiceStreamSession, WindowedEngine, register_local_engine
+
+
+def test_ring_buffer_keeps_latest_bytes():
+    ring = AudioRingBuffer(8)
+    ring.write(b'abcde')
+    ring.write(b'fghij')
+    assert ring.read_all() == b'cdefghij'
+    ring.write(b'0123456789xyz')
+    assert ring.read_all() == b'56789xyz'
+    assert len(ring) == 8 and ring.total_written == 23
+    assert ring.read_since(20) == b'xyz' and ring.read_since(0) == b'56789xyz'
+
+
+def test_stream_session_interim_and_final():
+    def transcribe(pcm, sample_rate):
+        return f"{len(pcm) // (sample_rate * 2)}s"
+
+    register_local_engine('fake', lambda ring, rate, on_result: WindowedEngine(ring, rate, on_result, transcribe))
+    results = []
+    session = VoiceStreamSession(lambda text, is_final: results.append((text, is_final)),
+                                 encoding='pcm_s16le', sample_rate=48000, engine='fake')
+    one_second = np.zeros(48000, dtype='<i2').tobytes()
+    session.feed(one_second)
+    time.sleep(0.2)
+    session.feed(one_second)
+    session.finish()
+
+    assert results[0] == ('1s', False)
+    assert results[-1] == ('2s', True)
+    assert len(session.ring) == 2 * 16000 * 2
+
+
+def test_windowed_engine_sends_bounded_segments():
+    sent = []
+
+    def transcribe(pcm, sample_rate):
+        sent.append(len(pcm))
+        return f"{len(pcm) // (sample_rate * 2)}s"
+
+    results = []
+    ring = AudioRingBuffer(60 * 16000 * 2)
+    engine = WindowedEngine(ring, 16000, lambda text, is_final: results.append((text, is_final)), transcribe)
+    engine.segment_bytes = 2 * 16000 * 2
+    one_second = np.zeros(16000, dtype='<i2').tobytes()
+    for _ in range(3):
+        ring.write(one_second)
+        engine.accept(one_second)
+        with engine.busy:  # wait for the interim transcription
+            pass
+    engine.finish()
+
+    assert [text for text, _ in results] == ['1s', '2s', '2s 1s', '2s 1s']
+    assert results[-1][1] and max(sent) <= engine.segment_bytes
+
+
+if __name__ == "__main__":
+    test_ring_buffer_keeps_latest_bytes()
+    test_stream_session_interim_and_final()
+    test_windowed_engine_sends_bounded_segments()
+    print("🏁 Streaming recognition tests PASSED")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Test the minified SVG builder and raw image delivery endpoint"""
+
+import base64
+import gzip
+import sys
+sys.path.append('.')
+from app_minimal import app, extract_visual_concepts, render_advanced_svg
+from services.svg_builder import SvgBuilder
+
+TEST_TEXT = "a night sky full of stars over the ocean"
+
+
+def test_stars_use_shared_definition():
+    concepts = extract_visual_concepts(TEST_TEXT)
+    markup = render_advanced_svg(TEST_TEXT, concepts)
+    assert markup.count('id="star"') == 1
+    assert markup.count('<use href="#star"') == 15
+    assert '\n' not in markup and '  ' not in markup
+
+
+def test_builder_escapes_text():
+    svg = SvgBuilder(10, 10)
+    svg.add('text', {'x': 1.50, 'font_size': 2}, text='sun & <moon>')
+    assert '<text x="1.5" font-size="2">sun &amp; &lt;moon&gt;</text>' in svg.to_string()
+
+
+def test_raw_image_delivery():
+    client = app.test_client()
+    response = client.post('/api/text-to-image', json={'text': TEST_TEXT, 'image_delivery': 'url'})
+    data = response.get_json()
+    assert data['image_data'] is None
+
+    image = client.get(data['image_url'], headers={'Accept-Encoding': 'gzip'})
+    assert image.status_code == 200
+    assert image.mimetype == 'image/svg+xml'
+    assert image.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(image.data).startswith(b'<svg')
+    assert image.headers['ETag'] == data['image_etag'][:-1] + '-gzip"'  # a distinct entity from the plain SVG
+    assert 'Accept-Encoding' in image.headers['Vary']
+
+    cached = client.get(data['image_url'], headers={'If-None-Match': image.headers['ETag'], 'Accept-Encoding': 'gzip'})
+    assert cached.status_code == 304
+    # A cached gzip body never satisfies a client that cannot decode it
+    plain = client.get(data['image_url'], headers={'If-None-Match': image.headers['ETag']})
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    assert plain.headers['ETag'] == data['image_etag']
+
+    # The inline payload is still available for clients that want it
+    inline = client.post('/api/text-to-image', json={'text': TEST_TEXT}).get_json()
+    assert base64.b64decode(inline['image_data'].split(',', 1)[1]) == gzip.decompress(image.data)
+
+
+if __name__ == "__main__":
+    test_stars_use_shared_definition()
+    test_builder_escapes_text()
+    test_raw_image_delivery()
+    print("🏁 SVG delivery tests PASSED")
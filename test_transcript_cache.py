@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test the transcript cache and that repeated audio skips recognition"""
+
+import os
+import sys
+import tempfile
+sys.path.append('.')
+
+from services.speech_service import SpeechService
+from services.transcript_cache import TranscriptCache, transcript_key
+
+
+def test_cache_bounds_and_persistence():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TranscriptCache(max_entries=2, cache_dir=cache_dir)
+        keys = [transcript_key(bytes([i]) * 100, {'backend': 'test'}) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, f"text {i}")
+        assert len(cache.cache) == 2
+        assert cache.get(keys[0]) == 'text 0'  # evicted from memory, reloaded from disk
+
+        fresh = TranscriptCache(max_entries=2, cache_dir=cache_dir)
+        assert fresh.get(keys[2]) == 'text 2'
+        assert fresh.get('missing') is None
+        stats = fresh.stats()
+        assert stats['hits'] == 1 and stats['disk_hits'] == 1 and stats['misses'] == 1
+
+    assert transcript_key(b'audio', {'backend': 'a'}) != transcript_key(b'audio', {'backend': 'b'})
+
+
+def test_disk_tier_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TranscriptCache(max_entries=8, cache_dir=cache_dir)
+        keys = [transcript_key(bytes([i]) * 100) for i in range(4)]
+        cache.put(keys[0], "text 0")
+        entry_size = os.path.getsize(cache._path(keys[0]))
+        cache.max_disk_bytes = 2 * entry_size
+        cache.put(keys[1], "text 1")
+        cache.cache.clear()
+        assert cache.get(keys[0]) == "text 0"  # a disk hit makes it the most recent file
+        cache.put(keys[2], "text 2")
+        assert sorted(os.listdir(cache_dir)) == sorted(f"{key}.json" for key in (keys[0], keys[2]))
+        assert cache.stats()['disk_bytes'] == 2 * entry_size
+
+        # A restart rebuilds the order from mtimes and applies a smaller cap
+        past = os.path.getmtime(cache._path(keys[2])) - 10
+        os.utime(cache._path(keys[0]), (past, past))
+        fresh = TranscriptCache(cache_dir=cache_dir, max_disk_bytes=entry_size)
+        assert list(fresh.disk) == [keys[2]]
+        assert os.listdir(cache_dir) == [f"{keys[2]}.json"]
+
+
+def test_repeat_upload_skips_recognition():
+    service = SpeechService()
+    service.transcript_cache = TranscriptCache(max_entries=8, cache_dir='')
+    service.sr_recognizer = object()
+    service.google_client = None
+    calls = []
+    service._transcribe = lambda audio_bytes, stats=None, decoded=None: calls.append(audio_bytes) or 'draw a cat'
+
+    assert service.speech_to_text(b'same audio') == 'draw a cat'
+    stats = {}
+    assert service.speech_to_text(b'same audio', stats=stats) == 'draw a cat'
+    assert len(calls) == 1 and stats['cached']
+    assert service.transcript_cache.stats()['hit_rate'] == 0.5
+
+
+if __name__ == "__main__":
+    test_cache_bounds_and_persistence()
+    test_disk_tier_evicts_least_recently_used()
+    test_repeat_upload_skips_recognition()
+    print("🏁 Transcript cache tests PASSED")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Test energy-based voice activity detection and silence trimming"""
+
+import sys
+sys.path.append('.')
+import numpy as np
+
+from services.voice_activity import speech_segments, trim_silence
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * 300 * t) * amplitude).astype(np.int16)
+
+
+def silence(seconds):
+    noise = np.random.default_rng(0).normal(0, 30, int(seconds * RATE))
+    return noise.astype(np.int16)
+
+
+def test_trim_leading_and_trailing_silence():
+    samples = np.concatenate([silence(1.0), tone(0.5), silence(3.0)])
+    trimmed, report = trim_silence(samples, RATE)
+    assert report['original_ms'] == 4500
+    assert 500 <= report['kept_ms'] <= 1000
+    assert report['removed_ms'] == report['original_ms'] - report['kept_ms']
+    assert len(trimmed) == report['kept_ms'] * RATE // 1000
+
+
+def test_split_on_long_pauses():
+    samples = np.concatenate([tone(0.5), silence(2.0), tone(0.5), silence(0.2), tone(0.5)])
+    segments = speech_segments(samples, RATE, min_silence_ms=700)
+    assert len(segments) == 2
+    _, report = trim_silence(samples, RATE, split=True)
+    assert report['segments'] == 2
+    assert report['removed_ms'] > 1000
+
+
+def test_all_silence_is_removed():
+    trimmed, report = trim_silence(silence(2.0), RATE)
+    assert len(trimmed) == 0 and report['segments'] == 0
+
+
+def test_audio_without_pauses_is_kept():
+    for amplitude in (8000, 300):  # loud and quiet, neither with a measurable noise floor
+        trimmed, report = trim_silence(tone(2.0, amplitude), RATE)
+        assert report['kept_ms'] == 2000 and report['segments'] == 1
+    # Continuous speech over steady noise: the loud part is speech even though it sets the floor
+    samples = np.concatenate([silence(0.1), tone(3.0)])
+    _, report = trim_silence(samples, RATE)
+    assert report['kept_ms'] >= 3000
+
+
+if __name__ == "__main__":
+    test_trim_leading_and_trailing_silence()
+    test_split_on_long_pauses()
+    test_all_silence_is_removed()
+    test_audio_without_pauses_is_kept()
+    print("🏁 Voice activity tests PASSED")